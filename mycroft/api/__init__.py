@@ -12,16 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import gzip
+import json
 import os
 import time
+from collections import OrderedDict
+from collections.abc import Iterator
 from copy import copy, deepcopy
+from os.path import join
+from threading import Lock
+from urllib.parse import urlencode, urlparse
 
 import requests
 from requests import HTTPError, RequestException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from mycroft.configuration import Configuration
-from mycroft.configuration.config import DEFAULT_CONFIG, SYSTEM_CONFIG, \
-    USER_CONFIG
+from mycroft.configuration.config import SYSTEM_CONFIG, USER_CONFIG
+from mycroft.filesystem import FileSystemAccess
 from mycroft.identity import IdentityManager, identity_lock
 from mycroft.version import VersionManager
 from mycroft.util import get_arch, connected, LOG
@@ -29,6 +38,17 @@ from mycroft.util import get_arch, connected, LOG
 
 _paired_cache = False
 
+# Shared HTTP sessions keeping connections alive, one per server host
+_sessions = {}
+_sessions_lock = Lock()
+
+# Responses cached for ETag validation, shared by all Api instances
+_etag_cache = None
+_etag_cache_lock = Lock()
+
+# Request bodies smaller than this are never compressed
+COMPRESS_MIN_SIZE = 1024
+
 
 class BackendDown(RequestException):
     pass
@@ -41,23 +61,106 @@ class InternetDown(RequestException):
 UUID = '{MYCROFT_UUID}'
 
 
+class EtagCache:
+    """ Bounded LRU cache of backend responses validated using ETags.
+
+    Only the parsed payload and the headers of a response are kept. If a
+    path is provided the cache is stored in the file on each update and
+    loaded from it on creation.
+
+    Arguments:
+        max_size (int): max number of responses kept
+        path (str): file to persist the cache in, None to only keep the
+                    cache in memory
+    """
+    def __init__(self, max_size=64, path=None):
+        self.max_size = max_size
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        if self.path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """ Get the cached entry for a request.
+
+        Arguments:
+            key (str): request key
+
+        Returns:
+            dict with etag, data and headers or None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, data, headers):
+        """ Cache the response of a request, evicting the least recently
+        used entry if the cache is full.
+
+        Arguments:
+            key (str): request key
+            etag (str): ETag of the response
+            data: parsed payload of the response
+            headers (dict): response headers
+        """
+        with self._lock:
+            self._entries[key] = {
+                'etag': etag, 'data': data, 'headers': headers
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            if self.path:
+                self.store()
+
+    def load(self):
+        """ Load cached entries from the cache file. """
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            for key, entry in entries[-self.max_size:]:
+                self._entries[key] = entry
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            LOG.warning('Could not load ETag cache ({})'.format(repr(e)))
+
+    def store(self):
+        """ Write the cache to the cache file, oldest entries first. """
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(list(self._entries.items()), f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            LOG.warning('Could not store ETag cache ({})'.format(repr(e)))
+
+
 class Api:
     """ Generic class to wrap web APIs """
-    params_to_etag = {}
-    etag_to_response = {}
+    # Connection retries, None to use the "retries" of the server config
+    retries = None
 
     def __init__(self, path):
         self.path = path
 
         # Load the config, skipping the REMOTE_CONFIG since we are
         # getting the info needed to get to it!
-        config = Configuration.get([DEFAULT_CONFIG,
-                                    SYSTEM_CONFIG,
-                                    USER_CONFIG],
-                                   cache=False)
+        config = Configuration.get_local()
         config_server = config.get("server")
         self.url = config_server.get("url")
         self.version = config_server.get("version")
+        self.compress_uploads = config_server.get("compress_uploads", False)
+        self.session = get_session(self.url, config_server, self.retries)
+        # Streamed bodies can't be sent again, they're never retried
+        self.stream_session = get_session(self.url, config_server, 0)
+        self.etag_cache = get_etag_cache(config_server)
         self.identity = IdentityManager.get()
 
     def request(self, params):
@@ -120,9 +223,8 @@ class Api:
         Returns:
             Requests response object.
         """
-        query_data = frozenset(params.get('query', {}).items())
-        params_key = (params.get('path'), query_data)
-        etag = self.params_to_etag.get(params_key)
+        params_key = self.build_cache_key(params)
+        cached = self.etag_cache.get(params_key)
 
         method = params.get("method", "GET")
         headers = self.build_headers(params)
@@ -133,23 +235,31 @@ class Api:
 
         # For an introduction to the Etag feature check out:
         # https://en.wikipedia.org/wiki/HTTP_ETag
-        if etag:
-            headers['If-None-Match'] = etag
+        if cached:
+            headers['If-None-Match'] = cached['etag']
 
-        response = requests.request(
+        if params.get("compress") and self.compress_uploads:
+            data, json_body = self.compress_body(headers, data, json_body)
+
+        session = self.session
+        if isinstance(data, Iterator):
+            session = self.stream_session
+        response = session.request(
             method, url, headers=headers, params=query,
             data=data, json=json_body, timeout=(3.05, 15)
         )
-        if response.status_code == 304:
-            # Etag matched, use response previously cached
-            response = self.etag_to_response[etag]
-        elif 'ETag' in response.headers:
+        if response.status_code == 304 and cached:
+            # Etag matched, use the data previously cached
+            return deepcopy(cached['data'])
+
+        data = self.get_response(response, no_refresh)
+        if ('ETag' in response.headers and
+                200 <= response.status_code < 300):
+            # Cache data for future lookup when we receive a 304
             etag = response.headers['ETag'].strip('"')
-            # Cache response for future lookup when we receive a 304
-            self.params_to_etag[params_key] = etag
-            self.etag_to_response[etag] = response
-
-        return self.get_response(response, no_refresh)
+            self.etag_cache.put(params_key, etag, deepcopy(data),
+                                dict(response.headers))
+        return data
 
     def get_response(self, response, no_refresh=False):
         """ Parse response and extract data from response.
@@ -206,6 +316,35 @@ class Api:
             params["json"] = json
         return json
 
+    def compress_body(self, headers, data, json_body):
+        """ Gzip the request body if it's large enough to benefit.
+
+        Arguments:
+            headers (dict): request headers, Content-Encoding is added
+            data (bytes/str): raw request body
+            json_body (dict): request body to send as json
+
+        Returns:
+            tuple (data, json_body) to use for the request
+        """
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+        elif isinstance(data, str):
+            body = data.encode('utf-8')
+        elif isinstance(data, bytes):
+            body = data
+        else:
+            return data, json_body
+
+        if len(body) < COMPRESS_MIN_SIZE:
+            return data, json_body
+        headers["Content-Encoding"] = "gzip"
+        return gzip.compress(body), None
+
+    def build_cache_key(self, params):
+        query = sorted(params.get('query', {}).items())
+        return params.get('path', '') + '?' + urlencode(query)
+
     def build_query(self, params):
         return params.get("query")
 
@@ -421,12 +560,15 @@ class DeviceApi(Api):
         self.request({
             "method": "PUT",
             "path": "/" + UUID + "/skillJson",
-            "json": to_send
+            "json": to_send,
+            "compress": True
             })
 
 
 class STTApi(Api):
     """ Web API wrapper for performing Speech to Text (STT) """
+    # Fail fast when offline, the utterance is outdated after the retries
+    retries = 0
 
     def __init__(self, path):
         super(STTApi, self).__init__(path)
@@ -475,6 +617,66 @@ class GeolocationApi(Api):
         return response['data']
 
 
+def get_session(url, config=None, retries=None):
+    """ Get the shared HTTP session for the host of the url.
+
+    Sessions keep connections to the host alive between requests, saving
+    the TCP and TLS handshakes, and retry failed connections with backoff.
+    The session for a host and number of retries is created on first use
+    with the provided config.
+
+    Arguments:
+        url (str): url of the server
+        config (dict): server config with pool_size, retries and
+                       backoff_factor
+        retries (int): connection retries, None to use the config value
+
+    Returns:
+        requests.Session for the host
+    """
+    config = config or {}
+    if retries is None:
+        retries = config.get("retries", 3)
+    parsed_url = urlparse(url)
+    host = (parsed_url.scheme, parsed_url.netloc, retries)
+    with _sessions_lock:
+        if host not in _sessions:
+            retry = Retry(total=retries, read=0, connect=retries,
+                          backoff_factor=config.get("backoff_factor", 0.3),
+                          status_forcelist=(502, 503, 504),
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=config.get("pool_size", 4),
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount(parsed_url.scheme + "://", adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+
+def get_etag_cache(config=None):
+    """ Get the ETag cache shared by all Api instances.
+
+    The cache is created on first use with the provided config.
+
+    Arguments:
+        config (dict): server config with etag_cache_size and
+                       persist_etag_cache
+
+    Returns:
+        EtagCache instance
+    """
+    global _etag_cache
+    config = config or {}
+    with _etag_cache_lock:
+        if _etag_cache is None:
+            path = None
+            if config.get('persist_etag_cache'):
+                path = join(FileSystemAccess('api').path, 'etag_cache.json')
+            _etag_cache = EtagCache(config.get('etag_cache_size', 64), path)
+        return _etag_cache
+
+
 def has_been_paired():
     """ Determine if this device has ever been paired with a web backend
 
@@ -19,6 +19,8 @@
 """
 from mycroft.configuration import Configuration
 from mycroft.messagebus.client import MessageBusClient
+from mycroft.metrics import setup_metrics_handlers
+from mycroft.metrics.trace import setup_trace_handlers
 from mycroft.util import reset_sigint_handler, wait_for_exit_signal, \
     create_daemon, create_echo_function, check_for_signal
 from mycroft.util.log import LOG
@@ -37,6 +39,8 @@ def main():
 
     LOG.info("Starting Audio Services")
     bus.on('message', create_echo_function('AUDIO', ['mycroft.audio.service']))
+    setup_trace_handlers(bus, 'audio')
+    setup_metrics_handlers(bus, 'audio')
     audio = AudioService(bus)  # Connect audio service instance to message bus
     create_daemon(bus.run_forever)
 
@@ -28,7 +28,7 @@ from mycroft.tts.mimic_tts import Mimic
 bus = None  # Mycroft messagebus connection
 config = None
 tts = None
-tts_hash = None
+tts_outdated = False
 lock = Lock()
 mimic_fallback_obj = None
 
@@ -41,7 +41,6 @@ def handle_speak(event):
     Parse sentences and invoke text to speech service.
     """
     config = Configuration.get()
-    Configuration.set_config_update_handlers(bus)
     global _last_stop_signal
 
     # if the message is targeted and audio is not the target don't
@@ -112,9 +111,9 @@ def mute_and_speak(utterance, ident, listen=False):
         utterance:  The sentence to be spoken
         ident:      Ident tying the utterance to the source query
     """
-    global tts_hash
+    global tts_outdated
     # update TTS object if configuration has changed
-    if tts_hash != hash(str(config.get('tts', ''))):
+    if tts_outdated:
         global tts
         # Stop tts playback thread
         tts.playback.stop()
@@ -122,7 +121,7 @@ def mute_and_speak(utterance, ident, listen=False):
         # Create new tts instance
         tts = TTSFactory.create()
         tts.init(bus)
-        tts_hash = hash(str(config.get('tts', '')))
+        tts_outdated = False
 
     LOG.info("Speak: " + utterance)
     try:
@@ -160,6 +159,12 @@ def handle_stop(event):
         bus.emit(Message("mycroft.stop.handled", {"by": "TTS"}))
 
 
+def handle_tts_config_change(config):
+    """Flag the TTS to be recreated before the next utterance is spoken."""
+    global tts_outdated
+    tts_outdated = True
+
+
 def init(messagebus):
     """Start speech related handlers.
 
@@ -169,11 +174,12 @@ def init(messagebus):
 
     global bus
     global tts
-    global tts_hash
+    global tts_outdated
     global config
 
     bus = messagebus
     Configuration.set_config_update_handlers(bus)
+    Configuration.subscribe('tts', handle_tts_config_change)
     config = Configuration.get()
     bus.on('mycroft.stop', handle_stop)
     bus.on('mycroft.audio.speech.stop', handle_stop)
@@ -181,7 +187,7 @@ def init(messagebus):
 
     tts = TTSFactory.create()
     tts.init(bus)
-    tts_hash = hash(str(config.get('tts', '')))
+    tts_outdated = False
 
 
 def shutdown():
@@ -189,6 +195,7 @@ def shutdown():
 
     Stop any playing audio and make sure threads are joined correctly.
     """
+    Configuration.unsubscribe('tts', handle_tts_config_change)
     if tts:
         tts.playback.stop()
         tts.playback.join()
@@ -13,9 +13,10 @@
 # limitations under the License.
 #
 import asyncio
+import time
 
-from collections import namedtuple
-from threading import Lock
+from collections import namedtuple, OrderedDict
+from threading import Event, Lock
 
 from mycroft.configuration import Configuration
 from mycroft.messagebus.client import MessageBusClient
@@ -34,6 +35,120 @@ write_lock = Lock()
 namespace_lock = Lock()
 
 RESERVED_KEYS = ['__from', '__idle']
+ACTIVE_SKILLS = "mycroft.system.active_skills"
+
+
+class ActiveNamespaces:
+    """ Stack of the namespaces loaded in the GUI and their pages.
+
+    The namespaces are indexed by name, the first namespace is the active
+    one. Changes return the messages needed to apply the same change to
+    the GUI's copy of the model.
+    """
+    def __init__(self):
+        self._namespaces = OrderedDict()  # name: list of pages, top first
+        self._positions = None  # name: position, rebuilt after reordering
+
+    def __contains__(self, namespace):
+        return namespace in self._namespaces
+
+    def __len__(self):
+        return len(self._namespaces)
+
+    def __iter__(self):
+        """ Iterate over the namespaces from the top of the stack. """
+        for name, pages in list(self._namespaces.items()):
+            yield Namespace(name, list(pages))
+
+    def pages(self, namespace):
+        """ Get the pages loaded in a namespace. """
+        return self._namespaces[namespace]
+
+    def position(self, namespace):
+        """ Get the position of a namespace in the stack, None if missing.
+        """
+        if self._positions is None:
+            self._positions = {name: pos for pos, name in
+                               enumerate(self._namespaces)}
+        return self._positions.get(namespace)
+
+    def activate(self, namespace):
+        """ Move a namespace to the top of the stack, adding it if needed.
+
+        Returns:
+            list of session list messages for the GUI
+        """
+        position = self.position(namespace)
+        if position == 0:
+            return []
+        if position is None:
+            self._namespaces[namespace] = []
+            msg = {"type": "mycroft.session.list.insert",
+                   "namespace": ACTIVE_SKILLS,
+                   "position": 0,
+                   "data": [{"skill_id": namespace}]}
+        else:
+            msg = {"type": "mycroft.session.list.move",
+                   "namespace": ACTIVE_SKILLS,
+                   "from": position, "to": 0,
+                   "items_number": 1}
+        self._namespaces.move_to_end(namespace, last=False)
+        self._positions = None
+        return [msg]
+
+    def remove(self, namespace):
+        """ Remove a namespace from the stack.
+
+        Returns:
+            list of session list messages for the GUI
+        """
+        position = self.position(namespace)
+        if position is None:
+            return []
+        del self._namespaces[namespace]
+        self._positions = None
+        return [{"type": "mycroft.session.list.remove",
+                 "namespace": ACTIVE_SKILLS,
+                 "position": position,
+                 "items_number": 1}]
+
+    def add_pages(self, namespace, pages):
+        """ Append the pages not yet loaded to a namespace.
+
+        Returns:
+            list of page list messages for the GUI
+        """
+        loaded = self._namespaces[namespace]
+        new_pages = [p for p in OrderedDict.fromkeys(pages)
+                     if p not in loaded]
+        if not new_pages:
+            return []
+        msg = {"type": "mycroft.gui.list.insert",
+               "namespace": namespace,
+               "position": len(loaded),
+               "data": [{"url": p} for p in new_pages]}
+        loaded.extend(new_pages)
+        return [msg]
+
+    def remove_pages(self, namespace, pages):
+        """ Remove pages from a namespace, starting from the back.
+
+        Returns:
+            list of page list messages for the GUI
+        """
+        loaded = self._namespaces.get(namespace)
+        if loaded is None:
+            return []
+        positions = sorted({loaded.index(p) for p in pages if p in loaded},
+                           reverse=True)
+        msgs = []
+        for pos in positions:
+            loaded.pop(pos)
+            msgs.append({"type": "mycroft.gui.list.remove",
+                         "namespace": namespace,
+                         "position": pos,
+                         "items_number": 1})
+        return msgs
 
 
 def _get_page_data(message):
@@ -71,6 +186,16 @@ class Enclosure:
         self.config = config.get("enclosure")
         self.global_config = config
 
+        # Values set in loaded namespaces are merged per namespace and sent
+        # to the GUIs at most update_rate times per second
+        update_rate = config['gui_websocket'].get('update_rate', 30)
+        self.update_interval = 1.0 / update_rate
+        self.pending_sets = {}  # namespace: {name: value}
+        self.send_lock = Lock()
+        self.sets_pending = Event()
+        self.last_flush = 0.0
+        create_daemon(self.flush_loop)
+
         self.gui = create_gui_service(self, config['gui_websocket'])
         # This datastore holds the data associated with the GUI provider. Data
         # is stored in Namespaces, so you can have:
@@ -79,18 +204,15 @@ class Enclosure:
         # special "SYSTEM" namespace.
         self.datastore = {}
 
-        # self.loaded is a list, each element consists of a namespace named
-        # tuple.
-        # The namespace namedtuple has the properties "name" and "pages"
-        # The name contains the namespace name as a string and pages is a
-        # mutable list of loaded pages.
+        # self.loaded is the stack of namespaces shown in the GUI, indexed
+        # by name. Iterating over it yields Namespace named tuples with the
+        # properties "name" and "pages", from the active namespace down.
         #
-        # [Namespace name, [List of loaded qml pages]]
         # [
         # ["SKILL_NAME", ["page1.qml, "page2.qml", ... , "pageN.qml"]
         # [...]
         # ]
-        self.loaded = []  # list of lists in order.
+        self.loaded = ActiveNamespaces()
         self.explicit_move = True  # Set to true to send reorder commands
 
         # Listen for new GUI clients to announce themselves on the main bus
@@ -116,14 +238,50 @@ class Enclosure:
     # GUI client API
 
     def send(self, msg_dict):
-        """ Send to all registered GUIs. """
-        LOG.info('SENDING...')
+        """ Send to all registered GUIs.
+
+        Pending value updates are sent first to keep the message order.
+        """
+        with self.send_lock:
+            self.flush_sets()
+            self.broadcast(msg_dict)
+
+    def broadcast(self, msg_dict):
+        """ Serialize a message once and write it to all GUIs. """
+        if not GUIWebsocketHandler.clients:
+            return
+        msg = json.dumps(msg_dict)
+        LOG.debug('Sending {} to GUIs'.format(msg_dict.get('type')))
         for connection in GUIWebsocketHandler.clients:
             try:
-                connection.send(msg_dict)
+                connection.write_message(msg)
             except Exception as e:
                 LOG.exception(repr(e))
 
+    def flush_sets(self):
+        """ Send the pending value updates, one message per namespace.
+
+        Must be called holding the send_lock.
+        """
+        pending, self.pending_sets = self.pending_sets, {}
+        for namespace, data in pending.items():
+            self.broadcast({"type": "mycroft.session.set",
+                            "namespace": namespace,
+                            "data": data})
+        self.last_flush = time.monotonic()
+
+    def flush_loop(self):
+        """ Send pending value updates on each frame tick. """
+        while True:
+            self.sets_pending.wait()
+            # Wait for the next tick, collecting further updates meanwhile
+            delay = self.last_flush + self.update_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.send_lock:
+                self.sets_pending.clear()
+                self.flush_sets()
+
     def on_gui_send_event(self, message):
         """ Send an event to the GUIs. """
         try:
@@ -154,12 +312,12 @@ class Enclosure:
         if self.datastore[namespace].get(name) != value:
             self.datastore[namespace][name] = value
 
-            # If the namespace is loaded send data to GUI
-            if namespace in [l.name for l in self.loaded]:
-                msg = {"type": "mycroft.session.set",
-                       "namespace": namespace,
-                       "data": {name: value}}
-                self.send(msg)
+            # If the namespace is loaded queue the data for the GUI
+            if namespace in self.loaded:
+                with self.send_lock:
+                    pending = self.pending_sets.setdefault(namespace, {})
+                    pending[name] = value
+                self.sets_pending.set()
 
     def on_gui_delete_page(self, message):
         """ Bus handler for removing pages. """
@@ -188,102 +346,21 @@ class Enclosure:
         except Exception as e:
             LOG.exception(repr(e))
 
-    def __find_namespace(self, namespace):
-        for i, skill in enumerate(self.loaded):
-            if skill[0] == namespace:
-                return i
-        return None
-
-    def __insert_pages(self, namespace, pages):
-        """ Insert pages into the namespace
-
-        Args:
-            namespace (str): Namespace to add to
-            pages (list):    Pages (str) to insert
-        """
-        LOG.debug("Inserting new pages")
-        if not isinstance(pages, list):
-            raise ValueError('Argument must be list of pages')
-
-        self.send({"type": "mycroft.gui.list.insert",
-                   "namespace": namespace,
-                   "position": len(self.loaded[0].pages),
-                   "data": [{"url": p} for p in pages]
-                   })
-        # Insert the pages into local reprensentation as well.
-        updated = Namespace(self.loaded[0].name, self.loaded[0].pages + pages)
-        self.loaded[0] = updated
-
-    def __remove_page(self, namespace, pos):
-        """ Delete page.
+    def __send_changes(self, msgs):
+        """ Send model changes to the GUIs.
 
         Args:
-            namespace (str): Namespace to remove from
-            pos (int):      Page position to remove
+            msgs (list): messages returned by the ActiveNamespaces model
         """
-        LOG.debug("Deleting {} from {}".format(pos, namespace))
-        self.send({"type": "mycroft.gui.list.remove",
-                   "namespace": namespace,
-                   "position": pos,
-                   "items_number": 1
-                   })
-        # Remove the page from the local reprensentation as well.
-        self.loaded[0].pages.pop(pos)
-
-    def __insert_new_namespace(self, namespace, pages):
-        """ Insert new namespace and pages.
-
-        This first sends a message adding a new namespace at the
-        highest priority (position 0 in the namespace stack)
-
-        Args:
-            namespace (str):  The skill namespace to create
-            pages (str):      Pages to insert (name matches QML)
-        """
-        LOG.debug("Inserting new namespace")
-        self.send({"type": "mycroft.session.list.insert",
-                   "namespace": "mycroft.system.active_skills",
-                   "position": 0,
-                   "data": [{"skill_id": namespace}]
-                   })
-
-        # Load any already stored Data
-        data = self.datastore.get(namespace, {})
-        for key in data:
-            msg = {"type": "mycroft.session.set",
-                   "namespace": namespace,
-                   "data": {key: data[key]}}
+        for msg in msgs:
+            if msg["type"] == "mycroft.session.list.move":
+                LOG.debug("move {} to {}".format(msg["from"], msg["to"]))
+                # Seems like the namespace is moved to the top automatically
+                # when a page change is done, moves can be left out.
+                if not self.explicit_move:
+                    continue
             self.send(msg)
 
-        LOG.debug("Inserting new page")
-        self.send({"type": "mycroft.gui.list.insert",
-                   "namespace": namespace,
-                   "position": 0,
-                   "data": [{"url": p} for p in pages]
-                   })
-        # Make sure the local copy is updated
-        self.loaded.insert(0, Namespace(namespace, pages))
-
-    def __move_namespace(self, from_pos, to_pos):
-        """ Move an existing namespace to a new position in the stack.
-
-        Args:
-            from_pos (int): Position in the stack to move from
-            to_pos (int): Position to move to
-        """
-        LOG.debug("Activating existing namespace")
-        # Seems like the namespace is moved to the top automatically when
-        # a page change is done. Deactivating this for now.
-        if self.explicit_move:
-            LOG.debug("move {} to {}".format(from_pos, to_pos))
-            self.send({"type": "mycroft.session.list.move",
-                       "namespace": "mycroft.system.active_skills",
-                       "from": from_pos, "to": to_pos,
-                       "items_number": 1})
-        # Move the local representation of the skill from current
-        # position to position 0.
-        self.loaded.insert(to_pos, self.loaded.pop(from_pos))
-
     def __switch_page(self, namespace, pages):
         """ Switch page to an already loaded page.
 
@@ -292,7 +369,7 @@ class Enclosure:
             namespace (str):  skill namespace
         """
         try:
-            num = self.loaded[0].pages.index(pages[0])
+            num = self.loaded.pages(namespace).index(pages[0])
         except Exception as e:
             LOG.exception(repr(e))
             num = 0
@@ -311,35 +388,30 @@ class Enclosure:
             page (str or list): page(s) to show
             namespace (str):  skill namespace
             index (int): ??? TODO: Unused in code ???
-
-        TODO: - Update sync to match.
-              - Separate into multiple functions/methods
         """
 
         LOG.debug("GUIConnection activating: " + namespace)
         pages = page if isinstance(page, list) else [page]
 
-        # find namespace among loaded namespaces
         try:
-            index = self.__find_namespace(namespace)
-            if index is None:
-                # This namespace doesn't exist, insert them first so they're
-                # shown.
-                self.__insert_new_namespace(namespace, pages)
-                return
-            else:  # Namespace exists
-                if index > 0:
-                    # Namespace is inactive, activate it by moving it to
-                    # position 0
-                    self.__move_namespace(index, 0)
-
-                # Find if any new pages needs to be inserted
-                new_pages = [p for p in pages if p not in self.loaded[0].pages]
-                if new_pages:
-                    self.__insert_pages(namespace, new_pages)
-                else:
-                    # No new pages, just switch
-                    self.__switch_page(namespace, pages)
+            is_new = namespace not in self.loaded
+            # Activate the namespace by moving it to position 0, this
+            # inserts namespaces not shown yet.
+            self.__send_changes(self.loaded.activate(namespace))
+            if is_new:
+                # Load any already stored Data
+                data = self.datastore.get(namespace, {})
+                if data:
+                    self.send({"type": "mycroft.session.set",
+                               "namespace": namespace,
+                               "data": data})
+
+            # Insert any new pages, if there are none just switch
+            changes = self.loaded.add_pages(namespace, pages)
+            if changes:
+                self.__send_changes(changes)
+            elif not is_new:
+                self.__switch_page(namespace, pages)
         except Exception as e:
             LOG.exception(repr(e))
 
@@ -349,18 +421,8 @@ class Enclosure:
         Args:
             namespace (str): namespace to remove
         """
-        index = self.__find_namespace(namespace)
-        if index is None:
-            return
-        else:
-            LOG.debug("Removing namespace {} at {}".format(namespace, index))
-            self.send({"type": "mycroft.session.list.remove",
-                       "namespace": "mycroft.system.active_skills",
-                       "position": index,
-                       "items_number": 1
-                       })
-            # Remove namespace from loaded namespaces
-            self.loaded.pop(index)
+        LOG.debug("Removing namespace {}".format(namespace))
+        self.__send_changes(self.loaded.remove(namespace))
 
     def remove_pages(self, namespace, pages):
         """ Remove the listed pages from the provided namespace.
@@ -370,18 +432,7 @@ class Enclosure:
             pages (list):       List of page names (str) to delete
         """
         try:
-            index = self.__find_namespace(namespace)
-            if index is None:
-                return
-            else:
-                # Remove any pages that doesn't exist in the namespace
-                pages = [p for p in pages if p in self.loaded[index].pages]
-                # Make sure to remove pages from the back
-                indexes = [self.loaded[index].pages.index(p) for p in pages]
-                indexes = sorted(indexes)
-                indexes.reverse()
-                for page_index in indexes:
-                    self.__remove_page(namespace, page_index)
+            self.__send_changes(self.loaded.remove_pages(namespace, pages))
         except Exception as e:
             LOG.exception(repr(e))
 
@@ -491,7 +542,7 @@ class GUIWebsocketHandler(WebSocketHandler):
             LOG.info('Sync {}'.format(namespace))
             # Insert namespace
             self.send({"type": "mycroft.session.list.insert",
-                       "namespace": "mycroft.system.active_skills",
+                       "namespace": ACTIVE_SKILLS,
                        "position": namespace_pos,
                        "data": [{"skill_id": namespace}]
                        })
@@ -503,10 +554,10 @@ class GUIWebsocketHandler(WebSocketHandler):
                        })
             # Insert data
             data = enclosure.datastore.get(namespace, {})
-            for key in data:
+            if data:
                 self.send({"type": "mycroft.session.set",
                            "namespace": namespace,
-                           "data": {key: data[key]}
+                           "data": data
                            })
             namespace_pos += 1
 
@@ -551,9 +602,7 @@ class GUIWebsocketHandler(WebSocketHandler):
         Args:
             data (dict): Data to transmit
         """
-        s = json.dumps(data)
-        LOG.info('Sending {}'.format(s))
-        self.write_message(s)
+        self.write_message(json.dumps(data))
 
     def check_origin(self, origin):
         """Disable origin check to make js connections work."""
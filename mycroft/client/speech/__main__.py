@@ -22,6 +22,8 @@ from mycroft.identity import IdentityManager
 from mycroft.lock import Lock as PIDLock  # Create/Support PID locking file
 from mycroft.messagebus.client import MessageBusClient
 from mycroft.messagebus.message import Message
+from mycroft.metrics import setup_metrics_handlers
+from mycroft.metrics.trace import setup_trace_handlers
 from mycroft.util import create_daemon, wait_for_exit_signal, \
     reset_sigint_handler, create_echo_function
 from mycroft.util.log import LOG
@@ -79,6 +81,14 @@ def handle_utterance(event):
     bus.emit(Message('recognizer_loop:utterance', event, context))
 
 
+def handle_partial_utterance(event):
+    LOG.debug("Partial utterance: " + str(event['utterances']))
+    context = {'client_name': 'mycroft_listener',
+               'source': 'audio',
+               'destination': ["skills"]}
+    bus.emit(Message('recognizer_loop:partial_utterance', event, context))
+
+
 def handle_unknown():
     context = {'client_name': 'mycroft_listener',
                'source': 'audio'}
@@ -184,6 +194,7 @@ def main():
     # Register handlers on internal RecognizerLoop bus
     loop = RecognizerLoop()
     loop.on('recognizer_loop:utterance', handle_utterance)
+    loop.on('recognizer_loop:partial_utterance', handle_partial_utterance)
     loop.on('recognizer_loop:speech.recognition.unknown', handle_unknown)
     loop.on('speak', handle_speak)
     loop.on('recognizer_loop:record_begin', handle_record_begin)
@@ -206,6 +217,8 @@ def main():
     bus.on('recognizer_loop:audio_output_end', handle_audio_end)
     bus.on('mycroft.stop', handle_stop)
     bus.on('message', create_echo_function('VOICE'))
+    setup_trace_handlers(bus, 'voice')
+    setup_metrics_handlers(bus, 'voice')
 
     create_daemon(bus.run_forever)
     create_daemon(loop.run)
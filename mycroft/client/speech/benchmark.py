@@ -0,0 +1,418 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Replay recordings through the listener to measure its performance.
+
+The wav files of a directory are played one after the other by a file
+backed microphone, in real time or faster, into the wake word detection and
+end of speech detection of the ResponsiveRecognizer. The utterances are
+transcribed by a stub STT engine. The report lists the CPU time spent in
+each stage, the wake word detection latency, the end of speech detection
+(endpointing) delay and the number of memory blocks allocated.
+
+    python -m mycroft.client.speech.benchmark <wav dir> [-s SPEED] [-o FILE]
+
+Latencies are measured in audio time, so they don't depend on the speed of
+the replay. They're computed from the positions in seconds given in an
+optional labels.json in the directory:
+
+    {
+        "hey_mycroft_weather.wav": {
+            "wake_word_end": 0.9,
+            "speech_end": 3.2
+        }
+    }
+"""
+import argparse
+import audioop
+import gc
+import json
+import sys
+import time
+import tracemalloc
+import wave
+from functools import wraps
+from os import listdir
+from os.path import basename, isfile, join
+
+from speech_recognition import AudioSource
+
+from mycroft.metrics.aggregator import Histogram
+from mycroft.stt import STT
+
+SAMPLE_WIDTH = 2
+
+
+def load_wav(path, sample_rate=16000):
+    """Load a wav file as 16 bit mono audio.
+
+    Arguments:
+        path (str): wav file to load
+        sample_rate (int): sample rate to convert the audio to
+
+    Returns:
+        bytes of the converted audio
+    """
+    with wave.open(path, 'rb') as f:
+        width = f.getsampwidth()
+        channels = f.getnchannels()
+        rate = f.getframerate()
+        data = f.readframes(f.getnframes())
+    if width != SAMPLE_WIDTH:
+        data = audioop.lin2lin(data, width, SAMPLE_WIDTH)
+    if channels == 2:
+        data = audioop.tomono(data, SAMPLE_WIDTH, 0.5, 0.5)
+    elif channels != 1:
+        raise ValueError('{} has {} channels'.format(path, channels))
+    if rate != sample_rate:
+        data, _ = audioop.ratecv(data, SAMPLE_WIDTH, 1, rate, sample_rate,
+                                 None)
+    return data
+
+
+class FileStream:
+    """Stream of a FileMicrophone, see MutableStream for the interface."""
+    def __init__(self, mic):
+        self.mic = mic
+
+    def read(self, size, of_exc=False):
+        return self.mic.read_frames(size)
+
+    def is_stopped(self):
+        return False
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileMicrophone(AudioSource):
+    """Audio source playing wav files instead of recording.
+
+    The files are played one after the other, each followed by a gap of
+    silence giving the listener time to detect the end of the utterance.
+    Once all files are played, on_end is called and silence returned.
+
+    Arguments:
+        files (list): paths of the wav files
+        sample_rate (int): sample rate of the played audio
+        chunk_size (int): frames per chunk
+        speed (float): playback speed, 1.0 for real time, 0 to play as
+                       fast as the listener reads
+        gap (float): seconds of silence after each file
+        on_end (callable): called when the last file was played
+    """
+    def __init__(self, files, sample_rate=16000, chunk_size=1024, speed=1.0,
+                 gap=2.0, on_end=None):
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = SAMPLE_WIDTH
+        self.CHUNK = chunk_size
+        self.speed = speed
+        self.on_end = on_end
+        self.stream = None
+        self.muted = False
+        self.finished = False
+
+        silence = b'\0' * (int(gap * sample_rate) * SAMPLE_WIDTH)
+        audio = []
+        # (name, start in seconds, duration in seconds) of each file
+        self.timeline = []
+        start = 0.0
+        for path in files:
+            data = load_wav(path, sample_rate)
+            duration = len(data) / (sample_rate * SAMPLE_WIDTH)
+            self.timeline.append((basename(path), start, duration))
+            audio += [data, silence]
+            start += duration + gap
+        self.audio = b''.join(audio)
+        self.position = 0
+        self.started = None
+
+    def __enter__(self):
+        self.stream = FileStream(self)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+    @property
+    def time(self):
+        """Seconds of audio played."""
+        return self.position / (self.SAMPLE_RATE * SAMPLE_WIDTH)
+
+    def file_at(self, seconds):
+        """Get the file played at a time.
+
+        Returns:
+            tuple (name, start in seconds), None past the end
+        """
+        for name, start, duration in reversed(self.timeline):
+            if start <= seconds:
+                return name, start
+        return None
+
+    def read_frames(self, num_frames):
+        num_bytes = num_frames * SAMPLE_WIDTH
+        chunk = self.audio[self.position:self.position + num_bytes]
+        self.position += num_bytes
+        if len(chunk) < num_bytes:
+            chunk += b'\0' * (num_bytes - len(chunk))
+            if not self.finished:
+                self.finished = True
+                if self.on_end:
+                    self.on_end()
+        if self.speed > 0:
+            # Wait until the chunk would have been recorded
+            delay = (self.started + self.time / self.speed -
+                     time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+        if self.muted:
+            return b'\0' * num_bytes
+        return chunk
+
+    def restart(self):
+        pass
+
+    def mute(self):
+        self.muted = True
+
+    def unmute(self):
+        self.muted = False
+
+    def is_muted(self):
+        return self.muted
+
+
+class StubSTT(STT):
+    """STT engine answering without a request.
+
+    Arguments:
+        text (str): transcription returned for every utterance
+    """
+    def __init__(self, text='benchmark'):
+        super(StubSTT, self).__init__()
+        self.text = text
+
+    def execute(self, audio, language=None):
+        return self.text
+
+
+class StageStats:
+    """CPU time, wall time and allocations of a pipeline stage.
+
+    Stages are measured inclusively, the stage of a function calling the
+    function of another stage includes the time spent in that stage.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.cpu = 0.0
+        self.wall = Histogram()
+        self.blocks = 0
+
+    def wrap(self, func):
+        """Measure each call of a function."""
+        @wraps(func)
+        def measured(*args, **kwargs):
+            blocks = sys.getallocatedblocks()
+            cpu_start = time.thread_time()
+            wall_start = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.wall.add(time.monotonic() - wall_start)
+                self.cpu += time.thread_time() - cpu_start
+                self.blocks += sys.getallocatedblocks() - blocks
+                self.calls += 1
+        return measured
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'cpu_seconds': self.cpu,
+            'cpu_per_call': self.cpu / self.calls if self.calls else None,
+            'wall': self.wall.summary(),
+            # Net number of memory blocks still allocated after the calls
+            'allocated_blocks': self.blocks
+        }
+
+
+def _measure(stages, name, obj, attr):
+    stages[name] = StageStats()
+    setattr(obj, attr, stages[name].wrap(getattr(obj, attr)))
+
+
+def _load_labels(directory):
+    path = join(directory, 'labels.json')
+    if isfile(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def run_benchmark(directory, speed=0.0, gap=2.0, stt=None,
+                  trace_malloc=False):
+    """Replay the wav files of a directory through the listener.
+
+    Arguments:
+        directory (str): directory with the wav files and labels.json
+        speed (float): playback speed, 1.0 for real time, 0 for as fast as
+                       possible
+        gap (float): seconds of silence played after each file
+        stt (STT): engine transcribing the utterances, StubSTT by default
+        trace_malloc (bool): trace memory allocations using tracemalloc
+
+    Returns:
+        dict with the report
+    """
+    from mycroft.client.speech.listener import RecognizerLoop
+
+    files = sorted(join(directory, name) for name in listdir(directory)
+                   if name.endswith('.wav'))
+    if not files:
+        raise ValueError('No wav files in ' + directory)
+    labels = _load_labels(directory)
+
+    mic = FileMicrophone(files, speed=speed, gap=gap)
+    loop = RecognizerLoop(microphone=mic)
+    recognizer = loop.responsive_recognizer
+    mic.on_end = recognizer.stop
+    # Don't play sounds or upload wake words
+    recognizer.config = dict(recognizer.config, confirm_listening=False,
+                             opt_in=False)
+    stt = stt or StubSTT()
+
+    stages = {}
+    _measure(stages, 'listen', recognizer, 'listen')
+    _measure(stages, 'energy', recognizer, 'calc_energy')
+    _measure(stages, 'wake_word.update', recognizer.frontend, 'update')
+    _measure(stages, 'wake_word.check', recognizer.frontend,
+             'found_wake_word')
+    _measure(stages, 'endpointing', recognizer, '_record_phrase')
+    _measure(stages, 'stt', stt, 'execute')
+
+    utterances = []
+
+    def handle_wake_word(event):
+        utterances.append({'wake_word': event.get('utterance'),
+                           'detected': mic.time})
+
+    def handle_record_end():
+        if utterances:
+            utterances[-1]['record_end'] = mic.time
+
+    loop.on('recognizer_loop:wakeword', handle_wake_word)
+    loop.on('recognizer_loop:record_end', handle_record_end)
+
+    if trace_malloc:
+        tracemalloc.start()
+    gc_start = [s['collections'] for s in gc.get_stats()]
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    with mic as source:
+        while not mic.finished:
+            audio = recognizer.listen(source, loop)
+            if audio is not None:
+                text = stt.execute(audio)
+                if utterances:
+                    utterances[-1]['transcription'] = text
+    report = {
+        'files': len(files),
+        'audio_seconds': mic.time,
+        'wall_seconds': time.monotonic() - wall_start,
+        'cpu_seconds': time.process_time() - cpu_start,
+        'gc_collections': [s['collections'] - start for s, start in
+                           zip(gc.get_stats(), gc_start)],
+        'stages': {name: stats.summary() for name, stats in stages.items()}
+    }
+    if trace_malloc:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        report['tracemalloc'] = {
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'top_blocks': [str(s) for s in
+                           snapshot.statistics('lineno')[:10]]
+        }
+    loop.wake_word_frontend.stop()
+    loop.wakeup_recognizer.stop()
+
+    report.update(_analyze(mic, labels, utterances))
+    return report
+
+
+def _analyze(mic, labels, utterances):
+    """Compute latencies from the detection times and the labels."""
+    latencies = Histogram()
+    delays = Histogram()
+    detected = set()
+    for utterance in utterances:
+        name, start = mic.file_at(utterance['detected'])
+        detected.add(name)
+        label = labels.get(name, {})
+        utterance['file'] = name
+        utterance['offset'] = utterance['detected'] - start
+        if 'wake_word_end' in label:
+            latency = utterance['offset'] - label['wake_word_end']
+            utterance['wake_word_latency'] = latency
+            latencies.add(latency)
+        if 'speech_end' in label and 'record_end' in utterance:
+            delay = utterance['record_end'] - start - label['speech_end']
+            utterance['endpointing_delay'] = delay
+            delays.add(delay)
+    return {
+        'utterances': utterances,
+        'wake_word_latency': latencies.summary(),
+        'endpointing_delay': delays.summary(),
+        'missed_wake_words': sorted(
+            name for name, _, _ in mic.timeline
+            if 'wake_word_end' in labels.get(name, {}) and
+            name not in detected)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay recordings through the listener and report '
+                    'its performance.')
+    parser.add_argument('directory', help='Directory with the wav files')
+    parser.add_argument(
+        '-s', '--speed', type=float, default=0.0,
+        help='Playback speed, 1 for real time (Default: 0, no waiting)')
+    parser.add_argument(
+        '-g', '--gap', type=float, default=2.0,
+        help='Seconds of silence after each file (Default: 2)')
+    parser.add_argument(
+        '-m', '--tracemalloc', action='store_true', default=False,
+        help='Trace memory allocations, slows down the listener')
+    parser.add_argument(
+        '-o', '--output', help='File to write the report to (Default: '
+                               'stdout)')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.directory, args.speed, args.gap,
+                           trace_malloc=args.tracemalloc)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
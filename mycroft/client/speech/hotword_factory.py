@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+from array import array
+from collections import OrderedDict
 from time import time, sleep
 import os
 import platform
 import posixpath
-import struct
 import sys
 import tempfile
 import requests
@@ -62,6 +63,17 @@ class HotWordEngine:
     def update(self, chunk):
         pass
 
+    def update_features(self, features):
+        """Feed a chunk of audio decoded by a HotWordFrontend.
+
+        Engines override this to use the shared features instead of
+        processing the raw chunk themselves.
+
+        Arguments:
+            features (AudioFeatures): the chunk and its shared features
+        """
+        self.update(features.chunk)
+
     def stop(self):
         """ Perform any actions needed to shut down the hot word engine.
 
@@ -76,6 +88,16 @@ class PocketsphinxHotWord(HotWordEngine):
 
     PocketSphinx is very general purpose but has a somewhat high error rate.
     The key advantage is to be able to specify the wakeword with phonemes.
+
+    When fed through update() the audio is decoded once, chunk by chunk, in
+    a continuing keyphrase search and found_wake_word() reports the hits.
+    Otherwise (or with "streaming": false) found_wake_word() decodes the
+    audio passed to it.
+
+    The search is restarted after each hit and after "max_search_s"
+    seconds of audio, keeping the hypothesis and lattice small. A restarted
+    search is fed the last wake word length of audio again, so a wake word
+    spoken across the restart is still found.
     """
     def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us"):
         super().__init__(key_phrase, config, lang)
@@ -89,6 +111,18 @@ class PocketsphinxHotWord(HotWordEngine):
         dict_name = self.create_dict(self.key_phrase, self.phonemes)
         config = self.create_config(dict_name, Decoder.default_config())
         self.decoder = Decoder(config)
+        self.streaming = self.config.get("streaming", True)
+        self.streaming_started = False  # update() has been called
+        self.utt_started = False
+        self.has_found = False
+        # Bytes of 16 bit audio searched before restarting, and fed again
+        self.max_utt_bytes = 2 * int(self.sample_rate *
+                                     self.config.get("max_search_s", 5))
+        phoneme_duration = self.listener_config.get('phoneme_duration', 120)
+        self.overlap_bytes = 2 * int(self.sample_rate * self.num_phonemes *
+                                     phoneme_duration / 1000)
+        self.utt_bytes = 0
+        self.utt_tail = b''
 
     def create_dict(self, key_phrase, phonemes):
         (fd, file_name) = tempfile.mkstemp()
@@ -121,36 +155,74 @@ class PocketsphinxHotWord(HotWordEngine):
             metrics.timer("mycroft.stt.local.time_s", time() - start)
         return self.decoder.hyp()
 
+    def update(self, chunk):
+        """Feed a chunk of audio to the streaming keyphrase search."""
+        if not self.streaming:
+            return
+        self.streaming_started = True
+        if not self.utt_started:
+            self.decoder.start_utt()
+            self.utt_started = True
+            self.utt_bytes = 0
+        elif self.utt_bytes >= self.max_utt_bytes:
+            self.decoder.end_utt()
+            self.decoder.start_utt()
+            self.decoder.process_raw(self.utt_tail, False, False)
+            self.utt_bytes = len(self.utt_tail)
+        self.decoder.process_raw(chunk, False, False)
+        self.utt_bytes += len(chunk)
+        self.utt_tail = (self.utt_tail + chunk)[-self.overlap_bytes:]
+        hyp = self.decoder.hyp()
+        if hyp and self.key_phrase in hyp.hypstr.lower():
+            self.has_found = True
+            # Start a new search after the hit, the audio following the
+            # wake word isn't fed until the listener waits for it again
+            self.decoder.end_utt()
+            self.utt_started = False
+            self.utt_tail = b''
+
     def found_wake_word(self, frame_data):
+        if self.streaming_started:
+            found, self.has_found = self.has_found, False
+            return found
         hyp = self.transcribe(frame_data)
         return hyp and self.key_phrase in hyp.hypstr.lower()
 
+    def stop(self):
+        if self.utt_started:
+            self.decoder.end_utt()
+            self.utt_started = False
+
 
 class PreciseHotword(HotWordEngine):
     """Precice is the default wakeword engine for mycroft.
 
     Precise is developed by Mycroft AI and produces quite good wake word
     spotting when trained on a decent dataset.
+
+    By default the model is run by the precise-engine executable in a
+    subprocess. With "engine": "tflite" (or a .tflite local_model_file) a
+    TensorFlow Lite model is run in process instead, on each update(),
+    falling back to the executable if that isn't possible.
     """
     def __init__(self, key_phrase="hey mycroft", config=None, lang="en-us"):
         super().__init__(key_phrase, config, lang)
         from precise_runner import (
             PreciseRunner, PreciseEngine, ReadWriteStream
         )
+        from precise_runner.runner import TriggerDetector
         local_conf = LocalConf(USER_CONFIG)
         if (local_conf.get('precise', {}).get('dist_url') ==
                 'http://bootstrap.mycroft.ai/artifacts/static/daily/'):
             del local_conf['precise']['dist_url']
             local_conf.store()
-            Configuration.updated(None)
+            Configuration.reload(['user'])
 
         self.download_complete = True
 
         self.show_download_progress = Timer(0, lambda: None)
         precise_config = Configuration.get()['precise']
 
-        precise_exe = self.update_precise(precise_config)
-
         local_model = self.config.get('local_model_file')
         if local_model:
             self.precise_model = expanduser(local_model)
@@ -168,6 +240,16 @@ class PreciseHotword(HotWordEngine):
         trigger_level = self.config.get('trigger_level', 3)
         sensitivity = self.config.get('sensitivity', 0.5)
 
+        self.runner = None
+        self.engine = self.load_lite_engine()
+        if self.engine:
+            # Predictions are made in update(), no runner thread is needed
+            self.audio_buffer = bytearray()
+            self.detector = TriggerDetector(self.engine.chunk_size,
+                                            sensitivity, trigger_level)
+            return
+
+        precise_exe = self.update_precise(precise_config)
         self.runner = PreciseRunner(
             PreciseEngine(precise_exe, self.precise_model),
             trigger_level, sensitivity,
@@ -175,6 +257,38 @@ class PreciseHotword(HotWordEngine):
         )
         self.runner.start()
 
+    def load_lite_engine(self):
+        """Load the model into an in process engine if configured.
+
+        Returns:
+            PreciseLiteEngine or None if the executable should be used
+        """
+        if self.precise_model.endswith('.tflite'):
+            model = self.precise_model
+        elif self.config.get('engine') == 'tflite':
+            model = self.precise_model.rsplit('.', 1)[0] + '.tflite'
+        else:
+            return None
+
+        if not isfile(model):
+            LOG.warning('No TensorFlow Lite model found at {}, using '
+                        'precise-engine'.format(model))
+            return None
+        try:
+            from mycroft.client.speech.precise_lite import PreciseLiteEngine
+            engine = PreciseLiteEngine(model)
+        except ImportError as e:
+            LOG.warning('Precise can\'t run in process, please install '
+                        'numpy, sonopy and tflite_runtime ({}). Using '
+                        'precise-engine'.format(repr(e)))
+            return None
+        except Exception as e:
+            LOG.error('Could not load {} ({}), using '
+                      'precise-engine'.format(model, repr(e)))
+            return None
+        LOG.info('Running Precise model {} in process'.format(model))
+        return engine
+
     def update_precise(self, precise_config):
         """Continously try to download precise until successful"""
         precise_exe = None
@@ -259,8 +373,27 @@ class PreciseHotword(HotWordEngine):
         self.show_download_progress.cancel()
         self._snd_msg('mouth.reset')
 
+    def update_features(self, features):
+        if not self.engine:
+            self.stream.write(features.chunk)
+            return
+        # MFCCs are computed once for all models with the same parameters
+        prob = self.engine.predict(features.mfccs(self.engine.params))
+        if self.detector.update(prob):
+            self.has_found = True
+
     def update(self, chunk):
-        self.stream.write(chunk)
+        if not self.engine:
+            self.stream.write(chunk)
+            return
+        self.audio_buffer += chunk
+        chunk_size = self.engine.chunk_size
+        while len(self.audio_buffer) >= chunk_size:
+            prob = self.engine.get_prediction(
+                bytes(self.audio_buffer[:chunk_size]))
+            del self.audio_buffer[:chunk_size]
+            if self.detector.update(prob):
+                self.has_found = True
 
     def found_wake_word(self, frame_data):
         if self.has_found:
@@ -271,6 +404,8 @@ class PreciseHotword(HotWordEngine):
     def stop(self):
         if self.runner:
             self.runner.stop()
+        if self.engine:
+            self.engine.stop()
 
 
 class SnowboyHotWord(HotWordEngine):
@@ -331,7 +466,8 @@ class PorcupineHotWord(HotWordEngine):
         else:
             sensitivities = [float(x) for x in sensitivities.split(',')]
 
-        self.audio_buffer = []
+        # int16 samples not yet processed, less than a frame between updates
+        self.audio_buffer = array('h')
         self.has_found = False
         self.num_keywords = len(keyword_file_paths)
         LOG.info(
@@ -346,21 +482,28 @@ class PorcupineHotWord(HotWordEngine):
         LOG.info('Loaded Porcupine')
 
     def update(self, chunk):
-        pcm = struct.unpack_from("h" * (len(chunk)//2), chunk)
-        self.audio_buffer += pcm
-        while True:
-            if len(self.audio_buffer) >= self.porcupine.frame_length:
-                result = self.porcupine.process(
-                    self.audio_buffer[0:self.porcupine.frame_length])
-                # result could be boolean (if there is one keword)
-                # or int (if more than one keyword)
-                self.has_found |= (
-                    (self.num_keywords == 1 and result) |
-                    (self.num_keywords > 1 and result >= 0))
-                self.audio_buffer = self.audio_buffer[
-                    self.porcupine.frame_length:]
-            else:
-                return
+        # Samples are copied as raw int16 values, no Python int per sample
+        self.audio_buffer.frombytes(chunk[:len(chunk) - len(chunk) % 2])
+        self._process_frames()
+
+    def update_features(self, features):
+        self.audio_buffer.extend(features.samples)
+        self._process_frames()
+
+    def _process_frames(self):
+        frame_length = self.porcupine.frame_length
+        offset = 0
+        while len(self.audio_buffer) - offset >= frame_length:
+            result = self.porcupine.process(
+                self.audio_buffer[offset:offset + frame_length])
+            # result could be boolean (if there is one keword)
+            # or int (if more than one keyword)
+            self.has_found |= (
+                (self.num_keywords == 1 and result) |
+                (self.num_keywords > 1 and result >= 0))
+            offset += frame_length
+        # Keep the incomplete frame for the next update
+        del self.audio_buffer[:offset]
 
     def found_wake_word(self, frame_data):
         if self.has_found:
@@ -424,3 +567,113 @@ class HotWordFactory:
         return cls.load_module(module, hotword, config, lang, loop) or \
             cls.load_module('pocketsphinx', hotword, config, lang, loop) or \
             cls.CLASSES['pocketsphinx']()
+
+
+class AudioFeatures:
+    """A chunk of audio and the features computed from it.
+
+    Each feature is computed on first use and then shared by all engines
+    fed the chunk.
+
+    Arguments:
+        chunk (bytes): int16 audio
+        extractors (dict): MFCC extractors of the stream by parameters
+    """
+    def __init__(self, chunk, extractors):
+        self.chunk = chunk
+        self._extractors = extractors
+        self._samples = None
+        self._mfccs = {}
+
+    @property
+    def samples(self):
+        """The chunk as an array of int16 samples."""
+        if self._samples is None:
+            self._samples = array('h')
+            self._samples.frombytes(
+                self.chunk[:len(self.chunk) - len(self.chunk) % 2])
+        return self._samples
+
+    def mfccs(self, params):
+        """MFCCs of the chunk.
+
+        Arguments:
+            params (dict): Precise listener parameters of the model
+
+        Returns:
+            numpy array with a row of features per completed hop
+        """
+        from mycroft.client.speech.precise_lite import MfccExtractor, mfcc_key
+        key = mfcc_key(params)
+        if key not in self._mfccs:
+            extractor = self._extractors.get(key)
+            if extractor is None:
+                extractor = self._extractors[key] = MfccExtractor(params)
+            self._mfccs[key] = extractor.update(self.chunk)
+        return self._mfccs[key]
+
+
+class HotWordFrontend:
+    """Feed the microphone stream to several hot word engines at once.
+
+    Each chunk is decoded once and its features are shared by the engines,
+    so listening for additional wake words costs little more than the
+    engine itself.
+
+    Arguments:
+        engines (list): HotWordEngines to register
+    """
+    def __init__(self, engines=None):
+        self.engines = OrderedDict()
+        self.extractors = {}
+        for engine in engines or []:
+            self.register(engine)
+
+    def register(self, engine):
+        """Add an engine, ignored if its key phrase is already registered.
+
+        Returns:
+            True if the engine was added
+        """
+        if engine.key_phrase in self.engines:
+            return False
+        self.engines[engine.key_phrase] = engine
+        return True
+
+    def remove(self, key_phrase):
+        """Remove the engine listening for a key phrase.
+
+        Returns:
+            The removed engine or None if not registered
+        """
+        return self.engines.pop(key_phrase, None)
+
+    @property
+    def num_phonemes(self):
+        """Phonemes of the longest wake word."""
+        return max((engine.num_phonemes for engine in self.engines.values()),
+                   default=1)
+
+    def update(self, chunk):
+        features = AudioFeatures(chunk, self.extractors)
+        for engine in self.engines.values():
+            engine.update_features(features)
+
+    def found_wake_word(self, frame_data):
+        """Check all engines for a detection.
+
+        Every engine is checked to also reset the detections of the ones
+        not reported.
+
+        Returns:
+            The first engine which found its wake word, None otherwise
+        """
+        found = None
+        for engine in self.engines.values():
+            if engine.found_wake_word(frame_data) and found is None:
+                found = engine
+        return found
+
+    def stop(self):
+        for engine in self.engines.values():
+            engine.stop()
@@ -13,7 +13,9 @@
 # limitations under the License.
 #
 import time
-from threading import Thread
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
 import speech_recognition as sr
 import pyaudio
 from pyee import EventEmitter
@@ -21,10 +23,12 @@ from requests import RequestException
 from requests.exceptions import ConnectionError
 
 from mycroft import dialog
-from mycroft.client.speech.hotword_factory import HotWordFactory
+from mycroft.client.speech.hotword_factory import (HotWordFactory,
+                                                   HotWordFrontend)
 from mycroft.client.speech.mic import MutableMicrophone, ResponsiveRecognizer
 from mycroft.configuration import Configuration
-from mycroft.metrics import MetricsAggregator, Stopwatch, report_timing
+from mycroft.metrics import Stopwatch, get_aggregator, report_timing
+from mycroft.metrics.trace import bind_pending_spans
 from mycroft.session import SessionManager
 from mycroft.stt import STTFactory
 from mycroft.util import connected
@@ -42,6 +46,7 @@ AUDIO_DATA = 0
 STREAM_START = 1
 STREAM_DATA = 2
 STREAM_STOP = 3
+WAKE_WORD = 4
 
 
 class AudioStreamHandler(object):
@@ -120,16 +125,42 @@ class AudioProducer(Thread):
         self.recognizer.stop()
 
 
+class Transcription:
+    """A recorded utterance waiting to be transcribed and sent on.
+
+    Arguments:
+        audio (AudioData): the recording
+        session_id (str): session the utterance was recorded in
+    """
+    def __init__(self, audio, session_id):
+        self.audio = audio
+        self.session_id = session_id
+        self.received = time.time()
+        self.stopwatch = Stopwatch()
+        self.future = None
+        self.done = False
+        self.cancelled = False
+        self.transcriptions = None
+
+
 class AudioConsumer(Thread):
     """AudioConsumer
     Consumes AudioData chunks off the queue
+
+    Recordings are transcribed on a pool of workers, so a slow STT request
+    doesn't hold up the following recordings. The utterances of a session
+    are still sent on in the order they were recorded. A new wake word
+    cancels the transcriptions not sent on yet.
+
+    Engines streaming the audio transcribe in the consumer thread, the
+    stream of the engine belongs to the latest recording.
     """
 
     # In seconds, the minimum audio size to be sent to remote STT
     MIN_AUDIO_SIZE = 0.5
 
     def __init__(self, state, queue, emitter, stt,
-                 wakeup_recognizer, wakeword_recognizer):
+                 wakeup_recognizer, wakeword_recognizer, stt_workers=2):
         super(AudioConsumer, self).__init__()
         self.daemon = True
         self.queue = queue
@@ -138,13 +169,36 @@ class AudioConsumer(Thread):
         self.stt = stt
         self.wakeup_recognizer = wakeup_recognizer
         self.wakeword_recognizer = wakeword_recognizer
-        self.metrics = MetricsAggregator()
+        self.metrics = get_aggregator()
+        if self.stt.can_stream:
+            self.stt.on_partial = self.handle_partial
+        self.executor = ThreadPoolExecutor(max_workers=stt_workers)
+        # Transcriptions not sent on yet, by session in recording order
+        self.pending = {}
+        # Sessions a thread is sending utterances of
+        self.sending = set()
+        self.pending_lock = Lock()
 
     def run(self):
-        while self.state.running:
-            self.read()
+        self.emitter.on('recognizer_loop:wakeword', self.handle_wake_word)
+        try:
+            while self.state.running:
+                self.read()
+        finally:
+            self.emitter.remove_listener('recognizer_loop:wakeword',
+                                         self.handle_wake_word)
+            self.executor.shutdown(wait=False)
+
+    def handle_wake_word(self, _=None):
+        """Mark the wake word in the queue.
+
+        Called from the producer thread, recordings queued before the
+        marker are older than the wake word.
+        """
+        self.queue.put((WAKE_WORD, None))
 
     def read(self):
+        self.metrics.level('mycroft.listener.queue', self.queue.qsize())
         try:
             message = self.queue.get(timeout=0.5)
         except Empty:
@@ -167,6 +221,8 @@ class AudioConsumer(Thread):
             self.stt.stream_data(data)
         elif tag == STREAM_STOP:
             self.stt.stream_stop()
+        elif tag == WAKE_WORD:
+            self.cancel_pending()
         else:
             LOG.error("Unknown audio queue type %r" % message)
 
@@ -187,45 +243,152 @@ class AudioConsumer(Thread):
     def process(self, audio):
 
         if self._audio_length(audio) >= self.MIN_AUDIO_SIZE:
-            stopwatch = Stopwatch()
-            with stopwatch:
-                transcription = self.transcribe(audio)
-            if transcription:
-                ident = str(stopwatch.timestamp) + str(hash(transcription))
-                # STT succeeded, send the transcribed speech on for processing
-                payload = {
-                    'utterances': [transcription],
-                    'lang': self.stt.lang,
-                    'session': SessionManager.get().session_id,
-                    'ident': ident
-                }
-                self.emitter.emit("recognizer_loop:utterance", payload)
-                self.metrics.attr('utterances', [transcription])
-
-                # Report timing metrics
-                report_timing(ident, 'stt', stopwatch,
-                              {'transcription': transcription,
-                               'stt': self.stt.__class__.__name__})
+            job = Transcription(audio, SessionManager.get().session_id)
+            with self.pending_lock:
+                self.pending.setdefault(job.session_id, deque()).append(job)
+                self._report_pending()
+            if self.stt.can_stream:
+                self._transcribe(job)
             else:
-                ident = str(stopwatch.timestamp)
+                job.future = self.executor.submit(self._transcribe, job)
         else:
             LOG.warning("Audio too short to be processed")
 
+    def _transcribe(self, job):
+        self.metrics.timer('mycroft.stt.queue_wait',
+                           time.time() - job.received)
+        try:
+            if not job.cancelled:
+                with job.stopwatch:
+                    job.transcriptions = self.transcribe(job.audio)
+                self.metrics.timer('mycroft.stt', job.stopwatch.time)
+        finally:
+            job.done = True
+            self._send_ready(job.session_id)
+
+    def _send_ready(self, session_id):
+        """Send on the finished utterances of a session in recording order.
+
+        The utterances are emitted without holding the lock. Only one
+        thread sends the utterances of a session at a time, it also sends
+        the ones finished by other threads meanwhile.
+        """
+        while True:
+            with self.pending_lock:
+                if session_id in self.sending:
+                    return  # The sending thread picks up the finished jobs
+                jobs = self.pending.get(session_id, deque())
+                ready = []
+                while jobs and (jobs[0].done or jobs[0].cancelled):
+                    ready.append(jobs.popleft())
+                if not jobs:
+                    self.pending.pop(session_id, None)
+                self._report_pending()
+                if not ready:
+                    return
+                self.sending.add(session_id)
+            try:
+                for job in ready:
+                    if job.cancelled:
+                        bind_pending_spans(str(job.received), job.received)
+                    else:
+                        self._send(job)
+            finally:
+                with self.pending_lock:
+                    self.sending.discard(session_id)
+
+    def _send(self, job):
+        stopwatch = job.stopwatch
+        transcriptions = job.transcriptions
+        if transcriptions:
+            transcription = transcriptions[0]
+            ident = str(stopwatch.timestamp) + str(hash(transcription))
+            # Link the wake word and recording spans to the utterance
+            bind_pending_spans(ident, job.received)
+            # STT succeeded, send the transcribed speech on for processing
+            payload = {
+                'utterances': transcriptions,
+                'lang': self.stt.lang,
+                'session': job.session_id,
+                'ident': ident
+            }
+            self.emitter.emit("recognizer_loop:utterance", payload)
+            self.metrics.attr('utterances', transcriptions)
+
+            # Report timing metrics
+            report_timing(ident, 'stt', stopwatch,
+                          {'transcription': transcription,
+                           'stt': self.stt.__class__.__name__})
+        else:
+            ident = str(stopwatch.timestamp or job.received)
+            bind_pending_spans(ident, job.received)
+
+    def _report_pending(self):
+        self.metrics.level('mycroft.stt.pending',
+                           sum(len(jobs) for jobs in self.pending.values()))
+
+    def cancel_pending(self):
+        """Drop the transcriptions of recordings older than a wake word.
+
+        Requests already sent to the STT engine run to completion, but
+        their result isn't sent on.
+        """
+        with self.pending_lock:
+            sessions = list(self.pending)
+            for jobs in self.pending.values():
+                for job in jobs:
+                    if not job.cancelled:
+                        job.cancelled = True
+                        if job.future is not None:
+                            job.future.cancel()
+                        self.metrics.increment('mycroft.stt.cancelled')
+        for session_id in sessions:
+            self._send_ready(session_id)
+
+    def handle_partial(self, text):
+        """Send on an interim hypothesis of a streaming STT engine.
+
+        Called from the thread of the stream while the utterance is still
+        being recorded.
+        """
+        text = text.lower().strip()
+        if text:
+            payload = {
+                'utterances': [text],
+                'lang': self.stt.lang,
+                'session': SessionManager.get().session_id
+            }
+            self.emitter.emit('recognizer_loop:partial_utterance', payload)
+
     def transcribe(self, audio):
+        """Transcribe the audio into the alternative transcriptions.
+
+        Returns:
+            list of transcriptions, the most likely first, None if the STT
+            request failed. Only the best transcription is returned unless
+            the engine is set to send on multiple hypotheses.
+        """
         def send_unknown_intent():
             """ Send message that nothing was transcribed. """
             self.emitter.emit('recognizer_loop:speech.recognition.unknown')
 
         try:
             # Invoke the STT engine on the audio clip
-            text = self.stt.execute(audio)
-            if text is not None:
-                text = text.lower().strip()
-                LOG.debug("STT: " + text)
+            hypotheses = self.stt.hypotheses(audio)
+            if not self.stt.multiple_hypotheses:
+                hypotheses = hypotheses[:1]
+            if hypotheses:
+                texts = []
+                for text, _ in hypotheses:
+                    text = text.lower().strip()
+                    if text and text not in texts:
+                        texts.append(text)
+                LOG.debug("STT: " + ' | '.join(texts))
             else:
                 send_unknown_intent()
                 LOG.info('no words were transcribed')
-            return text
+                texts = None
+            return texts
         except sr.RequestError as e:
             LOG.error("Could not request Speech Recognition {0}".format(e))
         except ConnectionError as e:
@@ -275,11 +438,17 @@ class RecognizerLoop(EventEmitter):
     """ EventEmitter loop running speech recognition.
 
     Local wake word recognizer and remote general speech recognition.
+
+    Arguments:
+        microphone (AudioSource): source used instead of the configured
+                                  microphone, for example to replay
+                                  recordings
     """
 
-    def __init__(self):
+    def __init__(self, microphone=None):
         super(RecognizerLoop, self).__init__()
         self.mute_calls = 0
+        self.source = microphone
         self._load_config()
 
     def _load_config(self):
@@ -291,21 +460,26 @@ class RecognizerLoop(EventEmitter):
         self.config = config.get('listener')
         rate = self.config.get('sample_rate')
 
-        device_index = self.config.get('device_index')
-        device_name = self.config.get('device_name')
-        if not device_index and device_name:
-            device_index = find_input_device(device_name)
+        if self.source is not None:
+            self.microphone = self.source
+        else:
+            device_index = self.config.get('device_index')
+            device_name = self.config.get('device_name')
+            if not device_index and device_name:
+                device_index = find_input_device(device_name)
 
-        LOG.debug('Using microphone (None = default): '+str(device_index))
+            LOG.debug('Using microphone (None = default): ' +
+                      str(device_index))
 
-        self.microphone = MutableMicrophone(device_index, rate,
-                                            mute=self.mute_calls > 0)
+            self.microphone = MutableMicrophone(device_index, rate,
+                                                mute=self.mute_calls > 0)
 
         self.wakeword_recognizer = self.create_wake_word_recognizer()
+        self.wake_word_frontend = self.create_wake_word_frontend()
         # TODO - localization
         self.wakeup_recognizer = self.create_wakeup_recognizer()
         self.responsive_recognizer = ResponsiveRecognizer(
-            self.wakeword_recognizer)
+            self.wakeword_recognizer, self.wake_word_frontend)
         self.state = RecognizerLoopState()
 
     def create_wake_word_recognizer(self):
@@ -356,6 +530,25 @@ class RecognizerLoop(EventEmitter):
         return HotWordFactory.create_hotword(word, config, self.lang,
                                              loop=self)
 
+    def create_wake_word_frontend(self):
+        """Create the front-end feeding the mic audio to the wake words.
+
+        Besides the main wake word, every hotword entry with "listen" set
+        is listened for, sharing the decoded audio and features.
+        """
+        frontend = HotWordFrontend([self.wakeword_recognizer])
+        hotwords = self.config_core.get('hotwords', {})
+        for word, config in hotwords.items():
+            if not config.get('listen') or word.lower() in frontend.engines:
+                continue
+            LOG.info('Also listening for {}'.format(word))
+            engine = HotWordFactory.create_hotword(word, hotwords, self.lang,
+                                                   loop=self)
+            if not frontend.register(engine):
+                # The engine fell back to an already registered wake word
+                engine.stop()
+        return frontend
+
     def create_wakeup_recognizer(self):
         LOG.info("creating stand up word engine")
         word = self.config.get("stand_up_word", "wake up")
@@ -375,7 +568,8 @@ class RecognizerLoop(EventEmitter):
         self.producer.start()
         self.consumer = AudioConsumer(self.state, queue, self,
                                       stt, self.wakeup_recognizer,
-                                      self.wakeword_recognizer)
+                                      self.wakeword_recognizer,
+                                      self.config.get('stt_workers', 2))
         self.consumer.start()
 
     def stop(self):
@@ -450,7 +644,7 @@ class RecognizerLoop(EventEmitter):
     def reload(self):
         """Reload configuration and restart consumer and producer."""
         self.stop()
-        self.wakeword_recognizer.stop()
+        self.wake_word_frontend.stop()
         # load config
         self._load_config()
         # restart
@@ -34,7 +34,10 @@ from tempfile import gettempdir
 from threading import Thread, Lock
 
 from mycroft.api import DeviceApi
+from mycroft.client.speech.hotword_factory import HotWordFrontend
 from mycroft.configuration import Configuration
+from mycroft.metrics import get_aggregator
+from mycroft.metrics.trace import add_pending_span
 from mycroft.session import SessionManager
 from mycroft.util import (
     check_for_signal,
@@ -210,7 +213,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
     # Time between pocketsphinx checks for the wake word
     SEC_BETWEEN_WW_CHECKS = 0.2
 
-    def __init__(self, wake_word_recognizer):
+    def __init__(self, wake_word_recognizer, frontend=None):
         self.config = Configuration.get()
         listener_config = self.config.get('listener')
         self.upload_url = listener_config['wake_word_upload']['url']
@@ -221,6 +224,8 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
 
         speech_recognition.Recognizer.__init__(self)
         self.wake_word_recognizer = wake_word_recognizer
+        # Feeds the wake word engines, decoding each chunk only once
+        self.frontend = frontend or HotWordFrontend([wake_word_recognizer])
         self.audio = pyaudio.PyAudio()
         self.multiplier = listener_config.get('multiplier')
         self.energy_ratio = listener_config.get('energy_ratio')
@@ -247,7 +252,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
 
         # The maximum audio in seconds to keep for transcribing a phrase
         # The wake word must fit in this time
-        num_phonemes = wake_word_recognizer.num_phonemes
+        num_phonemes = self.frontend.num_phonemes
         len_phoneme = listener_config.get('phoneme_duration', 120) / 1000.0
         self.TEST_WW_SEC = num_phonemes * len_phoneme
         self.SAVED_WW_SEC = max(3, self.TEST_WW_SEC)
@@ -438,17 +443,18 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         """
         self._stop_signaled = True
 
-    def _compile_metadata(self):
-        ww_module = self.wake_word_recognizer.__class__.__name__
+    def _compile_metadata(self, engine=None):
+        engine = engine or self.wake_word_recognizer
+        ww_module = engine.__class__.__name__
         if ww_module == 'PreciseHotword':
-            model_path = self.wake_word_recognizer.precise_model
+            model_path = engine.precise_model
             with open(model_path, 'rb') as f:
                 model_hash = md5(f.read()).hexdigest()
         else:
             model_hash = '0'
 
         return {
-            'name': self.wake_word_name.replace(' ', '-'),
+            'name': engine.key_phrase.replace(' ', '-'),
             'engine': md5(ww_module.encode('utf-8')).hexdigest(),
             'time': str(int(1000 * get_time())),
             'sessionId': SessionManager.get().session_id,
@@ -506,6 +512,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
         # that we want to keep to send to STT
         ww_frames = deque(maxlen=7)
 
+        metrics = get_aggregator()
         while not said_wake_word and not self._stop_signaled:
             if self._skip_wake_word():
                 break
@@ -548,20 +555,29 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                 byte_data = byte_data[len(chunk):] + chunk
 
             buffers_since_check += 1.0
-            self.wake_word_recognizer.update(chunk)
+            update_start = get_time()
+            self.frontend.update(chunk)
+            metrics.timer('mycroft.wakeword.update', get_time() - update_start)
             if buffers_since_check > buffers_per_check:
                 buffers_since_check -= buffers_per_check
                 chopped = byte_data[-test_size:] \
                     if test_size < len(byte_data) else byte_data
                 audio_data = chopped + silence
-                said_wake_word = \
-                    self.wake_word_recognizer.found_wake_word(audio_data)
+                check_start = get_time()
+                engine = self.frontend.found_wake_word(audio_data)
+                said_wake_word = engine is not None
+                metrics.timer('mycroft.wakeword.check',
+                              get_time() - check_start)
 
                 # Save positive wake words as appropriate
                 if said_wake_word:
+                    wake_word = engine.key_phrase
+                    add_pending_span('wake_word', check_start,
+                                     get_time() - check_start,
+                                     {'wake_word': wake_word})
                     SessionManager.touch()
                     payload = {
-                        'utterance': self.wake_word_name,
+                        'utterance': wake_word,
                         'session': SessionManager.get().session_id,
                     }
                     emitter.emit("recognizer_loop:wakeword", payload)
@@ -571,8 +587,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                     if self.save_wake_words:
                         # Save wake word locally
                         audio = self._create_audio_data(byte_data, source)
-                        mtd = self._compile_metadata()
-                        module = self.wake_word_recognizer.__class__.__name__
+                        mtd = self._compile_metadata(engine)
 
                         fn = join(
                             self.saved_wake_words_dir,
@@ -587,7 +602,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
                             target=self._upload_wake_word, daemon=True,
                             args=[audio or
                                   self._create_audio_data(byte_data, source),
-                                  mtd or self._compile_metadata()]
+                                  mtd or self._compile_metadata(engine)]
                         ).start()
         return ww_frames
 
@@ -652,6 +667,7 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
 
         # Notify system of recording start
         emitter.emit("recognizer_loop:record_begin")
+        record_start = get_time()
 
         frame_data = self._record_phrase(
             source,
@@ -660,6 +676,8 @@ class ResponsiveRecognizer(speech_recognition.Recognizer):
             ww_frames
         )
         audio_data = self._create_audio_data(frame_data, source)
+        add_pending_span('recording', record_start,
+                         get_time() - record_start)
         emitter.emit("recognizer_loop:record_end")
         if self.save_utterances:
             LOG.info("Recording utterance")
@@ -0,0 +1,246 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Run Precise wake word models in the listener process.
+
+The precise-engine executable is replaced by a TensorFlow Lite interpreter
+running the model on MFCC windows computed from the recorded chunks. This
+requires the optional packages numpy, sonopy and tflite_runtime and a model
+converted to the .tflite format.
+"""
+import json
+from math import ceil, log, pi, sqrt
+from os.path import isfile
+
+
+class Vectorizer:
+    """Feature types of Precise models, numbered as in mycroft-precise."""
+    mels = 1
+    mfccs = 2
+    speechpy_mfccs = 3
+
+
+# Defaults of the Precise ListenerParams, used if the model has no .params
+DEFAULT_PARAMS = {
+    'window_t': 0.1,
+    'hop_t': 0.05,
+    'buffer_t': 1.5,
+    'sample_rate': 16000,
+    'n_fft': 512,
+    'n_filt': 20,
+    'n_mfcc': 13,
+    'use_delta': False,
+    'vectorizer': Vectorizer.mfccs,
+    'threshold_config': ((6, 4),),
+    'threshold_center': 0.2
+}
+
+# Values assumed for parameters missing from older .params files
+COMPATIBILITY_PARAMS = {'vectorizer': Vectorizer.speechpy_mfccs}
+
+
+def load_params(model_file):
+    """Load the listener parameters a Precise model was trained with.
+
+    Arguments:
+        model_file (str): model path, the parameters are read from
+                          <model_file>.params with the .tflite or .pb
+                          suffix optional
+
+    Like Precise, the defaults are used for a model without .params file
+    while older .params files are completed with COMPATIBILITY_PARAMS.
+
+    Returns:
+        dict with the parameters
+    """
+    params = dict(DEFAULT_PARAMS)
+    for params_file in (model_file + '.params',
+                        model_file.rsplit('.', 1)[0] + '.pb.params'):
+        if isfile(params_file):
+            with open(params_file) as f:
+                params.update(COMPATIBILITY_PARAMS, **json.load(f))
+            break
+    return params
+
+
+class ThresholdDecoder:
+    """Map the raw network output to a linear probability.
+
+    The same decoding as done by precise-engine, making the sensitivity
+    setting behave equally for both engines.
+
+    Arguments:
+        mu_stds (tuple): (mean, std) pairs of the output distribution
+        center (float): decoded output at the distribution center
+        resolution (int): points per unit of the distribution lookup
+    """
+    def __init__(self, mu_stds, center=0.5, resolution=200, min_z=-4,
+                 max_z=4):
+        import numpy as np
+        self.min_out = int(min(mu + min_z * std for mu, std in mu_stds))
+        self.max_out = int(ceil(max(mu + max_z * std for mu, std in mu_stds)))
+        self.out_range = self.max_out - self.min_out
+        points = np.linspace(self.min_out, self.max_out,
+                             resolution * self.out_range)
+        pd = np.sum([np.exp(-(points - mu) ** 2 / (2 * std ** 2)) /
+                     (std * sqrt(2 * pi)) for mu, std in mu_stds],
+                    axis=0) / (resolution * len(mu_stds))
+        self.cd = np.cumsum(pd)
+        self.center = center
+
+    def decode(self, raw_output):
+        if raw_output in (0.0, 1.0):
+            return raw_output
+        if self.out_range == 0:
+            cp = int(raw_output > self.min_out)
+        else:
+            # Inverse of the sigmoid of the output layer
+            ratio = (-log(1 / raw_output - 1) - self.min_out) / self.out_range
+            ratio = min(max(ratio, 0.0), 1.0)
+            cp = float(self.cd[int(ratio * (len(self.cd) - 1) + 0.5)])
+        if cp < self.center:
+            return 0.5 * cp / self.center
+        return 0.5 + 0.5 * (cp - self.center) / (1 - self.center)
+
+
+def mfcc_key(params):
+    """Get the parameters determining the MFCCs of the audio.
+
+    Models trained with equal values can share the computed features.
+    """
+    return tuple(params[name] for name in ('sample_rate', 'window_t', 'hop_t',
+                                           'n_fft', 'n_filt', 'n_mfcc'))
+
+
+class MfccExtractor:
+    """Compute the MFCCs of a continuous stream of audio chunk by chunk.
+
+    Samples not covering a complete hop are kept until the next chunk, so
+    every part of the stream is analyzed exactly once.
+
+    Arguments:
+        params (dict): listener parameters of the model
+    """
+    def __init__(self, params):
+        import numpy as np
+        from sonopy import mfcc_spec
+        self.np = np
+        self.mfcc_spec = mfcc_spec
+        self.params = params
+        rate = params['sample_rate']
+        self.window_samples = int(rate * params['window_t'] + 0.5)
+        self.hop_samples = int(rate * params['hop_t'] + 0.5)
+        self.window_audio = np.zeros(0, np.float32)
+
+    def clear(self):
+        self.window_audio = self.window_audio[:0]
+
+    def update(self, chunk):
+        """Compute the features of the new audio.
+
+        Arguments:
+            chunk (bytes): int16 audio
+
+        Returns:
+            numpy array with a row of features per completed hop
+        """
+        np = self.np
+        params = self.params
+        audio = np.frombuffer(chunk, '<i2').astype(np.float32) / 32768
+        self.window_audio = np.concatenate((self.window_audio, audio))
+        if len(self.window_audio) < self.window_samples:
+            return np.zeros((0, params['n_mfcc']), np.float32)
+        features = self.mfcc_spec(
+            self.window_audio, params['sample_rate'],
+            (self.window_samples, self.hop_samples),
+            num_filt=params['n_filt'], fft_size=params['n_fft'],
+            num_coeffs=params['n_mfcc'])
+        self.window_audio = self.window_audio[
+            len(features) * self.hop_samples:]
+        return features.astype(np.float32)
+
+
+class PreciseLiteEngine:
+    """Precise engine running a TensorFlow Lite model in process.
+
+    Implements the precise_runner Engine interface. Each prediction
+    computes the MFCCs of the new audio only, the features of the rest of
+    the model window are kept from the previous predictions. predict()
+    takes features computed elsewhere, for example shared by several
+    engines.
+
+    Arguments:
+        model_file (str): path to the .tflite model
+        chunk_size (int): number of bytes of audio per prediction
+    """
+    def __init__(self, model_file, chunk_size=2048):
+        import numpy as np
+        from tflite_runtime.interpreter import Interpreter
+        self.np = np
+        self.chunk_size = chunk_size
+        self.params = params = load_params(model_file)
+        if params['vectorizer'] != Vectorizer.mfccs or params['use_delta']:
+            raise ValueError('Only MFCC models without deltas are supported')
+        self.extractor = MfccExtractor(params)
+
+        hop_samples = self.extractor.hop_samples
+        buffer_samples = hop_samples * (
+            int(params['sample_rate'] * params['buffer_t'] + 0.5) //
+            hop_samples)
+        n_features = 1 + (buffer_samples -
+                          self.extractor.window_samples) // hop_samples
+
+        self.interpreter = Interpreter(model_path=model_file)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.decoder = ThresholdDecoder(params['threshold_config'],
+                                        params['threshold_center'])
+
+        self.mfccs = np.zeros((n_features, params['n_mfcc']), np.float32)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def clear(self):
+        """Forget the audio of previous predictions."""
+        self.mfccs[:] = 0
+        self.extractor.clear()
+
+    def predict(self, new_features):
+        """Add new features to the model window and run the model.
+
+        Arguments:
+            new_features (numpy array): MFCCs of the new audio
+
+        Returns:
+            float probability of the wake word
+        """
+        new_features = new_features[-len(self.mfccs):]
+        if len(new_features) > 0:
+            self.mfccs = self.np.concatenate(
+                (self.mfccs[len(new_features):], new_features))
+        self.interpreter.set_tensor(self.input_index,
+                                    self.mfccs[self.np.newaxis])
+        self.interpreter.invoke()
+        raw_output = self.interpreter.get_tensor(self.output_index)[0][0]
+        return self.decoder.decode(float(raw_output))
+
+    def get_prediction(self, chunk):
+        if len(chunk) != self.chunk_size:
+            raise ValueError('Invalid chunk size: ' + str(len(chunk)))
+        return self.predict(self.extractor.update(chunk))
@@ -17,7 +17,9 @@
 import re
 import json
 import inflection
-from os.path import exists, isfile
+from copy import deepcopy
+from os.path import exists, getmtime, isfile
+from threading import RLock
 from requests import RequestException
 
 from mycroft.util.json_helper import load_commented_json, merge_dict
@@ -178,6 +180,22 @@ class RemoteConf(LocalConf):
 class Configuration:
     __config = {}  # Cached config
     __patch = {}  # Patch config that skills can update to override config
+    __layers = {}  # Layers of the default config stack the cache is built of
+    __mtimes = {}  # Modification time of the config files when loaded
+    __version = 0  # Incremented each time the cached config changes
+    __subscribers = {}  # Handlers to call when a top level key changes
+    __buses = []  # Message bus clients with update handlers registered
+    __local = {}  # Memoized merge of the local config files
+    __local_mtimes = None  # Modification times __local was built from
+    __lock = RLock()
+
+    # Layers of the default configuration stack, lowest priority first
+    LAYERS = ['default', 'remote', 'system', 'user', 'patch']
+    LAYER_FILES = {
+        'default': DEFAULT_CONFIG,
+        'system': SYSTEM_CONFIG,
+        'user': USER_CONFIG
+    }
 
     @staticmethod
     def get(configs=None, cache=True):
@@ -194,6 +212,36 @@ class Configuration:
         else:
             return Configuration.load_config_stack(configs, cache)
 
+    @staticmethod
+    def get_local():
+        """
+            Get the merged configuration of the local files, skipping the
+            remote settings.
+
+            The result is memoized and only built again when one of the
+            files has been modified. It is shared between callers and must
+            not be modified.
+
+            Returns: merged dict of the default, system and user config
+        """
+        paths = [DEFAULT_CONFIG, SYSTEM_CONFIG, USER_CONFIG]
+        mtimes = [_get_mtime(path) for path in paths]
+        with Configuration.__lock:
+            if mtimes != Configuration.__local_mtimes:
+                Configuration.__local = Configuration.load_config_stack(paths)
+                Configuration.__local_mtimes = mtimes
+            return Configuration.__local
+
+    @staticmethod
+    def version():
+        """
+            Version of the cached configuration, incremented each time its
+            content changes.
+
+            Returns: (int) configuration version
+        """
+        return Configuration.__version
+
     @staticmethod
     def load_config_stack(configs=None, cache=False):
         """
@@ -206,36 +254,151 @@ class Configuration:
             Returns: merged dict of all configuration files
         """
         if not configs:
-            configs = [LocalConf(DEFAULT_CONFIG), RemoteConf(),
-                       LocalConf(SYSTEM_CONFIG), LocalConf(USER_CONFIG),
-                       Configuration.__patch]
+            layers = {name: Configuration._load_layer(name)
+                      for name in Configuration.LAYERS}
+            base = Configuration._merge_layers(layers)
         else:
+            layers = {}
             # Handle strings in stack
             for index, item in enumerate(configs):
                 if isinstance(item, str):
                     configs[index] = LocalConf(item)
 
-        # Merge all configs into one
-        base = {}
-        for c in configs:
-            merge_dict(base, c)
+            # Merge all configs into one
+            base = {}
+            for c in configs:
+                merge_dict(base, c)
 
         # copy into cache
         if cache:
-            Configuration.__config.clear()
-            for key in base:
-                Configuration.__config[key] = base[key]
+            with Configuration.__lock:
+                Configuration.__layers = layers
+                changed_keys = Configuration._update_cache(base)
+            Configuration._notify_subscribers(changed_keys)
             return Configuration.__config
         else:
             return base
 
+    @staticmethod
+    def reload(layers=None):
+        """
+            Reload layers of the configuration stack and update the cache.
+
+            Only the named layers are loaded again, the others are reused
+            from the previous load. If the cache wasn't built from the
+            default stack the whole stack is loaded.
+
+            Args:
+                layers (list): names of the layers to reload, defaults to
+                               the remote settings and the local files
+                               modified since they were loaded. An empty
+                               list only merges the layers again.
+
+            Returns: merged dict of all configuration layers
+        """
+        if not Configuration.__layers:
+            return Configuration.load_config_stack(cache=True)
+
+        if layers is None:
+            layers = ['remote'] + Configuration._modified_layers()
+        reloaded = {name: Configuration._load_layer(name) for name in layers}
+        with Configuration.__lock:
+            Configuration.__layers.update(reloaded)
+            base = Configuration._merge_layers(Configuration.__layers)
+            changed_keys = Configuration._update_cache(base)
+        Configuration._notify_subscribers(changed_keys)
+        return Configuration.__config
+
+    @staticmethod
+    def _load_layer(name):
+        """Load a single layer of the default configuration stack."""
+        if name == 'remote':
+            return RemoteConf()
+        elif name == 'patch':
+            return Configuration.__patch
+        else:
+            path = Configuration.LAYER_FILES[name]
+            Configuration.__mtimes[name] = _get_mtime(path)
+            return LocalConf(path)
+
+    @staticmethod
+    def _modified_layers():
+        """List the file layers changed on disk since they were loaded."""
+        return [name for name, path in Configuration.LAYER_FILES.items()
+                if _get_mtime(path) != Configuration.__mtimes.get(name)]
+
+    @staticmethod
+    def _merge_layers(layers):
+        """Merge layers in stack order without modifying the layers."""
+        base = {}
+        for name in Configuration.LAYERS:
+            merge_dict(base, deepcopy(layers.get(name, {})))
+        return base
+
+    @staticmethod
+    def _update_cache(config):
+        """Replace the content of the cached config.
+
+        Returns: list of top level keys whose value changed
+        """
+        previous = dict(Configuration.__config)
+        Configuration.__config.clear()
+        Configuration.__config.update(config)
+        changed_keys = [key for key in set(previous) | set(config)
+                        if previous.get(key) != config.get(key)]
+        if changed_keys:
+            Configuration.__version += 1
+        return changed_keys
+
+    @staticmethod
+    def _notify_subscribers(changed_keys):
+        for key in changed_keys:
+            for handler in list(Configuration.__subscribers.get(key, [])):
+                try:
+                    handler(Configuration.__config)
+                except Exception:
+                    LOG.exception('Configuration change handler for '
+                                  '"{}" failed'.format(key))
+
+    @staticmethod
+    def subscribe(key, handler):
+        """
+            Register a handler called when a top level config key changes.
+
+            Args:
+                key (str): top level configuration key, for example "tts"
+                handler (callable): called with the updated configuration
+        """
+        with Configuration.__lock:
+            Configuration.__subscribers.setdefault(key, []).append(handler)
+
+    @staticmethod
+    def unsubscribe(key, handler):
+        """
+            Remove a handler registered with subscribe().
+
+            Args:
+                key (str): top level configuration key
+                handler (callable): handler to remove
+        """
+        with Configuration.__lock:
+            handlers = Configuration.__subscribers.get(key, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
     @staticmethod
     def set_config_update_handlers(bus):
         """Setup websocket handlers to update config.
 
+        The handlers are only registered once per bus client.
+
         Args:
             bus: Message bus client instance
         """
+        with Configuration.__lock:
+            if any(b is bus for b in Configuration.__buses):
+                return
+            Configuration.__buses.append(bus)
         bus.on("configuration.updated", Configuration.updated)
         bus.on("configuration.patch", Configuration.patch)
 
@@ -244,8 +407,11 @@ class Configuration:
         """
             handler for configuration.updated, triggers an update
             of cached config.
+
+            The remote settings are fetched again while local config files
+            are only read if modified since they were last loaded.
         """
-        Configuration.load_config_stack(cache=True)
+        Configuration.reload()
 
     @staticmethod
     def patch(message):
@@ -257,5 +423,15 @@ class Configuration:
                          in the data payload.
         """
         config = message.data.get("config", {})
-        merge_dict(Configuration.__patch, config)
-        Configuration.load_config_stack(cache=True)
+        with Configuration.__lock:
+            merge_dict(Configuration.__patch, config)
+        # Only the patch changed, merge the already loaded layers again
+        Configuration.reload([])
+
+
+def _get_mtime(path):
+    """Modification time of a file or None if it doesn't exist."""
+    try:
+        return getmtime(path)
+    except OSError:
+        return None
@@ -13,12 +13,16 @@
 # limitations under the License.
 #
 """ Interface for interacting with the Mycroft gui qml viewer. """
+from contextlib import contextmanager
 from os.path import join
 
 from mycroft.configuration import Configuration
 from mycroft.messagebus.message import Message
 from mycroft.util import resolve_resource_file
 
+# Values that can't change without being replaced by another object
+_IMMUTABLE_TYPES = (str, int, float, bool, tuple, type(None))
+
 
 class SkillGUI:
     """SkillGUI - Interface to the Graphical User Interface
@@ -34,6 +38,8 @@ class SkillGUI:
 
     def __init__(self, skill):
         self.__session_data = {}  # synced to GUI for use by this skill's pages
+        self.__pending = {}  # values set in a batch, not yet synced
+        self.__batch_depth = 0
         self.page = None    # the active GUI page (e.g. QML template) to show
         self.skill = skill
         self.on_gui_changed_callback = None
@@ -81,19 +87,52 @@ class SkillGUI:
         Arguments:
             message: Messagebus message
         """
-        for key in message.data:
-            self[key] = message.data[key]
+        with self.batch():
+            for key in message.data:
+                self[key] = message.data[key]
         if self.on_gui_changed_callback:
             self.on_gui_changed_callback()
 
     def __setitem__(self, key, value):
-        """Implements set part of dict-like behaviour with named keys."""
-        self.__session_data[key] = value
+        """Implements set part of dict-like behaviour with named keys.
 
-        if self.page:
-            # emit notification (but not needed if page has not been shown yet)
-            data = self.__session_data.copy()
-            data.update({'__from': self.skill.skill_id})
+        Values equal to the current one aren't sent to the GUI again, unless
+        it's the same object, which may have been modified in place.
+        """
+        if key in self.__session_data:
+            current = self.__session_data[key]
+            if current == value and (current is not value or
+                                     isinstance(value, _IMMUTABLE_TYPES)):
+                return
+        self.__session_data[key] = value
+        self.__pending[key] = value
+        if self.__batch_depth == 0:
+            self._sync_pending()
+
+    @contextmanager
+    def batch(self):
+        """Combine the values set in a with-block into a single update.
+
+        Example:
+            with self.gui.batch():
+                self.gui['title'] = title
+                self.gui['progress'] = progress
+        """
+        self.__batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.__batch_depth -= 1
+            if self.__batch_depth == 0:
+                self._sync_pending()
+
+    def _sync_pending(self):
+        """Send the values changed since the last update to the GUI."""
+        data, self.__pending = self.__pending, {}
+        if data and self.page:
+            # emit notification (but not needed if page has not been shown
+            # yet, all values are sent when it is)
+            data['__from'] = self.skill.skill_id
             self.skill.bus.emit(Message("gui.value.set", data))
 
     def __getitem__(self, key):
@@ -107,6 +146,7 @@ class SkillGUI:
     def clear(self):
         """Reset the value dictionary, and remove namespace from GUI."""
         self.__session_data = {}
+        self.__pending = {}
         self.page = None
         self.skill.bus.emit(Message("gui.clear.namespace",
                                     {"__from": self.skill.skill_id}))
@@ -158,6 +198,7 @@ class SkillGUI:
         self.page = page_names[index]
 
         # First sync any data...
+        self.__pending = {}
         data = self.__session_data.copy()
         data.update({'__from': self.skill.skill_id})
         self.skill.bus.emit(Message("gui.value.set", data))
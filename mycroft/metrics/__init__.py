@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import json
+from os.path import join
 from queue import Queue, Empty
 import threading
 import time
@@ -21,35 +24,159 @@ import requests
 
 from mycroft.api import DeviceApi, is_paired
 from mycroft.configuration import Configuration
+from mycroft.filesystem import FileSystemAccess
 from mycroft.session import SessionManager
+from mycroft.util.combo_lock import ComboLock
 from mycroft.util.log import LOG
-from mycroft.version import CORE_VERSION_STR
 from copy import copy
 
+from .aggregator import (MetricsAggregator, get_aggregator,
+                         setup_metrics_handlers)
+from .sinks import BackendMetricSink, MetricSink, create_sink
+from .trace import add_span
+
+
+class MetricSpool:
+    """Metric events stored on disk while they can't be uploaded.
+
+    The spool is shared by the Mycroft processes, access is serialized
+    using a process lock.
+
+    Arguments:
+        path (str): JSON lines file holding the events
+        max_size (int): max number of events kept, the oldest events are
+                        dropped first
+    """
+    def __init__(self, path, max_size=1000):
+        self.path = path
+        self.max_size = max_size
+        self.lock = ComboLock(path + '.lock')
+
+    def append(self, events):
+        """Add events to the spool."""
+        with self.lock:
+            spooled = self._read() + [list(e) for e in events]
+            self._write(spooled[-self.max_size:])
+
+    def pop_all(self):
+        """Remove and return all events in the spool."""
+        with self.lock:
+            spooled = self._read()
+            if spooled:
+                self._write([])
+        return [tuple(e) for e in spooled]
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            LOG.warning('Dropping corrupt metric spool ({})'.format(repr(e)))
+            return []
+
+    def _write(self, events):
+        with open(self.path, 'w') as f:
+            f.writelines(json.dumps(e) + '\n' for e in events)
+
 
 class _MetricSender(threading.Thread):
-    """Thread responsible for sending metrics data."""
+    """Thread responsible for sending metrics data.
+
+    Reported events are collected for up to metrics.interval seconds or
+    until metrics.batch_size events are queued and then passed as a batch
+    to the backend and the local sinks. Events the backend doesn't accept
+    are spooled to disk and sent with the next batch.
+    """
     def __init__(self):
         super().__init__()
         self.queue = Queue()
+        self.config = None
+        self.spool = None
+        self.backend_sink = BackendMetricSink()
+        self.local_sinks = []
         self.daemon = True
         self.start()
 
+    def load_config(self):
+        """Load the metrics config on first use.
+
+        Not done on creation to keep importing this module cheap.
+        """
+        self.config = Configuration.get().get('metrics', {})
+        spool_path = join(FileSystemAccess('metrics').path, 'spool.jsonl')
+        self.spool = MetricSpool(spool_path,
+                                 self.config.get('spool_size', 1000))
+        for sink_config in self.config.get('local_sinks', []):
+            sink = create_sink(sink_config)
+            if sink:
+                self.local_sinks.append(sink)
+
     def run(self):
         while True:
-            time.sleep(30)
+            try:
+                events = self.collect_batch()
+                if self.config is None:
+                    self.load_config()
+                self.export(events)
+            except Exception as e:
+                LOG.error('Could not send Metrics: {}'.format(repr(e)))
 
+    def collect_batch(self):
+        """Wait for events and collect them into a batch."""
+        events = [self.queue.get()]
+        config = self.config or {}
+        deadline = time.monotonic() + config.get('interval', 30)
+        batch_size = config.get('batch_size', 100)
+        while len(events) < batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
             try:
-                while True:  # Try read the queue until it fails
-                    report_metric(*self.queue.get_nowait())
-                    time.sleep(0.5)
+                events.append(self.queue.get(timeout=timeout))
             except Empty:
-                pass  # If the queue is empty just continue the loop
+                break
+        return events
+
+    def export(self, events):
+        """Export events to the local sinks and the backend."""
+        for sink in self.local_sinks:
+            try:
+                sink.export(events)
             except Exception as e:
-                LOG.error('Could not send Metrics: {}'.format(repr(e)))
+                LOG.error('Metric sink {} failed: {}'.format(
+                    sink.__class__.__name__, repr(e)))
+
+        unsent = self.backend_sink.export(self.spool.pop_all() + events)
+        if unsent:
+            self.spool.append(unsent)
+
+    def spool_pending(self):
+        """Spool queued events so they are not lost on shutdown."""
+        if self.spool is None or not Configuration.get().get('opt_in'):
+            return
+        events = []
+        try:
+            while True:
+                events.append(self.queue.get_nowait())
+        except Empty:
+            pass
+        if events:
+            self.spool.append(events)
 
 
 _metric_uploader = _MetricSender()
+atexit.register(_metric_uploader.spool_pending)
+
+
+def add_metric_sink(sink):
+    """Add a local destination for reported metric events.
+
+    Arguments:
+        sink (MetricSink): sink receiving batches of metric events
+    """
+    _metric_uploader.local_sinks.append(sink)
 
 
 def report_metric(name, data):
@@ -84,6 +211,7 @@ def report_timing(ident, system, timing, additional_data=None):
     report['start_time'] = timing.timestamp
     report['time'] = timing.time
 
+    add_span(ident, system, timing.timestamp, timing.time, additional_data)
     _metric_uploader.queue.put(('timing', report))
 
 
@@ -136,61 +264,21 @@ class Stopwatch:
             return 'Not started'
 
 
-class MetricsAggregator:
-    """
-    MetricsAggregator is not threadsafe, and multiple clients writing the
-    same metric "concurrently" may result in data loss.
+def publish_aggregates(payload):
+    """Publish aggregated metrics using the shared publisher thread.
+
+    Arguments:
+        payload (dict): MetricsAggregator snapshot
     """
+    global _aggregate_publisher
+    with _aggregate_publisher_lock:
+        if _aggregate_publisher is None:
+            _aggregate_publisher = ThreadPoolExecutor(max_workers=1)
+    _aggregate_publisher.submit(MetricsPublisher().publish, payload)
 
-    def __init__(self):
-        self._counters = {}
-        self._timers = {}
-        self._levels = {}
-        self._attributes = {}
-        self.attr("version", CORE_VERSION_STR)
-
-    def increment(self, name, value=1):
-        cur = self._counters.get(name, 0)
-        self._counters[name] = cur + value
-
-    def timer(self, name, value):
-        cur = self._timers.get(name)
-        if not cur:
-            self._timers[name] = []
-            cur = self._timers[name] = []
-        cur.append(value)
-
-    def level(self, name, value):
-        self._levels[name] = value
-
-    def clear(self):
-        self._counters = {}
-        self._timers = {}
-        self._levels = {}
-        self._attributes = {}
-        self.attr("version", CORE_VERSION_STR)
-
-    def attr(self, name, value):
-        self._attributes[name] = value
-
-    def flush(self):
-        publisher = MetricsPublisher()
-        payload = {
-            'counters': self._counters,
-            'timers': self._timers,
-            'levels': self._levels,
-            'attributes': self._attributes
-        }
-        self.clear()
-        count = (len(payload['counters']) + len(payload['timers']) +
-                 len(payload['levels']))
-        if count > 0:
-            # LOG.debug(json.dumps(payload))
-
-            def publish():
-                publisher.publish(payload)
-
-            threading.Thread(target=publish).start()
+
+_aggregate_publisher = None
+_aggregate_publisher_lock = threading.Lock()
 
 
 class MetricsPublisher:
@@ -0,0 +1,291 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""In process metrics registry with fixed memory use.
+
+Counters, levels and timer histograms are kept in memory and computed into
+percentiles only when exported. The current values can be scraped with the
+"mycroft.metrics.get" message or, if a port is configured for the process
+in metrics.http_ports, from http://localhost:<port>/metrics in the
+Prometheus text format (/metrics.json for JSON).
+"""
+import json
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Lock
+
+from mycroft.configuration import Configuration
+from mycroft.util import create_daemon
+from mycroft.util.log import LOG
+from mycroft.version import CORE_VERSION_STR
+
+# Upper bounds in seconds of the timer buckets, doubling from 1 ms to ~65 s
+DEFAULT_BUCKETS = tuple(0.001 * 2 ** i for i in range(17))
+PERCENTILES = (50, 90, 99)
+
+
+class Histogram:
+    """Fixed bucket histogram of timer values.
+
+    Memory use is constant regardless of the number of recorded values,
+    percentiles are estimated by interpolating within the buckets.
+
+    Arguments:
+        buckets (tuple): sorted upper bounds of the buckets, values above
+                         the last bound go into an overflow bucket
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Record a value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Estimate a percentile of the recorded values.
+
+        Arguments:
+            percent (float): percentile to estimate (0 - 100)
+
+        Returns:
+            float estimate, None if no values were recorded
+        """
+        if self.count == 0:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = (self.buckets[index] if index < len(self.buckets)
+                         else self.max)
+                # The recorded extremes are tighter than the bucket bounds
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        """Summarize the histogram as a json serializable dict."""
+        summary = {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max
+        }
+        for percent in PERCENTILES:
+            summary['p{}'.format(percent)] = self.percentile(percent)
+        return summary
+
+
+class MetricsAggregator:
+    """Registry of counters, levels and timer histograms.
+
+    Recording is thread safe and cheap enough to be done per audio chunk,
+    timer values are added to fixed size histograms instead of being
+    stored.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = {}
+        self._timers = {}
+        self._levels = {}
+        self._attributes = {}
+        self.attr("version", CORE_VERSION_STR)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def timer(self, name, value):
+        with self._lock:
+            histogram = self._timers.get(name)
+            if histogram is None:
+                histogram = self._timers[name] = Histogram()
+            histogram.add(value)
+
+    def level(self, name, value):
+        with self._lock:
+            self._levels[name] = value
+
+    def attr(self, name, value):
+        with self._lock:
+            self._attributes[name] = value
+
+    def _swap(self):
+        """Replace the collected values with empty ones.
+
+        Returns:
+            tuple of the previous counters, timers, levels and attributes
+        """
+        with self._lock:
+            values = (self._counters, self._timers, self._levels,
+                      self._attributes)
+            self._counters = {}
+            self._timers = {}
+            self._levels = {}
+            self._attributes = {'version': CORE_VERSION_STR}
+        return values
+
+    def clear(self):
+        self._swap()
+
+    def snapshot(self):
+        """Get the current values with the timers summarized.
+
+        Returns:
+            dict with counters, timers, levels and attributes
+        """
+        with self._lock:
+            return _summarize(self._counters, self._timers, self._levels,
+                              self._attributes)
+
+    def to_prometheus(self):
+        """Format the current values in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = _metric_name(name) + '_total'
+                lines.append('# TYPE {} counter'.format(metric))
+                lines.append('{} {}'.format(metric, value))
+            for name, value in sorted(self._levels.items()):
+                if isinstance(value, (int, float)):
+                    metric = _metric_name(name)
+                    lines.append('# TYPE {} gauge'.format(metric))
+                    lines.append('{} {}'.format(metric, value))
+            for name, histogram in sorted(self._timers.items()):
+                metric = _metric_name(name) + '_seconds'
+                lines.append('# TYPE {} histogram'.format(metric))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{{le="{}"}} {}'.format(
+                        metric, bound, cumulative))
+                lines.append('{}_bucket{{le="+Inf"}} {}'.format(
+                    metric, histogram.count))
+                lines.append('{}_sum {}'.format(metric, histogram.sum))
+                lines.append('{}_count {}'.format(metric, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Publish and reset the collected values."""
+        from mycroft.metrics import publish_aggregates
+        # Values recorded while publishing go to the next flush
+        payload = _summarize(*self._swap())
+        count = (len(payload['counters']) + len(payload['timers']) +
+                 len(payload['levels']))
+        if count > 0:
+            publish_aggregates(payload)
+
+
+def _summarize(counters, timers, levels, attributes):
+    """Copy the values into a dict with the timers summarized."""
+    return {
+        'counters': dict(counters),
+        'timers': {name: histogram.summary()
+                   for name, histogram in timers.items()},
+        'levels': dict(levels),
+        'attributes': dict(attributes)
+    }
+
+
+def _metric_name(name):
+    """Convert a metric name like "mycroft.wakeup" to a Prometheus name."""
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+
+_aggregator = None
+_aggregator_lock = Lock()
+
+
+def get_aggregator():
+    """Get the metrics registry shared by this process."""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            _aggregator = MetricsAggregator()
+        return _aggregator
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the process metrics over http."""
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = get_aggregator().to_prometheus()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body = json.dumps(get_aggregator().snapshot())
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes shouldn't spam the log
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve the process metrics on a local http port.
+
+    Arguments:
+        port (int): port to listen on
+        host (str): interface to listen on
+
+    Returns:
+        HTTPServer instance or None if the port couldn't be opened
+    """
+    try:
+        server = HTTPServer((host, port), _MetricsRequestHandler)
+    except OSError as e:
+        LOG.error('Could not serve metrics on port {} ({})'.format(port, e))
+        return None
+    create_daemon(server.serve_forever)
+    return server
+
+
+def setup_metrics_handlers(bus, process_name):
+    """Answer metrics scrapes on the messagebus and local http port.
+
+    Arguments:
+        bus: Message bus client instance
+        process_name (str): name of this process reported with the metrics
+    """
+    def handle_get(message):
+        bus.emit(message.response({'process': process_name,
+                                   'metrics': get_aggregator().snapshot()}))
+
+    bus.on('mycroft.metrics.get', handle_get)
+
+    config = Configuration.get().get('metrics', {})
+    port = config.get('http_ports', {}).get(process_name)
+    if port:
+        start_metrics_server(port)
@@ -0,0 +1,164 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Destinations for metric events collected by the metric sender."""
+import json
+import os
+import time
+from os.path import dirname, expanduser
+
+import requests
+
+from mycroft.api import DeviceApi, is_paired
+from mycroft.configuration import Configuration
+from mycroft.util.log import LOG
+
+
+class MetricSink:
+    """Base class for destinations of metric events.
+
+    A metric event is a tuple (name, data) as passed to report_metric().
+    """
+    def export(self, events):
+        """Export a batch of metric events.
+
+        Arguments:
+            events (list): (name, data) tuples to export
+
+        Returns:
+            list of the events that couldn't be exported and should be
+            retried later.
+        """
+        raise NotImplementedError
+
+
+class BackendMetricSink(MetricSink):
+    """Upload metric events to the Mycroft backend for opted in users.
+
+    The backend accepts a single metric per request, the events of a batch
+    are sent back to back over the kept alive connection of the DeviceApi.
+    """
+    def __init__(self):
+        self.api = None
+
+    def export(self, events):
+        if not Configuration.get().get('opt_in'):
+            return []  # Nothing may be sent, drop the events
+        if not is_paired():
+            return events
+
+        self.api = self.api or DeviceApi()
+        for index, (name, data) in enumerate(events):
+            try:
+                self.api.report_metric(name, data)
+            except requests.RequestException as e:
+                LOG.error('Metrics couldn\'t be uploaded, due to a network '
+                          'error ({})'.format(e))
+                return events[index:]
+            except Exception as e:
+                # Retrying won't help, skip the event
+                LOG.error('Could not send metric: {}'.format(repr(e)))
+        return []
+
+
+class FileMetricSink(MetricSink):
+    """Append metric events as JSON lines to a local file.
+
+    Arguments:
+        path (str): file to append the events to
+    """
+    def __init__(self, path):
+        self.path = expanduser(path)
+        os.makedirs(dirname(self.path), exist_ok=True)
+
+    def export(self, events):
+        with open(self.path, 'a') as f:
+            for name, data in events:
+                f.write(json.dumps({'time': time.time(), 'name': name,
+                                    'data': data}) + '\n')
+        return []
+
+
+class PrometheusMetricSink(MetricSink):
+    """Write metric event totals in the Prometheus text format.
+
+    The file is rewritten on each export and is meant to be picked up by
+    the node exporter textfile collector. Timing reports are summed per
+    system, other metrics are counted per name.
+
+    Arguments:
+        path (str): .prom file to write
+    """
+    def __init__(self, path):
+        self.path = expanduser(path)
+        os.makedirs(dirname(self.path), exist_ok=True)
+        self.event_counts = {}
+        self.timing_counts = {}
+        self.timing_sums = {}
+
+    def export(self, events):
+        for name, data in events:
+            self.event_counts[name] = self.event_counts.get(name, 0) + 1
+            if name == 'timing' and isinstance(data.get('time'), float):
+                system = data.get('system', 'unknown')
+                self.timing_counts[system] = \
+                    self.timing_counts.get(system, 0) + 1
+                self.timing_sums[system] = \
+                    self.timing_sums.get(system, 0.0) + data['time']
+
+        lines = ['# TYPE mycroft_metric_events_total counter']
+        lines += ['mycroft_metric_events_total{{name="{}"}} {}'.format(
+            _escape_label(name), count)
+            for name, count in sorted(self.event_counts.items())]
+        lines.append('# TYPE mycroft_timing_seconds summary')
+        for system in sorted(self.timing_counts):
+            label = _escape_label(system)
+            lines.append('mycroft_timing_seconds_sum{{system="{}"}} {}'.format(
+                label, self.timing_sums[system]))
+            lines.append(
+                'mycroft_timing_seconds_count{{system="{}"}} {}'.format(
+                    label, self.timing_counts[system]))
+
+        # Write atomically so the collector never reads a partial file
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+        return []
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+SINK_TYPES = {
+    'file': FileMetricSink,
+    'prometheus': PrometheusMetricSink
+}
+
+
+def create_sink(config):
+    """Create a local metric sink from its configuration.
+
+    Arguments:
+        config (dict): sink config with "type" and "path"
+
+    Returns:
+        MetricSink or None if the type isn't known
+    """
+    sink_type = SINK_TYPES.get(config.get('type'))
+    if sink_type is None:
+        LOG.error('Unknown metric sink {}'.format(config.get('type')))
+        return None
+    return sink_type(config['path'])
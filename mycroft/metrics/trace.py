@@ -0,0 +1,307 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Local latency traces of the voice pipeline.
+
+Each Mycroft process records timed spans of the stages an utterance passes
+through (wake word, recording, STT, intent matching, skill handler, TTS...)
+into a ring buffer of recent traces, linked by the utterance ident. The
+traces are kept locally, independent of the metrics upload opt in.
+
+The traces of all processes can be queried with the "mycroft.trace.get"
+message and converted to the Chrome trace event format to be viewed in
+chrome://tracing or https://ui.perfetto.dev:
+
+    python -m mycroft.metrics.trace [output.json] [ident]
+"""
+import json
+import sys
+import time
+from collections import OrderedDict
+from threading import Event, Lock
+
+from mycroft.configuration import Configuration
+from mycroft.util.log import LOG
+
+
+class TraceBuffer:
+    """Ring buffer holding the spans of the most recent utterances.
+
+    Spans recorded before the utterance ident is known, like the wake word
+    detection and the recording, are kept as pending until bound to an
+    ident.
+
+    Arguments:
+        max_traces (int): number of utterance traces to keep
+    """
+    def __init__(self, max_traces=32):
+        self.max_traces = max_traces
+        self.traces = OrderedDict()
+        self.pending = []
+        self.lock = Lock()
+
+    def add(self, ident, stage, start, duration, data=None):
+        """Add a span to the trace of an utterance.
+
+        Arguments:
+            ident (str): utterance identifier, None for a pending span
+            stage (str): name of the pipeline stage
+            start (float): start time of the span (time.time())
+            duration (float): duration in seconds
+            data (dict): additional information about the span
+        """
+        span = {
+            'stage': stage,
+            'start': start,
+            'duration': duration,
+            'data': data or {}
+        }
+        with self.lock:
+            if ident is None:
+                # Only keep as many pending spans as could be linked
+                self.pending = self.pending[-self.max_traces:] + [span]
+            else:
+                self._add_to_trace(ident, [span])
+
+    def bind(self, ident, until=None):
+        """Move pending spans into the trace of an utterance.
+
+        Arguments:
+            ident (str): utterance identifier
+            until (float): only bind spans started before this time
+        """
+        with self.lock:
+            if until is None:
+                spans, self.pending = self.pending, []
+            else:
+                spans = [s for s in self.pending if s['start'] <= until]
+                self.pending = [s for s in self.pending if s['start'] > until]
+            if spans:
+                self._add_to_trace(ident, spans)
+
+    def _add_to_trace(self, ident, spans):
+        if ident in self.traces:
+            self.traces[ident] += spans
+        else:
+            self.traces[ident] = spans
+            while len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+
+    def get(self, ident=None):
+        """Get recorded spans.
+
+        Arguments:
+            ident (str): utterance to get the spans for, None for all
+
+        Returns:
+            list of span dicts including the ident
+        """
+        with self.lock:
+            if ident is not None:
+                traces = {ident: self.traces.get(ident, [])}
+            else:
+                traces = self.traces
+            return [dict(span, ident=trace_ident)
+                    for trace_ident, spans in traces.items()
+                    for span in spans]
+
+    def clear(self):
+        with self.lock:
+            self.traces.clear()
+            self.pending = []
+
+
+_trace_buffer = TraceBuffer()
+_process_name = 'mycroft'
+
+
+class TraceSpan:
+    """Record the time spent in a with-block as a span.
+
+    Arguments:
+        ident (str): utterance identifier, nothing is recorded if None
+        stage (str): name of the pipeline stage
+        data (dict): additional information, can be updated in the block
+    """
+    def __init__(self, ident, stage, data=None):
+        self.ident = ident
+        self.stage = stage
+        self.data = data or {}
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, tpe, value, tb):
+        add_span(self.ident, self.stage, self.start,
+                 time.time() - self.start, self.data)
+
+
+def add_span(ident, stage, start, duration, data=None):
+    """Add a span to the trace of an utterance in this process.
+
+    Spans without ident, for example of utterances typed in the CLI, are
+    not recorded. See TraceBuffer.add() for arguments.
+    """
+    if ident is not None:
+        _trace_buffer.add(ident, stage, start, duration, data)
+
+
+def add_pending_span(stage, start, duration, data=None):
+    """Add a span recorded before the ident of the utterance is known.
+
+    The span is linked to the utterance using bind_pending_spans(). See
+    TraceBuffer.add() for arguments.
+    """
+    _trace_buffer.add(None, stage, start, duration, data)
+
+
+def bind_pending_spans(ident, until=None):
+    """Link spans recorded before the ident was known to the utterance.
+
+    See TraceBuffer.bind() for arguments.
+    """
+    _trace_buffer.bind(ident, until)
+
+
+def get_spans(ident=None):
+    """Get the spans recorded by this process.
+
+    See TraceBuffer.get() for arguments.
+    """
+    return _trace_buffer.get(ident)
+
+
+def to_chrome_trace(spans):
+    """Convert spans to the Chrome trace event format.
+
+    Each process is shown as a separate process and each utterance as a
+    thread of it.
+
+    Arguments:
+        spans (list): span dicts, with "process" set for spans of other
+                      processes
+
+    Returns:
+        dict that can be written as a json trace file
+    """
+    events = []
+    pids = {}
+    tids = {}
+    for span in sorted(spans, key=lambda s: s['start']):
+        process = span.get('process', _process_name)
+        if process not in pids:
+            pids[process] = len(pids) + 1
+            events.append({'name': 'process_name', 'ph': 'M',
+                           'pid': pids[process], 'tid': 0,
+                           'args': {'name': process}})
+        thread_key = (process, span['ident'])
+        if thread_key not in tids:
+            tids[thread_key] = len(tids) + 1
+            events.append({'name': 'thread_name', 'ph': 'M',
+                           'pid': pids[process], 'tid': tids[thread_key],
+                           'args': {'name': span['ident']}})
+        events.append({
+            'name': span['stage'],
+            'cat': 'mycroft',
+            'ph': 'X',
+            'ts': int(span['start'] * 1000000),
+            'dur': int(span['duration'] * 1000000),
+            'pid': pids[process],
+            'tid': tids[thread_key],
+            'args': span['data']
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def setup_trace_handlers(bus, process_name):
+    """Answer trace queries on the messagebus.
+
+    Arguments:
+        bus: Message bus client instance
+        process_name (str): name of this process reported with the spans
+    """
+    global _process_name
+    _process_name = process_name
+    config = Configuration.get().get('metrics', {})
+    _trace_buffer.max_traces = config.get('trace_size', 32)
+
+    def handle_get(message):
+        spans = get_spans(message.data.get('ident'))
+        for span in spans:
+            span['process'] = process_name
+        bus.emit(message.response({'process': process_name,
+                                   'spans': spans}))
+
+    bus.on('mycroft.trace.get', handle_get)
+
+
+def collect_spans(bus, ident=None, timeout=2.0):
+    """Query the spans of all processes over the messagebus.
+
+    Arguments:
+        bus: Message bus client instance
+        ident (str): utterance to get the spans for, None for all
+        timeout (float): seconds to wait for responses
+
+    Returns:
+        list of span dicts from all processes answering
+    """
+    from mycroft.messagebus.message import Message
+    spans = []
+    received = Event()
+
+    def handle_response(message):
+        spans.extend(message.data.get('spans', []))
+        received.set()
+
+    bus.on('mycroft.trace.get.response', handle_response)
+    bus.emit(Message('mycroft.trace.get', {'ident': ident}))
+    time.sleep(timeout)
+    bus.remove('mycroft.trace.get.response', handle_response)
+    if not received.is_set():
+        LOG.warning('No process answered the trace query')
+    return spans
+
+
+def main():
+    """Write the traces of all processes as a Chrome trace file.
+
+    Param 1:    output file, stdout if not provided
+    Param 2:    utterance ident, all traces if not provided
+    """
+    from mycroft.messagebus.client import MessageBusClient
+    from mycroft.util import create_daemon
+
+    bus = MessageBusClient()
+    connected = Event()
+    bus.once('open', connected.set)
+    create_daemon(bus.run_forever)
+    if not connected.wait(10):
+        print('Could not connect to the messagebus')
+        exit(1)
+
+    ident = sys.argv[2] if len(sys.argv) > 2 else None
+    trace = to_chrome_trace(collect_spans(bus, ident))
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w') as f:
+            json.dump(trace, f)
+    else:
+        print(json.dumps(trace))
+    bus.close()
+
+
+if __name__ == '__main__':
+    main()
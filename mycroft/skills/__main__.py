@@ -31,6 +31,8 @@ from mycroft.enclosure.api import EnclosureAPI
 from mycroft.configuration import Configuration
 from mycroft.messagebus.client import MessageBusClient
 from mycroft.messagebus.message import Message
+from mycroft.metrics import setup_metrics_handlers
+from mycroft.metrics.trace import setup_trace_handlers
 from mycroft.util import (
     connected,
     create_echo_function,
@@ -206,6 +208,8 @@ def _start_message_bus_client():
     Configuration.set_config_update_handlers(bus)
     bus_connected = Event()
     bus.on('message', create_echo_function('SKILLS'))
+    setup_trace_handlers(bus, 'skills')
+    setup_metrics_handlers(bus, 'skills')
     # Set the bus connected event when connection is established
     bus.once('open', bus_connected.set)
     create_daemon(bus.run_forever)
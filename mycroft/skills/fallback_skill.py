@@ -15,7 +15,12 @@
 """The fallback skill implements a special type of skill handling
 utterances not handled by the intent system.
 """
-import operator
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from threading import Lock
+
+from mycroft.configuration import Configuration
 from mycroft.metrics import report_timing, Stopwatch
 from mycroft.util.log import LOG
 
@@ -46,8 +51,19 @@ class FallbackSkill(MycroftSkill):
 
     A Fallback can either observe or consume an utterance. A consumed
     utterance will not be see by any other Fallback handlers.
+
+    With skills.concurrent_fallbacks enabled the handlers of each priority
+    range in the table above are run in parallel and the numerically
+    lowest priority handler consuming the utterance wins. The other
+    handlers of the range are still run to completion.
     """
     fallback_handlers = {}
+    # Registered handlers as sorted (requested priority, priority) tuples
+    fallback_order = []
+    fallback_priorities = {}  # handler: (requested priority, priority)
+    fallback_lock = Lock()
+    # Upper bounds of the priority ranges run in parallel
+    fallback_tiers = (4, 5, 88, 89, 99)
 
     def __init__(self, name=None, bus=None, use_settings=True):
         super().__init__(name, bus, use_settings)
@@ -56,8 +72,19 @@ class FallbackSkill(MycroftSkill):
         self.instance_fallback_handlers = []
 
     @classmethod
-    def make_intent_failure_handler(cls, bus):
-        """Goes through all fallback handlers until one returns True"""
+    def make_intent_failure_handler(cls, bus, concurrent=None):
+        """Goes through all fallback handlers until one returns True
+
+        Arguments:
+            bus: Messagebus connection to report the result on
+            concurrent (bool): run the handlers of each priority range in
+                               parallel, defaults to
+                               skills.concurrent_fallbacks
+        """
+        if concurrent is None:
+            concurrent = Configuration.get()['skills'].get(
+                'concurrent_fallbacks', False)
+        executor = ThreadPoolExecutor() if concurrent else None
 
         def handler(message):
             # indicate fallback handling start
@@ -67,19 +94,18 @@ class FallbackSkill(MycroftSkill):
             stopwatch = Stopwatch()
             handler_name = None
             with stopwatch:
-                for _, handler in sorted(cls.fallback_handlers.items(),
-                                         key=operator.itemgetter(0)):
-                    try:
-                        if handler(message):
-                            #  indicate completion
-                            handler_name = get_handler_name(handler)
-                            bus.emit(message.forward(
-                                     'mycroft.skill.handler.complete',
-                                     data={'handler': "fallback",
-                                           "fallback_handler": handler_name}))
-                            break
-                    except Exception:
-                        LOG.exception('Exception in fallback.')
+                if executor:
+                    fallback = cls._run_fallbacks_concurrently(message,
+                                                               executor)
+                else:
+                    fallback = cls._run_fallbacks(message)
+                if fallback:
+                    #  indicate completion
+                    handler_name = get_handler_name(fallback)
+                    bus.emit(message.forward(
+                             'mycroft.skill.handler.complete',
+                             data={'handler': "fallback",
+                                   "fallback_handler": handler_name}))
                 else:  # No fallback could handle the utterance
                     bus.emit(message.forward('complete_intent_failure'))
                     warning = "No fallback could handle intent."
@@ -97,6 +123,54 @@ class FallbackSkill(MycroftSkill):
 
         return handler
 
+    @classmethod
+    def _sorted_handlers(cls):
+        """Get the (requested priority, handler) pairs in priority order."""
+        with cls.fallback_lock:
+            return [(requested, cls.fallback_handlers[priority])
+                    for requested, priority in cls.fallback_order]
+
+    @staticmethod
+    def _call_fallback(handler, message):
+        try:
+            return handler(message)
+        except Exception:
+            LOG.exception('Exception in fallback.')
+            return False
+
+    @classmethod
+    def _run_fallbacks(cls, message):
+        """Call the fallback handlers one by one in priority order.
+
+        Returns:
+            the handler consuming the utterance, None if none did
+        """
+        for _, handler in cls._sorted_handlers():
+            if cls._call_fallback(handler, message):
+                return handler
+        return None
+
+    @classmethod
+    def _run_fallbacks_concurrently(cls, message, executor):
+        """Call the handlers of each priority range in parallel.
+
+        Returns:
+            the numerically lowest priority handler consuming the
+            utterance, None if none did
+        """
+        def get_tier(entry):
+            return bisect_left(cls.fallback_tiers, entry[0])
+
+        for _, tier in groupby(cls._sorted_handlers(), key=get_tier):
+            futures = [(handler, executor.submit(cls._call_fallback,
+                                                 handler, message))
+                       for _, handler in tier]
+            # Results are checked in priority order
+            for handler, future in futures:
+                if future.result():
+                    return handler
+        return None
+
     @classmethod
     def _register_fallback(cls, handler, priority):
         """Register a function to be called as a general info fallback
@@ -106,10 +180,14 @@ class FallbackSkill(MycroftSkill):
         Lower priority gets run first
         0 for high priority 100 for low priority
         """
-        while priority in cls.fallback_handlers:
-            priority += 1
+        with cls.fallback_lock:
+            requested = priority
+            while priority in cls.fallback_handlers:
+                priority += 1
 
-        cls.fallback_handlers[priority] = handler
+            cls.fallback_handlers[priority] = handler
+            cls.fallback_priorities[handler] = (requested, priority)
+            insort(cls.fallback_order, (requested, priority))
 
     def register_fallback(self, handler, priority):
         """Register a fallback with the list of fallback handlers and with the
@@ -132,11 +210,13 @@ class FallbackSkill(MycroftSkill):
         Arguments:
             handler_to_del: reference to handler
         """
-        for priority, handler in cls.fallback_handlers.items():
-            if handler == handler_to_del:
-                del cls.fallback_handlers[priority]
+        with cls.fallback_lock:
+            key = cls.fallback_priorities.pop(handler_to_del, None)
+            if key is None:
+                LOG.warning('Could not remove fallback!')
                 return
-        LOG.warning('Could not remove fallback!')
+            del cls.fallback_handlers[key[1]]
+            del cls.fallback_order[bisect_left(cls.fallback_order, key)]
 
     def remove_instance_handlers(self):
         """Remove all fallback handlers registered by the fallback skill."""
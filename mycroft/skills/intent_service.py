@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
+from threading import Lock, RLock, Timer
 import time
 from adapt.context import ContextManagerFrame
 from adapt.engine import IntentDeterminationEngine
@@ -23,6 +26,7 @@ from mycroft.util.lang import set_active_lang
 from mycroft.util.log import LOG
 from mycroft.util.parse import normalize
 from mycroft.metrics import report_timing, Stopwatch
+from mycroft.metrics.trace import TraceSpan
 from mycroft.skills.padatious_service import PadatiousService
 from .intent_service_interface import open_intent_envelope
 
@@ -51,18 +55,41 @@ class ContextManager:
     ContextManager
     Use to track context throughout the course of a conversational session.
     How to manage a session's lifecycle is not captured here.
+
+    Frames are kept newest first. As all frames share the same timeout they
+    expire in the order they were added, a single timer drops the oldest
+    frames when they expire instead of checking timestamps on each access.
+    The context handed to Adapt is computed once after each change.
     """
 
     def __init__(self, timeout):
-        self.frame_stack = []
+        self.frame_stack = deque()  # (frame, timestamp) tuples, newest first
         self.timeout = timeout * 60  # minutes to seconds
+        self.lock = RLock()
+        self.expiry_timer = None
+        # Computed context per max_frames, entity type: entity
+        self.snapshots = {}
 
     def clear_context(self):
-        self.frame_stack = []
+        with self.lock:
+            self.frame_stack.clear()
+            self._context_changed()
 
     def remove_context(self, context_id):
-        self.frame_stack = [(f, t) for (f, t) in self.frame_stack
-                            if context_id in f.entities[0].get('data', [])]
+        """Remove all entities of a type from the context.
+
+        Arguments:
+            context_id (str): entity type to remove
+        """
+        with self.lock:
+            stack = deque()
+            for frame, timestamp in self.frame_stack:
+                frame.entities = [e for e in frame.entities
+                                  if _entity_type(e) != context_id]
+                if frame.entities:
+                    stack.append((frame, timestamp))
+            self.frame_stack = stack
+            self._context_changed()
 
     def inject_context(self, entity, metadata=None):
         """
@@ -75,40 +102,65 @@ class ContextManager:
             metadata(object): dict, arbitrary metadata about entity injected
         """
         metadata = metadata or {}
-        try:
-            if len(self.frame_stack) > 0:
-                top_frame = self.frame_stack[0]
-            else:
-                top_frame = None
-            if top_frame and top_frame[0].metadata_matches(metadata):
-                top_frame[0].merge_context(entity, metadata)
-            else:
-                frame = ContextManagerFrame(entities=[entity],
-                                            metadata=metadata.copy())
-                self.frame_stack.insert(0, (frame, time.time()))
-        except (IndexError, KeyError):
-            pass
-
-    def get_context(self, max_frames=None, missing_entities=None):
-        """ Constructs a list of entities from the context.
-
-        Args:
-            max_frames(int): maximum number of frames to look back
-            missing_entities(list of str): a list or set of tag names,
-            as strings
-
-        Returns:
-            list: a list of entities
+        with self.lock:
+            try:
+                if len(self.frame_stack) > 0:
+                    top_frame = self.frame_stack[0]
+                else:
+                    top_frame = None
+                if top_frame and top_frame[0].metadata_matches(metadata):
+                    top_frame[0].merge_context(entity, metadata)
+                else:
+                    frame = ContextManagerFrame(entities=[entity],
+                                                metadata=metadata.copy())
+                    self.frame_stack.appendleft((frame, time.time()))
+                    self._schedule_expiry()
+            except (IndexError, KeyError):
+                pass
+            self._context_changed()
+
+    def _context_changed(self):
+        self.snapshots = {}
+
+    def _schedule_expiry(self):
+        """Start a timer for the oldest frame if none is running."""
+        if self.expiry_timer or not self.frame_stack:
+            return
+        _, oldest = self.frame_stack[-1]
+        delay = max(oldest + self.timeout - time.time(), 0)
+        self.expiry_timer = Timer(delay, self._expire_frames)
+        self.expiry_timer.daemon = True
+        self.expiry_timer.start()
+
+    def _expire_frames(self):
+        """Drop expired frames and wait for the next one to expire."""
+        with self.lock:
+            self.expiry_timer = None
+            now = time.time()
+            expired = False
+            while (self.frame_stack and
+                   now - self.frame_stack[-1][1] >= self.timeout):
+                self.frame_stack.pop()
+                expired = True
+            if expired:
+                self._context_changed()
+            self._schedule_expiry()
+
+    def _get_snapshot(self, max_frames):
+        """Get the context entities by type, latest instance of each type.
+
+        Must be called holding the lock.
         """
-        missing_entities = missing_entities or []
+        if max_frames not in self.snapshots:
+            self.snapshots[max_frames] = self._build_snapshot(max_frames)
+        return self.snapshots[max_frames]
 
-        relevant_frames = [frame[0] for frame in self.frame_stack if
-                           time.time() - frame[1] < self.timeout]
+    def _build_snapshot(self, max_frames):
+        relevant_frames = [frame[0] for frame in self.frame_stack]
         if not max_frames or max_frames > len(relevant_frames):
             max_frames = len(relevant_frames)
 
-        missing_entities = list(missing_entities)
-        context = []
+        context = OrderedDict()
         last = ''
         depth = 0
         for i in range(max_frames):
@@ -117,39 +169,46 @@ class ContextManager:
             for entity in frame_entities:
                 entity['confidence'] = entity.get('confidence', 1.0) \
                                        / (2.0 + depth)
-            context += frame_entities
+                # Only use the latest instance of each keyword
+                context.setdefault(_entity_type(entity), entity)
 
             # Update depth
             if entity['origin'] != last or entity['origin'] == '':
                 depth += 1
             last = entity['origin']
+        return context
 
-        result = []
-        if len(missing_entities) > 0:
-            for entity in context:
-                if entity.get('data') in missing_entities:
-                    result.append(entity)
-                    # NOTE: this implies that we will only ever get one
-                    # of an entity kind from context, unless specified
-                    # multiple times in missing_entities. Cannot get
-                    # an arbitrary number of an entity kind.
-                    missing_entities.remove(entity.get('data'))
-        else:
-            result = context
+    def get_context(self, max_frames=None, missing_entities=None):
+        """ Constructs a list of entities from the context.
+
+        Args:
+            max_frames(int): maximum number of frames to look back
+            missing_entities(list of str): a list or set of tag names,
+            as strings
 
-        # Only use the latest instance of each keyword
-        stripped = []
-        processed = []
-        for f in result:
-            keyword = f['data'][0][1]
-            if keyword not in processed:
-                stripped.append(f)
-                processed.append(keyword)
-        result = stripped
-        return result
+        Returns:
+            list: a list of entities
+        """
+        with self.lock:
+            context = self._get_snapshot(max_frames)
+        # NOTE: this implies that we will only ever get one of an entity
+        # kind from context. Cannot get an arbitrary number of an entity
+        # kind.
+        if missing_entities:
+            return [entity for entity_type, entity in context.items()
+                    if entity_type in missing_entities]
+        # A new list since Adapt sorts the context in place
+        return list(context.values())
+
+
+def _entity_type(entity):
+    """Get the type of a context entity, e.g. "Location"."""
+    return entity['data'][0][1]
 
 
 class IntentService:
+    max_normalized = 16  # Normalized utterances kept for reuse
+
     def __init__(self, bus):
         self.config = Configuration.get().get('context', {})
         self.engine = IntentDeterminationEngine()
@@ -166,6 +225,8 @@ class IntentService:
         self.bus.on('register_vocab', self.handle_register_vocab)
         self.bus.on('register_intent', self.handle_register_intent)
         self.bus.on('recognizer_loop:utterance', self.handle_utterance)
+        self.bus.on('recognizer_loop:partial_utterance',
+                    self.handle_partial_utterance)
         self.bus.on('detach_intent', self.handle_detach_intent)
         self.bus.on('detach_skill', self.handle_detach_skill)
         # Context related handlers
@@ -181,6 +242,13 @@ class IntentService:
 
         self.bus.on('active_skill_request', add_active_skill_handler)
         self.active_skills = []  # [skill_id , timestamp]
+
+        # Partial transcripts are matched ahead in a single worker, only
+        # the latest hypothesis is processed if the worker falls behind
+        self.partial_utterance = None
+        self.prewarm_executor = ThreadPoolExecutor(max_workers=1)
+        self.normalized = OrderedDict()  # {(utterance, lang): normalized}
+        self.normalized_lock = Lock()
         self.converse_timeout = 5  # minutes to prune active_skills
 
         # Intents API
@@ -324,8 +392,7 @@ class IntentService:
 
             utterances = message.data.get('utterances', [])
             # normalize() changes "it's a boy" to "it is a boy", etc.
-            norm_utterances = [normalize(u.lower(), remove_articles=False)
-                               for u in utterances]
+            norm_utterances = [self._normalize(u, lang) for u in utterances]
 
             # Build list with raw utterance(s) first, then optionally a
             # normalized version following.
@@ -336,21 +403,27 @@ class IntentService:
             stopwatch = Stopwatch()
             intent = None
             padatious_intent = None
+            ident = (message.context or {}).get('ident')
             with stopwatch:
                 # Give active skills an opportunity to handle the utterance
-                converse = self._converse(combined, lang, message)
+                with TraceSpan(ident, 'converse'):
+                    converse = self._converse(combined, lang, message)
 
                 if not converse:
                     # No conversation, use intent system to handle utterance
-                    intent = self._adapt_intent_match(utterances,
-                                                      norm_utterances, lang)
-                    for utt in combined:
-                        _intent = PadatiousService.instance.calc_intent(utt)
-                        if _intent:
-                            best = padatious_intent.conf if padatious_intent \
-                                else 0.0
-                            if best < _intent.conf:
-                                padatious_intent = _intent
+                    with TraceSpan(ident, 'adapt'):
+                        intent = self._adapt_intent_match(utterances,
+                                                          norm_utterances,
+                                                          lang)
+                    with TraceSpan(ident, 'padatious'):
+                        for utt in combined:
+                            _intent = PadatiousService.instance.calc_intent(
+                                utt, ident)
+                            if _intent:
+                                best = padatious_intent.conf \
+                                    if padatious_intent else 0.0
+                                if best < _intent.conf:
+                                    padatious_intent = _intent
                     LOG.debug("Padatious intent: {}".format(padatious_intent))
                     LOG.debug("    Adapt intent: {}".format(intent))
 
@@ -392,6 +465,50 @@ class IntentService:
         except Exception as e:
             LOG.exception(e)
 
+    def _normalize(self, utterance, lang):
+        """Normalize an utterance, reusing the result for partials."""
+        key = (utterance, lang)
+        with self.normalized_lock:
+            if key in self.normalized:
+                return self.normalized[key]
+        norm = normalize(utterance.lower(), lang, remove_articles=False)
+        with self.normalized_lock:
+            self.normalized[key] = norm
+            while len(self.normalized) > self.max_normalized:
+                self.normalized.popitem(last=False)
+        return norm
+
+    def handle_partial_utterance(self, message):
+        """Prepare matching an utterance from an interim STT hypothesis.
+
+        The normalization and Padatious match of the hypothesis are
+        computed while the user is still speaking, if it equals the final
+        utterance these are ready when the utterance arrives.
+
+        Args:
+            message (Message): recognizer_loop:partial_utterance message
+        """
+        utterances = message.data.get('utterances', [])
+        if not utterances:
+            return
+        partial = (utterances[0], message.data.get('lang', 'en-us'))
+        self.partial_utterance = partial
+        self.prewarm_executor.submit(self._prewarm, partial)
+
+    def _prewarm(self, partial):
+        if partial != self.partial_utterance:
+            return  # A newer hypothesis has arrived
+        try:
+            utterance, lang = partial
+            norm = self._normalize(utterance, lang)
+            padatious = PadatiousService.instance
+            if padatious:
+                padatious.prewarm_intent(utterance)
+                if norm != utterance:
+                    padatious.prewarm_intent(norm)
+        except Exception:
+            LOG.exception('Failed to prepare partial utterance')
+
     def _converse(self, utterances, lang, message):
         """Give active skills a chance at the utterance
 
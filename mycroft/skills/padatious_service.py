@@ -12,10 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-from functools import lru_cache
+import multiprocessing
+from collections import OrderedDict
 from subprocess import call
-from threading import Event
-from time import time as get_time, sleep
+from threading import Event, Lock, Timer
 
 from os.path import expanduser, isfile
 
@@ -25,12 +25,45 @@ from mycroft.skills.core import FallbackSkill
 from mycroft.util.log import LOG
 
 
+def _load_container(cache_dir, intents, entities):
+    """Create an IntentContainer holding the given intent and entity files.
+
+    Arguments:
+        cache_dir (str): padatious cache directory
+        intents (dict): intent name: file name
+        entities (dict): entity name: file name
+
+    Returns:
+        IntentContainer, needs to be trained before use
+    """
+    from padatious import IntentContainer
+    container = IntentContainer(cache_dir)
+    for name, file_name in entities.items():
+        container.load_entity(name, file_name)
+    for name, file_name in intents.items():
+        container.load_intent(name, file_name)
+    return container
+
+
+def _train_to_cache(cache_dir, intents, entities, single_thread):
+    """Train the intents in a worker process.
+
+    The trained networks are written to the cache, only intents and
+    entities with a changed file are retrained.
+    """
+    container = _load_container(cache_dir, intents, entities)
+    container.train(single_thread=single_thread)
+
+
 class PadatiousService(FallbackSkill):
     instance = None
 
     fallback_tight_match = 5  # Fallback priority for the conf > 0.8 match
     fallback_loose_match = 89  # Fallback priority for the conf > 0.5 match
 
+    max_cached_utterances = 16  # Number of utterance idents kept in cache
+    max_cached_strings = 8  # Strings cached per utterance ident
+
     def __init__(self, bus, service):
         FallbackSkill.__init__(self, use_settings=False)
         if not PadatiousService.instance:
@@ -51,6 +84,7 @@ class PadatiousService(FallbackSkill):
                 pass
             return
 
+        self.intent_cache = intent_cache
         self.container = IntentContainer(intent_cache)
 
         self._bus = bus
@@ -77,16 +111,33 @@ class PadatiousService(FallbackSkill):
         self.finished_initial_train = False
 
         self.train_delay = self.padatious_config['train_delay']
-        self.train_time = get_time() + self.train_delay
+        self.train_timer = None
+        self.train_lock = Lock()  # Serializes training runs
+        self.container_lock = Lock()  # Protects the loaded files
 
         self.registered_intents = []
         self.registered_entities = []
+        self.intent_files = {}  # name: file name, loaded on next training
+        self.entity_files = {}
+
+        # Results of calc_intent, {ident: {utterance string: MatchData}}
+        self.intent_results = OrderedDict()
+        # Results computed ahead from partial transcripts, {string: MatchData}
+        self.partial_results = OrderedDict()
+        self.results_lock = Lock()
+        self.container_generation = 0  # Changed when the container changes
 
     def make_active(self):
         """Override the make active since this is not a real fallback skill."""
         pass
 
     def train(self, message=None):
+        """Train the registered intents and swap in the new model.
+
+        Training runs in a worker process writing to the padatious cache,
+        the new IntentContainer is then loaded from the cache. The current
+        container keeps handling utterances until the new one is ready.
+        """
         padatious_single_thread = Configuration.get()[
             'padatious']['single_thread']
         if message is None:
@@ -95,11 +146,20 @@ class PadatiousService(FallbackSkill):
             single_thread = message.data.get('single_thread',
                                              padatious_single_thread)
 
-        self.finished_training_event.clear()
-
-        LOG.info('Training... (single_thread={})'.format(single_thread))
-        self.container.train(single_thread=single_thread)
-        LOG.info('Training complete.')
+        with self.train_lock:
+            with self.container_lock:
+                intents = dict(self.intent_files)
+                entities = dict(self.entity_files)
+
+            LOG.info('Training... (single_thread={})'.format(single_thread))
+            if intents or entities:
+                self._train_in_worker(intents, entities, single_thread)
+            # Only loads the networks trained by the worker
+            container = _load_container(self.intent_cache, intents,
+                                        entities)
+            container.train(single_thread=single_thread)
+            self._swap_container(container, intents)
+            LOG.info('Training complete.')
 
         self.finished_training_event.set()
         if not self.finished_initial_train:
@@ -107,16 +167,47 @@ class PadatiousService(FallbackSkill):
             self.bus.emit(Message('mycroft.ready'))
             self.finished_initial_train = True
 
-    def wait_and_train(self):
-        if not self.finished_initial_train:
-            return
-        sleep(self.train_delay)
-        if self.train_time < 0.0:
-            return
+    def _train_in_worker(self, intents, entities, single_thread):
+        """Train in a separate process to keep the GIL free for skills."""
+        context = multiprocessing.get_context('spawn')
+        worker = context.Process(target=_train_to_cache,
+                                 args=(self.intent_cache, intents, entities,
+                                       single_thread))
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            LOG.error('Padatious training worker failed ({}), training '
+                      'in process'.format(worker.exitcode))
 
-        if self.train_time <= get_time() + 0.01:
-            self.train_time = -1.0
-            self.train()
+    def _swap_container(self, container, intents):
+        """Replace the container used for matching.
+
+        Intents detached while training are removed from the new container
+        first.
+
+        Arguments:
+            container (IntentContainer): newly trained container
+            intents (dict): intents loaded into the container
+        """
+        with self.container_lock:
+            for name in intents:
+                if name not in self.intent_files:
+                    container.remove_intent(name)
+            if container.must_train:
+                container.train(single_thread=True)
+            self.container = container
+            self.clear_intent_cache()
+
+    def schedule_training(self):
+        """Retrain once no new files are registered for train_delay seconds.
+        """
+        if not (self.finished_initial_train or self.train_lock.locked()):
+            return  # The initial training will include the file
+        if self.train_timer:
+            self.train_timer.cancel()
+        self.train_timer = Timer(self.train_delay, self.train)
+        self.train_timer.daemon = True
+        self.train_timer.start()
 
     def __detach_intent(self, intent_name):
         """ Remove an intent if it has been registered.
@@ -126,7 +217,10 @@ class PadatiousService(FallbackSkill):
         """
         if intent_name in self.registered_intents:
             self.registered_intents.remove(intent_name)
-            self.container.remove_intent(intent_name)
+            with self.container_lock:
+                self.intent_files.pop(intent_name, None)
+                self.container.remove_intent(intent_name)
+                self.clear_intent_cache()
 
     def handle_detach_intent(self, message):
         self.__detach_intent(message.data.get('intent_name'))
@@ -137,7 +231,7 @@ class PadatiousService(FallbackSkill):
         for i in remove_list:
             self.__detach_intent(i)
 
-    def _register_object(self, message, object_name, register_func):
+    def _register_object(self, message, object_name, files):
         file_name = message.data['file_name']
         name = message.data['name']
 
@@ -147,17 +241,17 @@ class PadatiousService(FallbackSkill):
             LOG.warning('Could not find file ' + file_name)
             return
 
-        register_func(name, file_name)
-        self.train_time = get_time() + self.train_delay
-        self.wait_and_train()
+        with self.container_lock:
+            files[name] = file_name
+        self.schedule_training()
 
     def register_intent(self, message):
         self.registered_intents.append(message.data['name'])
-        self._register_object(message, 'intent', self.container.load_intent)
+        self._register_object(message, 'intent', self.intent_files)
 
     def register_entity(self, message):
         self.registered_entities.append(message.data)
-        self._register_object(message, 'entity', self.container.load_entity)
+        self._register_object(message, 'entity', self.entity_files)
 
     def handle_fallback(self, message, threshold=0.8):
         if not self.finished_training_event.is_set():
@@ -165,15 +259,16 @@ class PadatiousService(FallbackSkill):
             return False
 
         utt = message.data.get('utterance', '')
+        ident = (message.context or {}).get('ident')
         LOG.debug("Padatious fallback attempt: " + utt)
-        intent = self.calc_intent(utt)
+        intent = self.calc_intent(utt, ident)
 
         if not intent or intent.conf < threshold:
             # Attempt to use normalized() version
             norm = message.data.get('norm_utt', utt)
             if norm != utt:
                 LOG.debug("               alt attempt: " + norm)
-                intent = self.calc_intent(norm)
+                intent = self.calc_intent(norm, ident)
                 utt = norm
         if not intent or intent.conf < threshold:
             return False
@@ -189,9 +284,10 @@ class PadatiousService(FallbackSkill):
     def handle_get_padatious(self, message):
         utterance = message.data["utterance"]
         norm = message.data.get('norm_utt', utterance)
-        intent = self.calc_intent(utterance)
+        ident = (message.context or {}).get('ident')
+        intent = self.calc_intent(utterance, ident)
         if not intent and norm != utterance:
-            intent = PadatiousService.instance.calc_intent(norm)
+            intent = self.calc_intent(norm, ident)
         if intent:
             intent = intent.__dict__
         self.bus.emit(message.reply("intent.service.padatious.reply",
@@ -206,8 +302,79 @@ class PadatiousService(FallbackSkill):
             message.reply("intent.service.padatious.entities.manifest",
                           {"entities": self.registered_entities}))
 
-    # NOTE: This cache will keep a reference to this calss (PadatiousService),
-    # but we can live with that since it is used as a singleton.
-    @lru_cache(maxsize=2)  # 2 catches both raw and normalized utts in cache
-    def calc_intent(self, utt):
-        return self.container.calc_intent(utt)
+    def calc_intent(self, utt, ident=None):
+        """Get the best matching Padatious intent for a string.
+
+        Results are cached per utterance ident until the intents change, so
+        the intent service and the fallbacks share one calculation for the
+        raw and normalized strings of an utterance. Results computed ahead
+        by prewarm_intent() are reused.
+
+        Arguments:
+            utt (str): string to match
+            ident (str): identifier of the utterance the string is from
+
+        Returns:
+            MatchData, a copy callers are free to modify
+        """
+        with self.results_lock:
+            results = self.intent_results.get(ident)
+            if results is not None and utt in results:
+                self.intent_results.move_to_end(ident)
+                return _copy_match(results[utt])
+            generation = self.container_generation
+            intent = self.partial_results.get(utt)
+
+        if intent is None:
+            intent = self.container.calc_intent(utt)
+
+        with self.results_lock:
+            # Don't cache results from a replaced container
+            if generation == self.container_generation:
+                results = self.intent_results.setdefault(ident, {})
+                if len(results) >= self.max_cached_strings:
+                    results.pop(next(iter(results)))
+                results[utt] = intent
+                self.intent_results.move_to_end(ident)
+                while len(self.intent_results) > self.max_cached_utterances:
+                    self.intent_results.popitem(last=False)
+        return _copy_match(intent)
+
+    def prewarm_intent(self, utt):
+        """Match a partial transcript before the final utterance arrives.
+
+        The result is used by calc_intent() if the final utterance (or its
+        normalized version) turns out to be the same string.
+
+        Arguments:
+            utt (str): interim hypothesis of the STT
+        """
+        if not self.finished_training_event.is_set():
+            return
+        with self.results_lock:
+            if utt in self.partial_results:
+                return
+            generation = self.container_generation
+
+        intent = self.container.calc_intent(utt)
+
+        with self.results_lock:
+            if generation == self.container_generation:
+                self.partial_results[utt] = intent
+                while len(self.partial_results) > self.max_cached_strings:
+                    self.partial_results.popitem(last=False)
+
+    def clear_intent_cache(self):
+        """Forget cached intent results after the intents changed."""
+        with self.results_lock:
+            self.intent_results.clear()
+            self.partial_results.clear()
+            self.container_generation += 1
+
+
+def _copy_match(intent):
+    """Copy a MatchData so the cached version isn't modified."""
+    if intent is None:
+        return None
+    return type(intent)(intent.name, intent.sent, dict(intent.matches),
+                        intent.conf)
@@ -14,7 +14,9 @@
 #
 import re
 import json
+import time
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from requests import post, put, exceptions
 from speech_recognition import Recognizer
 from queue import Queue
@@ -22,19 +24,38 @@ from threading import Thread
 
 from mycroft.api import STTApi, HTTPError
 from mycroft.configuration import Configuration
+from mycroft.identity import IdentityManager
+from mycroft.stt.encoder import EncodedAudioData, create_encoder
 from mycroft.util.log import LOG
 
 
 class STT(metaclass=ABCMeta):
-    """ STT Base class, all  STT backends derives from this one. """
-    def __init__(self):
+    """ STT Base class, all  STT backends derives from this one.
+
+    Arguments:
+        module (str): config section of the engine, None to use the
+                      section of stt.module
+    """
+    def __init__(self, module=None):
         config_core = Configuration.get()
         self.lang = str(self.init_language(config_core))
         config_stt = config_core.get("stt", {})
-        self.config = config_stt.get(config_stt.get("module"), {})
+        module = module or config_stt.get("module")
+        self.config = config_stt.get(module, {})
         self.credential = self.config.get("credential", {})
+        # Send on the alternative transcriptions, not only the best one
+        self.multiple_hypotheses = self.config.get('multiple_hypotheses',
+                                                   False)
         self.recognizer = Recognizer()
         self.can_stream = False
+        self._encoder = None
+
+    @property
+    def encoder(self):
+        """Audio encoder selected with "encoder" in the module config."""
+        if self._encoder is None:
+            self._encoder = create_encoder(self.config.get('encoder'))
+        return self._encoder
 
     @staticmethod
     def init_language(config_core):
@@ -48,60 +69,104 @@ class STT(metaclass=ABCMeta):
     def execute(self, audio, language=None):
         pass
 
+    def hypotheses(self, audio, language=None):
+        """Transcribe the audio into alternative transcriptions.
+
+        Engines not reporting how confident they are get the "confidence"
+        set in their config.
+
+        Arguments:
+            audio (AudioData): recorded utterance
+            language (str): language of the utterance
+
+        Returns:
+            list of (text, confidence) tuples, the most likely first
+        """
+        text = self.execute(audio, language)
+        if text is None:
+            return []
+        return [(text, self.config.get('confidence', 1.0))]
+
+
+def _with_confidence(alternatives, text_key, default):
+    """Get (text, confidence) pairs from alternatives of an STT response.
+
+    Services often only report the confidence of the best alternative, the
+    following ones get the confidence of the alternative before them.
+    """
+    hypotheses = []
+    confidence = default
+    for alternative in alternatives:
+        if text_key in alternative:
+            confidence = alternative.get('confidence', confidence)
+            hypotheses.append((alternative[text_key], confidence))
+    return hypotheses
+
 
 class TokenSTT(STT, metaclass=ABCMeta):
-    def __init__(self):
-        super(TokenSTT, self).__init__()
+    def __init__(self, module=None):
+        super(TokenSTT, self).__init__(module)
         self.token = str(self.credential.get("token"))
 
 
 class GoogleJsonSTT(STT, metaclass=ABCMeta):
-    def __init__(self):
-        super(GoogleJsonSTT, self).__init__()
+    def __init__(self, module=None):
+        super(GoogleJsonSTT, self).__init__(module)
         self.json_credentials = json.dumps(self.credential.get("json"))
 
 
 class BasicSTT(STT, metaclass=ABCMeta):
 
-    def __init__(self):
-        super(BasicSTT, self).__init__()
+    def __init__(self, module=None):
+        super(BasicSTT, self).__init__(module)
         self.username = str(self.credential.get("username"))
         self.password = str(self.credential.get("password"))
 
 
 class KeySTT(STT, metaclass=ABCMeta):
 
-    def __init__(self):
-        super(KeySTT, self).__init__()
+    def __init__(self, module=None):
+        super(KeySTT, self).__init__(module)
         self.id = str(self.credential.get("client_id"))
         self.key = str(self.credential.get("client_key"))
 
 
 class GoogleSTT(TokenSTT):
-    def __init__(self):
-        super(GoogleSTT, self).__init__()
+    def __init__(self, module=None):
+        super(GoogleSTT, self).__init__(module)
 
     def execute(self, audio, language=None):
         self.lang = language or self.lang
-        return self.recognizer.recognize_google(audio, self.token, self.lang)
+        return self.recognizer.recognize_google(
+            EncodedAudioData(audio, self.encoder), self.token, self.lang)
+
+    def hypotheses(self, audio, language=None):
+        self.lang = language or self.lang
+        result = self.recognizer.recognize_google(
+            EncodedAudioData(audio, self.encoder), self.token, self.lang,
+            show_all=True)
+        if not isinstance(result, dict):
+            return []  # Nothing was recognized
+        return _with_confidence(result.get('alternative', []), 'transcript',
+                                self.config.get('confidence', 1.0))
 
 
 class GoogleCloudSTT(GoogleJsonSTT):
-    def __init__(self):
-        super(GoogleCloudSTT, self).__init__()
+    def __init__(self, module=None):
+        super(GoogleCloudSTT, self).__init__(module)
         # override language with module specific language selection
         self.lang = self.config.get('lang') or self.lang
 
     def execute(self, audio, language=None):
         self.lang = language or self.lang
-        return self.recognizer.recognize_google_cloud(audio,
-                                                      self.json_credentials,
-                                                      self.lang)
+        return self.recognizer.recognize_google_cloud(
+            EncodedAudioData(audio, self.encoder), self.json_credentials,
+            self.lang)
 
 
 class WITSTT(TokenSTT):
-    def __init__(self):
-        super(WITSTT, self).__init__()
+    def __init__(self, module=None):
+        super(WITSTT, self).__init__(module)
 
     def execute(self, audio, language=None):
         LOG.warning("WITSTT language should be configured at wit.ai settings.")
@@ -126,8 +191,8 @@ class IBMSTT(TokenSTT):
             }
         }
     """
-    def __init__(self):
-        super(IBMSTT, self).__init__()
+    def __init__(self, module=None):
+        super(IBMSTT, self).__init__(module)
 
     def execute(self, audio, language=None):
         if not self.token:
@@ -157,12 +222,12 @@ class IBMSTT(TokenSTT):
             'profanity_filter': 'false'
         }
         headers = {
-            'Content-Type': 'audio/x-flac',
+            'Content-Type': self.encoder.content_type,
             'X-Watson-Learning-Opt-Out': 'true'
         }
 
         response = post(url, auth=('apikey', self.token), headers=headers,
-                        data=audio.get_flac_data(), params=params)
+                        data=self.encoder.encode(audio), params=params)
 
         if response.status_code == 200:
             result = json.loads(response.text)
@@ -205,8 +270,8 @@ class YandexSTT(STT):
             }
         }
     """
-    def __init__(self):
-        super(YandexSTT, self).__init__()
+    def __init__(self, module=None):
+        super(YandexSTT, self).__init__(module)
         self.lang = self.config.get('lang') or self.lang
         self.api_key = self.credential.get("api_key")
         if self.api_key is None:
@@ -275,26 +340,10 @@ def requires_pairing(func):
     return wrapper
 
 
-class MycroftSTT(STT):
-    """Default mycroft STT."""
-    def __init__(self):
-        super(MycroftSTT, self).__init__()
-        self.api = STTApi("stt")
-
-    @requires_pairing
-    def execute(self, audio, language=None):
-        self.lang = language or self.lang
-        try:
-            return self.api.stt(audio.get_flac_data(convert_rate=16000),
-                                self.lang, 1)[0]
-        except Exception:
-            return self.api.stt(audio.get_flac_data(), self.lang, 1)[0]
-
-
 class MycroftDeepSpeechSTT(STT):
     """Mycroft Hosted DeepSpeech"""
-    def __init__(self):
-        super(MycroftDeepSpeechSTT, self).__init__()
+    def __init__(self, module=None):
+        super(MycroftDeepSpeechSTT, self).__init__(module)
         self.api = STTApi("deepspeech")
 
     @requires_pairing
@@ -311,8 +360,8 @@ class DeepSpeechServerSTT(STT):
         https://github.com/MainRo/deepspeech-server
         use this if you want to host DeepSpeech yourself
     """
-    def __init__(self):
-        super(DeepSpeechServerSTT, self).__init__()
+    def __init__(self, module=None):
+        super(DeepSpeechServerSTT, self).__init__(module)
 
     def execute(self, audio, language=None):
         language = language or self.lang
@@ -332,6 +381,9 @@ class StreamThread(Thread, metaclass=ABCMeta):
         self.language = language
         self.queue = queue
         self.text = None
+        # Called with each new interim hypothesis
+        self.on_partial = None
+        self.partial_text = None
 
     def _get_data(self):
         while True:
@@ -344,6 +396,17 @@ class StreamThread(Thread, metaclass=ABCMeta):
     def run(self):
         return self.handle_audio_stream(self._get_data(), self.language)
 
+    def handle_partial(self, text):
+        """Report an interim hypothesis while the audio is still streamed.
+
+        Arguments:
+            text (str): transcription of the audio received so far
+        """
+        if text and text != self.partial_text:
+            self.partial_text = text
+            if self.on_partial:
+                self.on_partial(text)
+
     @abstractmethod
     def handle_audio_stream(self, audio, language):
         pass
@@ -353,16 +416,19 @@ class StreamingSTT(STT, metaclass=ABCMeta):
     """
         ABC class for threaded streaming STT implemenations.
     """
-    def __init__(self):
-        super().__init__()
+    def __init__(self, module=None):
+        super().__init__(module)
         self.stream = None
         self.can_stream = True
+        # Called with the interim hypotheses of engines providing them
+        self.on_partial = None
 
     def stream_start(self, language=None):
         self.stream_stop()
         language = language or self.lang
         self.queue = Queue()
         self.stream = self.create_streaming_thread()
+        self.stream.on_partial = self.on_partial
         self.stream.start()
 
     def stream_data(self, data):
@@ -388,6 +454,84 @@ class StreamingSTT(STT, metaclass=ABCMeta):
         pass
 
 
+class MycroftStreamThread(StreamThread):
+    """Upload the audio to the Mycroft STT while it's being recorded.
+
+    The audio is encoded and sent with chunked transfer encoding as it
+    arrives, the transcription is requested when the recording ends.
+    """
+    def __init__(self, queue, language, api, encoder, sample_rate):
+        super().__init__(queue, language)
+        self.api = api
+        self.encoder = encoder
+        self.sample_rate = sample_rate
+        self.error = None
+
+    def handle_audio_stream(self, audio, language):
+        try:
+            self.text = self.api.stt(
+                self.encoder.encode_stream(audio, self.sample_rate),
+                language, 1)[0]
+        except Exception as e:
+            LOG.warning('Streamed STT upload failed ({})'.format(repr(e)))
+            self.error = e
+        return self.text
+
+
+class MycroftSTT(StreamingSTT):
+    """Default mycroft STT.
+
+    With "upload_while_recording" set in the "mycroft" stt config, the
+    utterance is uploaded while the user is still speaking. Otherwise the
+    complete recording is sent once it's finished.
+    """
+    def __init__(self, module=None):
+        super(MycroftSTT, self).__init__(module)
+        self.api = STTApi("stt")
+        self.can_stream = self.config.get('upload_while_recording', False)
+        self.sample_rate = Configuration.get().get(
+            'listener', {}).get('sample_rate', 16000)
+
+    def create_streaming_thread(self):
+        return MycroftStreamThread(self.queue, self.lang, self.api,
+                                   self.encoder, self.sample_rate)
+
+    def has_identity(self):
+        """Check if the device has the credentials to upload audio."""
+        if not self.api.identity.has_refresh():
+            self.api.identity = IdentityManager.load()
+        return self.api.identity.has_refresh()
+
+    def stream_start(self, language=None):
+        """Start uploading the utterance if the device is paired.
+
+        Unpaired devices don't stream, execute() sends the recording the
+        usual way, which kicks off the pairing.
+        """
+        self.stream_stop()
+        if self.has_identity():
+            super().stream_start(language)
+
+    def stream_data(self, data):
+        if self.stream is not None:
+            super().stream_data(data)
+
+    @requires_pairing
+    def execute(self, audio, language=None):
+        self.lang = language or self.lang
+        stream = self.stream
+        if stream is not None:
+            text = self.stream_stop()
+            if stream.error is None:
+                return text
+            # Send the complete recording instead
+        try:
+            return self.api.stt(self.encoder.encode(audio, 16000),
+                                self.lang, 1)[0]
+        except Exception:
+            return self.api.stt(self.encoder.encode(audio), self.lang, 1)[0]
+
+
 class DeepSpeechStreamThread(StreamThread):
     def __init__(self, queue, language, url):
         if not language.startswith("en"):
@@ -435,6 +579,9 @@ class GoogleStreamThread(StreamThread):
         for res in responses:
             if res.results and res.results[0].is_final:
                 self.text = res.results[0].alternatives[0].transcript
+            elif res.results and res.results[0].alternatives:
+                self.handle_partial(
+                    res.results[0].alternatives[0].transcript)
         return self.text
 
 
@@ -455,12 +602,12 @@ class GoogleCloudStreamingSTT(StreamingSTT):
 
     """
 
-    def __init__(self):
+    def __init__(self, module=None):
         global SpeechClient, types, enums, Credentials
         from google.cloud.speech import SpeechClient, types, enums
         from google.oauth2.service_account import Credentials
 
-        super(GoogleCloudStreamingSTT, self).__init__()
+        super(GoogleCloudStreamingSTT, self).__init__(module)
         # override language with module specific language selection
         self.language = self.config.get('lang') or self.lang
         credentials = Credentials.from_service_account_info(
@@ -492,25 +639,28 @@ class GoogleCloudStreamingSTT(StreamingSTT):
 
 
 class KaldiSTT(STT):
-    def __init__(self):
-        super(KaldiSTT, self).__init__()
+    def __init__(self, module=None):
+        super(KaldiSTT, self).__init__(module)
 
     def execute(self, audio, language=None):
-        language = language or self.lang
-        response = post(self.config.get("uri"), data=audio.get_wav_data())
-        return self.get_response(response)
+        hypotheses = self.hypotheses(audio, language)
+        return hypotheses[0][0] if hypotheses else None
 
-    def get_response(self, response):
+    def hypotheses(self, audio, language=None):
+        response = post(self.config.get("uri"), data=audio.get_wav_data())
         try:
-            hypotheses = response.json()["hypotheses"]
-            return re.sub(r'\s*\[noise\]\s*', '', hypotheses[0]["utterance"])
+            alternatives = response.json()["hypotheses"]
         except Exception:
-            return None
+            return []
+        return [(re.sub(r'\s*\[noise\]\s*', '', text), confidence)
+                for text, confidence in _with_confidence(
+                    alternatives, 'utterance',
+                    self.config.get('confidence', 1.0))]
 
 
 class BingSTT(TokenSTT):
-    def __init__(self):
-        super(BingSTT, self).__init__()
+    def __init__(self, module=None):
+        super(BingSTT, self).__init__(module)
 
     def execute(self, audio, language=None):
         self.lang = language or self.lang
@@ -519,8 +669,8 @@ class BingSTT(TokenSTT):
 
 
 class HoundifySTT(KeySTT):
-    def __init__(self):
-        super(HoundifySTT, self).__init__()
+    def __init__(self, module=None):
+        super(HoundifySTT, self).__init__(module)
 
     def execute(self, audio, language=None):
         self.lang = language or self.lang
@@ -528,8 +678,8 @@ class HoundifySTT(KeySTT):
 
 
 class GoVivaceSTT(TokenSTT):
-    def __init__(self):
-        super(GoVivaceSTT, self).__init__()
+    def __init__(self, module=None):
+        super(GoVivaceSTT, self).__init__(module)
         self.default_uri = "https://services.govivace.com:49149/telephony"
 
         if not self.lang.startswith("en") and not self.lang.startswith("es"):
@@ -547,6 +697,147 @@ class GoVivaceSTT(TokenSTT):
         return response.json()["result"]["hypotheses"][0]["transcript"]
 
 
+class ParallelSTT(STT):
+    """Run several STT engines at the same time and use the best result.
+
+    All engines transcribe the utterance in parallel, so a slow or
+    unreachable service doesn't delay the fallback to another one. The
+    first result at least as confident as "min_confidence" is used right
+    away, otherwise the most confident result available at the "deadline"
+    (seconds after the request). If no engine answered by then, the first
+    answer arriving is used. Equally confident results are ranked in the
+    order of "engines".
+
+    The alternative transcriptions of all engines are returned by
+    hypotheses(), the engines are configured in their own sections:
+
+        "stt": {
+            "module": "parallel",
+            "parallel": {
+                "engines": ["mycroft", "kaldi"],
+                "min_confidence": 0.8,
+                "deadline": 2.0
+            },
+            "kaldi": {
+                "uri": "http://localhost:8080/client/dynamic/recognize",
+                "confidence": 0.6
+            }
+        }
+    """
+    def __init__(self, module=None):
+        super(ParallelSTT, self).__init__(module)
+        self.engines = []
+        for module in self.config.get('engines', ['mycroft']):
+            try:
+                self.engines.append(STTFactory.create_engine(module))
+            except Exception:
+                LOG.exception('Could not load the {} STT engine'.format(
+                    module))
+        if not self.engines:
+            raise ValueError('No STT engine could be loaded')
+        self.multiple_hypotheses = self.config.get('multiple_hypotheses',
+                                                   True)
+        self.min_confidence = self.config.get('min_confidence', 0.8)
+        self.deadline = self.config.get('deadline', 2.0)
+        # Leave room for requests continuing after their result was dropped
+        self.executor = ThreadPoolExecutor(
+            max_workers=2 * len(self.engines))
+        self.streaming_engines = [e for e in self.engines if e.can_stream]
+        self.can_stream = len(self.streaming_engines) > 0
+        self._on_partial = None
+        # Streams still being transcribed after a result was returned
+        self._losers = []
+
+    @property
+    def on_partial(self):
+        return self._on_partial
+
+    @on_partial.setter
+    def on_partial(self, callback):
+        """Report the interim hypotheses of the first streaming engine."""
+        self._on_partial = callback
+        if self.streaming_engines:
+            self.streaming_engines[0].on_partial = callback
+
+    def _join_losers(self):
+        """Wait for the streams left running after the last result.
+
+        Their engines are stopped before the next stream is started, so a
+        late result can't overwrite the state of the new stream.
+        """
+        losers, self._losers = self._losers, []
+        wait(losers)
+
+    def stream_start(self, language=None):
+        self._join_losers()
+        for engine in self.streaming_engines:
+            engine.stream_start(language)
+
+    def stream_data(self, data):
+        for engine in self.streaming_engines:
+            engine.stream_data(data)
+
+    def stream_stop(self):
+        self._join_losers()
+        for engine in self.streaming_engines:
+            engine.stream_stop()
+
+    def execute(self, audio, language=None):
+        hypotheses = self.hypotheses(audio, language)
+        return hypotheses[0][0] if hypotheses else None
+
+    def hypotheses(self, audio, language=None):
+        self.lang = language or self.lang
+        futures = {self.executor.submit(engine.hypotheses, audio, self.lang):
+                   index for index, engine in enumerate(self.engines)}
+        deadline = time.monotonic() + self.deadline
+        results = {}
+        errors = {}
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            done, pending = wait(pending,
+                                 remaining if remaining > 0 else None,
+                                 return_when=FIRST_COMPLETED)
+            confident = False
+            for future in done:
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    LOG.warning('{} failed ({})'.format(
+                        self.engines[index].__class__.__name__, repr(e)))
+                    errors[index] = e
+                    continue
+                confident = confident or any(
+                    confidence >= self.min_confidence
+                    for _, confidence in results[index])
+            if confident or (results and time.monotonic() >= deadline):
+                break
+
+        for future in pending:
+            # Requests not started yet are dropped, streams being stopped
+            # are joined before the engines are used again
+            engine = self.engines[futures[future]]
+            if not future.cancel() and engine.can_stream:
+                self._losers.append(future)
+
+        if not results:
+            # Report the error of the most preferred engine
+            raise errors[min(errors)]
+        ranked = sorted((-confidence, index, rank, text)
+                        for index, hypotheses in results.items()
+                        for rank, (text, confidence) in enumerate(hypotheses))
+        hypotheses = []
+        seen = set()
+        for negative_confidence, _, _, text in ranked:
+            key = text.lower().strip()
+            if key and key not in seen:
+                seen.add(key)
+                hypotheses.append((text, -negative_confidence))
+        return hypotheses
+
+
 class STTFactory:
     CLASSES = {
         "mycroft": MycroftSTT,
@@ -562,9 +853,21 @@ class STTFactory:
         "deepspeech_server": DeepSpeechServerSTT,
         "deepspeech_stream_server": DeepSpeechStreamServerSTT,
         "mycroft_deepspeech": MycroftDeepSpeechSTT,
-        "yandex": YandexSTT
+        "yandex": YandexSTT,
+        "parallel": ParallelSTT
     }
 
+    @staticmethod
+    def create_engine(module):
+        """Create the engine of an STT module using its own config section.
+
+        Used to run engines next to the one selected by stt.module.
+
+        Arguments:
+            module (str): name of the module, a key of CLASSES
+        """
+        return STTFactory.CLASSES[module](module)
+
     @staticmethod
     def create():
         try:
@@ -0,0 +1,188 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Encoding of recorded audio for upload to remote STT services.
+
+The encoders hold no state between utterances, a single instance is
+created per STT engine and reused for every request.
+"""
+import os
+from collections import deque
+from contextlib import suppress
+from subprocess import PIPE, Popen
+from threading import Thread
+
+from speech_recognition import AudioData, get_flac_converter
+
+from mycroft.util.log import LOG
+
+
+class FlacEncoder:
+    """Encode 16 bit mono PCM audio to FLAC using the flac executable.
+
+    The audio can be encoded while it's being recorded, the encoded data
+    is produced as soon as the encoder has a complete frame.
+    """
+    content_type = 'audio/x-flac'
+
+    def encode(self, audio, convert_rate=None):
+        """Encode a complete recording.
+
+        Arguments:
+            audio (AudioData): recorded audio
+            convert_rate (int): sample rate to convert the audio to
+
+        Returns:
+            bytes of the FLAC file
+        """
+        raw_data = audio.get_raw_data(convert_rate=convert_rate,
+                                      convert_width=2)
+        return b''.join(self.encode_stream(
+            [raw_data], convert_rate or audio.sample_rate))
+
+    def _start_process(self, sample_rate):
+        return Popen([get_flac_converter(), '--stdout', '--totally-silent',
+                      '--best', '--force-raw-format', '--endian=little',
+                      '--sign=signed', '--channels=1', '--bps=16',
+                      '--sample-rate={}'.format(sample_rate), '-'],
+                     stdin=PIPE, stdout=PIPE)
+
+    def encode_stream(self, chunks, sample_rate=16000):
+        """Encode audio chunks as they arrive.
+
+        Arguments:
+            chunks (iterable): chunks of raw audio, may block until the
+                               next chunk has been recorded
+            sample_rate (int): sample rate of the audio
+
+        Yields:
+            bytes of the FLAC stream
+        """
+        process = self._start_process(sample_rate)
+
+        def feed():
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+                    process.stdin.flush()
+            except (OSError, ValueError):
+                pass  # The encoder was stopped
+            except Exception:
+                LOG.exception('Could not pass the audio to the encoder')
+            finally:
+                with suppress(OSError, ValueError):
+                    process.stdin.close()
+
+        Thread(target=feed, daemon=True).start()
+        try:
+            while True:
+                data = os.read(process.stdout.fileno(), 4096)
+                if not data:
+                    break
+                yield data
+            if process.wait() != 0:
+                LOG.error('FLAC encoder exited with {}'.format(
+                    process.returncode))
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+class LibFlacEncoder(FlacEncoder):
+    """Encode 16 bit mono PCM audio to FLAC in process using libFLAC.
+
+    Requires the optional pyflac and numpy packages, installed with the
+    "stt" extra (pip install mycroft-core[stt]). Unlike the flac executable
+    there's no process to start and no pipe to pass the audio through for
+    each utterance.
+
+    Arguments:
+        compression_level (int): libFLAC compression level (0 - 8)
+    """
+    def __init__(self, compression_level=5):
+        import numpy
+        import pyflac
+        self.np = numpy
+        self.pyflac = pyflac
+        self.compression_level = compression_level
+
+    def encode_stream(self, chunks, sample_rate=16000):
+        output = deque()
+
+        def write(buffer, num_bytes, num_samples, current_frame):
+            output.append(bytes(buffer))
+
+        encoder = self.pyflac.StreamEncoder(
+            write_callback=write, sample_rate=sample_rate,
+            compression_level=self.compression_level)
+        for chunk in chunks:
+            samples = self.np.frombuffer(chunk[:len(chunk) - len(chunk) % 2],
+                                         '<i2')
+            encoder.process(samples.reshape(-1, 1))
+            while output:
+                yield output.popleft()
+        encoder.finish()
+        while output:
+            yield output.popleft()
+
+
+class EncodedAudioData(AudioData):
+    """AudioData producing its FLAC data with an encoder.
+
+    Passed to the speech_recognition recognizers, which otherwise run the
+    flac executable through get_flac_data() for each utterance.
+
+    Arguments:
+        audio (AudioData): recorded audio
+        encoder (FlacEncoder): encoder of the STT module
+    """
+    def __init__(self, audio, encoder):
+        super().__init__(audio.frame_data, audio.sample_rate,
+                         audio.sample_width)
+        self.encoder = encoder
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        """Encode the audio, always as 16 bit samples."""
+        return self.encoder.encode(self, convert_rate)
+
+
+ENCODERS = {
+    'flac': FlacEncoder,
+    'libflac': LibFlacEncoder
+}
+
+
+def create_encoder(name=None):
+    """Create the audio encoder selected for an STT module.
+
+    Arguments:
+        name (str): "libflac" or "flac", None to use libFLAC if available
+
+    Returns:
+        FlacEncoder instance, the flac executable is used if the selected
+        encoder can't be loaded
+    """
+    clazz = ENCODERS.get(name or 'libflac')
+    if clazz is None:
+        LOG.error('Unknown audio encoder {}'.format(name))
+        return FlacEncoder()
+    try:
+        return clazz()
+    except ImportError as e:
+        if name:
+            LOG.warning('Could not load the {} encoder ({}), using the flac '
+                        'executable'.format(name, repr(e)))
+        return FlacEncoder()
@@ -29,6 +29,7 @@ from mycroft.enclosure.api import EnclosureAPI
 from mycroft.configuration import Configuration
 from mycroft.messagebus.message import Message
 from mycroft.metrics import report_timing, Stopwatch
+from mycroft.metrics.trace import TraceSpan, add_span
 from mycroft.util import (
     play_wav, play_mp3, check_for_signal, create_signal, resolve_resource_file
 )
@@ -97,6 +98,7 @@ class PlaybackThread(Thread):
                 if not self._processing_queue:
                     self._processing_queue = True
                     self.tts.begin_audio()
+                    add_span(ident, 'first_audio', time(), 0.0)
 
                 stopwatch = Stopwatch()
                 with stopwatch:
@@ -348,7 +350,9 @@ class TTS(metaclass=ABCMeta):
                 LOG.debug("TTS cache hit")
                 phonemes = self.load_phonemes(key)
             else:
-                wav_file, phonemes = self.get_tts(sentence, wav_file)
+                with TraceSpan(ident, 'tts_synthesis',
+                               {'tts': self.__class__.__name__}):
+                    wav_file, phonemes = self.get_tts(sentence, wav_file)
                 if phonemes:
                     self.save_phonemes(key, phonemes)
 
@@ -1,12 +1,42 @@
+import heapq
+import mmap
+import sys
 from argparse import ArgumentParser
 from datetime import date, datetime, time
 from locale import localeconv
+from operator import itemgetter
 from pathlib import Path
 
 BOOT_START_MESSAGE = 'Starting message bus service...'
 BOOT_END_MESSAGE = 'Skills all loaded!'
 NOT_FOUND = -1
 TIME_FORMAT = '%Y-%m-%d %H:%M:%S{}%f'.format(localeconv()['decimal_point'])
+SEEK_GRANULARITY = 64 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def parse_log_ts(log_msg_ts):
+    """Parse a log message timestamp like "2020-05-01 12:34:56,789".
+
+    The fields are sliced at fixed offsets, which is much cheaper than
+    strptime on large logs.  Anything not matching the fixed layout falls
+    back to strptime so odd records are still reported as before.
+
+    Raises:
+        ValueError if the timestamp can not be parsed.
+    """
+    try:
+        return datetime(
+            int(log_msg_ts[0:4]),
+            int(log_msg_ts[5:7]),
+            int(log_msg_ts[8:10]),
+            int(log_msg_ts[11:13]),
+            int(log_msg_ts[14:16]),
+            int(log_msg_ts[17:19]),
+            int(log_msg_ts[20:26].ljust(6, '0'))
+        )
+    except ValueError:
+        return datetime.strptime(log_msg_ts, TIME_FORMAT)
 
 
 class LogFileReader:
@@ -15,62 +45,107 @@ class LogFileReader:
     def __init__(self, log_name):
         self.log_name = log_name
         self.log_path = self.log_dir.joinpath(log_name + '.log')
+        self.process = '{:10}'.format(log_name)
         self.log_file = None
-        self.log_file_rec = None
+        self.log_map = None
         self.log_msg = None
         self.log_msg_ts = None
-        self.log_msg_lines = []
-        self.eof = False
-
-    def read_log_msg(self):
-        still_reading_log_msg = True
-        while still_reading_log_msg:
-            self.log_file_rec = self.log_file.readline().rstrip()
-            if self.log_file_rec:
-                still_reading_log_msg = self._process_log_file_rec()
+
+    def open(self):
+        self.log_file = open(str(self.log_path), 'rb')
+        try:
+            self.log_map = mmap.mmap(
+                self.log_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except ValueError:
+            # Empty files cannot be memory mapped; there is nothing to read.
+            self.log_map = None
+
+    def close(self):
+        if self.log_map is not None:
+            self.log_map.close()
+        self.log_file.close()
+
+    def seek(self, since_ts):
+        """Position the reader just before the first message after since_ts.
+
+        Log files are written in time order so the memory map is bisected
+        on byte offsets instead of reading every message from the start.
+        """
+        if self.log_map is None:
+            return
+        low, high = 0, len(self.log_map)
+        while high - low > SEEK_GRANULARITY:
+            middle = (low + high) // 2
+            record_ts = self._next_record_ts(middle)
+            if record_ts is None or record_ts >= since_ts:
+                high = middle
             else:
-                self.eof = True
-                still_reading_log_msg = False
-
-    def _process_log_file_rec(self):
-        still_reading_log_message = True
-        split_rec = self.log_file_rec.split(' | ')
-        log_msg_first_line = len(split_rec) == 5
-        if log_msg_first_line:
-            if self.log_msg_lines:
-                self.log_msg = '\n'.join(self.log_msg_lines)
-                self.log_msg_lines = []
-                still_reading_log_message = False
-            self._reformat_log_msg(split_rec)
-            self._parse_log_msg_ts(split_rec[0])
-        self.log_msg_lines.append(self.log_file_rec)
-
-        return still_reading_log_message
+                low = middle
+        self.log_map.seek(low)
+        if low:
+            # Skip the partial line, the rest of a multi-line message is
+            # dropped by read_log_msgs() until a message header is found.
+            self.log_map.readline()
+
+    def _next_record_ts(self, offset):
+        self.log_map.seek(offset)
+        if offset:
+            self.log_map.readline()
+        for log_file_rec in iter(self.log_map.readline, b''):
+            split_rec = log_file_rec.split(b' | ', 4)
+            if len(split_rec) == 5:
+                try:
+                    return parse_log_ts(split_rec[0].decode())
+                except ValueError:
+                    continue
+        return None
+
+    def read_log_msgs(self):
+        """Generator yielding (timestamp, message) for each log message."""
+        if self.log_map is None:
+            return
+        log_msg_lines = []
+        for log_file_rec in iter(self.log_map.readline, b''):
+            log_file_rec = log_file_rec.decode(errors='replace').rstrip()
+            split_rec = log_file_rec.split(' | ')
+            if len(split_rec) == 5:
+                if log_msg_lines:
+                    self.log_msg = '\n'.join(log_msg_lines)
+                    yield self.log_msg_ts, self.log_msg
+                    log_msg_lines = []
+                log_file_rec = self._reformat_log_msg(split_rec)
+                self._parse_log_msg_ts(split_rec[0], log_file_rec)
+            elif not log_msg_lines:
+                # Continuation of a message preceding the read position
+                continue
+            log_msg_lines.append(log_file_rec)
+
+        if log_msg_lines:
+            self.log_msg = '\n'.join(log_msg_lines)
+            yield self.log_msg_ts, self.log_msg
 
     def _reformat_log_msg(self, log_msg_parts):
-        reformatted_parts = []
-        process = '{:10}'.format(self.log_name)
-        for index, part in enumerate(log_msg_parts):
-            if index == 2:
-                reformatted_parts.append(process)
-            elif index == 3:
-                if part.find(':') == NOT_FOUND:
-                    reformatted_parts.append(part)
-                else:
-                    module = part[:part.find(':')]
-                    reformatted_parts.append(module)
-            else:
-                reformatted_parts.append(part)
+        module = log_msg_parts[3]
+        if module.find(':') != NOT_FOUND:
+            module = module[:module.find(':')]
+        reformatted_parts = [
+            log_msg_parts[0],
+            log_msg_parts[1],
+            self.process,
+            module,
+            log_msg_parts[4]
+        ]
 
-        self.log_file_rec = ' | '.join(reformatted_parts)
+        return ' | '.join(reformatted_parts)
 
-    def _parse_log_msg_ts(self, log_msg_ts):
+    def _parse_log_msg_ts(self, log_msg_ts, log_file_rec):
         try:
-            self.log_msg_ts = datetime.strptime(log_msg_ts, TIME_FORMAT)
+            self.log_msg_ts = parse_log_ts(log_msg_ts)
         except ValueError:
-            print(
-                'Found log message with bad time section: ' + self.log_file_rec
-            )
+            print('Found log message with bad time section: ' + log_file_rec)
+            if self.log_msg_ts is None:
+                self.log_msg_ts = datetime.min
 
     def check_for_inclusion(self, earliest_ts, script_args):
         emitted_after_start_ts = self.log_msg_ts > earliest_ts
@@ -100,10 +175,14 @@ class LogFileReader:
 class LogWriter:
     def __init__(self, script_args):
         self.script_args = script_args
-        self.start_ts = datetime.combine(
-            script_args.start_date,
-            script_args.start_time
-        )
+        if script_args.since is not None:
+            self.start_ts = script_args.since
+        else:
+            self.start_ts = datetime.combine(
+                script_args.start_date,
+                script_args.start_time
+            )
+        self.end_ts = script_args.until
         self.log_readers = [
             LogFileReader('skills'),
             LogFileReader('audio'),
@@ -111,7 +190,7 @@ class LogWriter:
             LogFileReader('enclosure'),
             LogFileReader('voice')
         ]
-        self.merged_log_file = None
+        self.merged_log_file = sys.stdout
         self.in_boot_process = False
         self.boot_logs_complete = False
         self.boot_logs = []
@@ -140,29 +219,37 @@ class LogWriter:
 
     def _open_files(self):
         for log_reader in self.log_readers:
-            log_reader.log_file = open(str(log_reader.log_path))
+            log_reader.open()
         if self.script_args.file is not None:
-            self.merged_log_file = open(self.script_args.file, 'w')
+            self.merged_log_file = open(
+                self.script_args.file, 'w', buffering=WRITE_BUFFER_SIZE
+            )
 
     def _close_files(self):
         for log_reader in self.log_readers:
-            log_reader.log_file.close()
+            log_reader.close()
         if self.script_args.file is not None:
             self.merged_log_file.close()
+        else:
+            self.merged_log_file.flush()
 
     def merge_logs(self):
-        for log_reader in self.log_readers:
-            log_reader.read_log_msg()
+        """Generator yielding the messages of all logs in time order.
 
-        while not all([reader.eof for reader in self.log_readers]):
-            next_message_ts = min(
-                [r.log_msg_ts for r in self.log_readers if not r.eof]
-            )
-            for log_reader in self.log_readers:
-                if log_reader.log_msg_ts == next_message_ts:
-                    if log_reader.log_msg_ts > self.start_ts:
-                        yield log_reader.log_msg
-                    log_reader.read_log_msg()
+        Each log is already sorted so a heap based k-way merge is used,
+        only holding one pending message per log in memory.
+        """
+        for log_reader in self.log_readers:
+            log_reader.seek(self.start_ts)
+        merged_messages = heapq.merge(
+            *[reader.read_log_msgs() for reader in self.log_readers],
+            key=itemgetter(0)
+        )
+        for log_msg_ts, log_msg in merged_messages:
+            if self.end_ts is not None and log_msg_ts > self.end_ts:
+                break
+            if log_msg_ts > self.start_ts:
+                yield log_msg
 
     def _check_for_boot_start(self, log_msg):
         if not self.in_boot_process and self.script_args.last_boot:
@@ -209,10 +296,15 @@ class LogWriter:
                 self.boot_logs_complete = True
 
     def _write_log_message(self, log_msg):
-        if self.script_args.file is None:
-            print(log_msg)
-        else:
-            self.merged_log_file.write(log_msg + '\n')
+        self.merged_log_file.write(log_msg + '\n')
+
+
+def _parse_script_ts(script_ts):
+    """Parse a --since/--until value, the time part is optional."""
+    try:
+        return datetime.strptime(script_ts, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return datetime.strptime(script_ts, '%Y-%m-%d')
 
 
 def _define_script_args():
@@ -232,6 +324,22 @@ def _define_script_args():
         ),
         type=lambda tm: datetime.strptime(tm, '%H:%M:%S').time()
     )
+    arg_parser.add_argument(
+        "--since",
+        help=(
+            'Only show log messages emitted after this YYYY-MM-DD HH:MM:SS '
+            'timestamp, overrides --start-date and --start-time'
+        ),
+        type=_parse_script_ts
+    )
+    arg_parser.add_argument(
+        "--until",
+        help=(
+            'Only show log messages emitted up to this YYYY-MM-DD HH:MM:SS '
+            'timestamp'
+        ),
+        type=_parse_script_ts
+    )
     arg_parser.add_argument(
         "--include",
         action='append',
@@ -12,8 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import gzip
+import json
 import unittest
 from copy import copy
+from os.path import join
+from tempfile import TemporaryDirectory
 
 from unittest.mock import MagicMock, patch
 
@@ -60,6 +64,10 @@ class TestApi(unittest.TestCase):
                         return_value=CONFIG)
         self.mock_config_get = patcher.start()
         self.addCleanup(patcher.stop)
+        patcher = patch('mycroft.configuration.Configuration.get_local',
+                        return_value=CONFIG)
+        self.mock_config_get_local = patcher.start()
+        self.addCleanup(patcher.stop)
         super().setUp()
 
     @patch('mycroft.api.IdentityManager.get')
@@ -71,7 +79,7 @@ class TestApi(unittest.TestCase):
         self.assertEqual(a.identity.uuid, '1234')
 
     @patch('mycroft.api.IdentityManager')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_send(self, mock_request, mock_identity_manager):
         # Setup an OK response
         mock_response_ok = create_response(200, {})
@@ -105,6 +113,115 @@ class TestApi(unittest.TestCase):
         a.send(req)
         self.assertTrue(mycroft.api.IdentityManager.save.called)
 
+    @patch('mycroft.api.IdentityManager.get')
+    @patch('mycroft.api.requests.Session.request')
+    def test_send_etag(self, mock_request, mock_identity_get):
+        mock_identity_get.return_value = create_identity('1234')
+        a = mycroft.api.Api('test-path')
+        a.etag_cache = mycroft.api.EtagCache()
+        response = create_response(200, {'a': 1})
+        response.headers = {'ETag': '"abc"'}
+        mock_request.return_value = response
+        req = {'path': 'something', 'query': {'x': 1}}
+        self.assertEqual(a.send(copy(req)), {'a': 1})
+        self.assertNotIn('If-None-Match', mock_request.call_args[1]['headers'])
+
+        mock_request.return_value = create_response(304)
+        data = a.send(copy(req))
+        self.assertEqual(data, {'a': 1})
+        self.assertEqual(
+            mock_request.call_args[1]['headers']['If-None-Match'], 'abc')
+        # Modifying the returned data doesn't affect the cache
+        data['a'] = 2
+        self.assertEqual(a.send(copy(req)), {'a': 1})
+
+        # Other query parameters aren't validated against the ETag
+        mock_request.return_value = create_response(200, {'b': 1})
+        self.assertEqual(a.send({'path': 'something', 'query': {'x': 2}}),
+                         {'b': 1})
+        self.assertNotIn('If-None-Match', mock_request.call_args[1]['headers'])
+
+    @patch('mycroft.api.IdentityManager.get')
+    def test_session_shared(self, mock_identity_get):
+        mock_identity_get.return_value = create_identity('1234')
+        a = mycroft.api.Api('test-path')
+        b = mycroft.api.DeviceApi()
+        self.assertIs(a.session, b.session)
+        self.assertIsNot(a.session,
+                         mycroft.api.get_session('https://other.host'))
+
+    @patch('mycroft.api.IdentityManager.get')
+    @patch('mycroft.api.requests.Session.request', autospec=True)
+    def test_send_stream_without_retries(self, mock_request,
+                                         mock_identity_get):
+        mock_request.return_value = create_response(200)
+        mock_identity_get.return_value = create_identity('1234')
+        a = mycroft.api.Api('test-path')
+
+        def retries():
+            session = mock_request.call_args[0][0]
+            return session.get_adapter(a.url).max_retries.total
+
+        a.send({'path': 'something', 'data': b'audio'})
+        self.assertEqual(retries(), 3)
+        # A generator can't be replayed on a retry
+        a.send({'path': 'something', 'data': iter([b'au', b'dio'])})
+        self.assertEqual(retries(), 0)
+        self.assertEqual(mycroft.api.STTApi('stt').session,
+                         a.stream_session)
+
+    @patch('mycroft.api.IdentityManager.get')
+    @patch('mycroft.api.requests.Session.request')
+    def test_send_compressed(self, mock_request, mock_identity_get):
+        mock_request.return_value = create_response(200)
+        mock_identity_get.return_value = create_identity('1234')
+        a = mycroft.api.Api('test-path')
+        body = {'skills': ['skill-{}'.format(i) for i in range(200)]}
+
+        # Compression is disabled by default
+        a.send({'path': 'something', 'json': body, 'compress': True})
+        self.assertEqual(mock_request.call_args[1]['json'], body)
+
+        a.compress_uploads = True
+        a.send({'path': 'something', 'json': body, 'compress': True})
+        headers = mock_request.call_args[1]['headers']
+        data = mock_request.call_args[1]['data']
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertIsNone(mock_request.call_args[1]['json'])
+        self.assertEqual(json.loads(gzip.decompress(data)), body)
+
+        # Small bodies are sent as is
+        a.send({'path': 'something', 'json': {'a': 1}, 'compress': True})
+        self.assertEqual(mock_request.call_args[1]['json'], {'a': 1})
+
+
+class TestEtagCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = mycroft.api.EtagCache(max_size=2)
+        cache.put('a', 'etag-a', {'a': 1}, {})
+        cache.put('b', 'etag-b', {'b': 1}, {})
+        # Use a, making b the least recently used entry
+        self.assertEqual(cache.get('a')['etag'], 'etag-a')
+        cache.put('c', 'etag-c', {'c': 1}, {})
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')['data'], {'a': 1})
+        self.assertEqual(cache.get('c')['data'], {'c': 1})
+
+    def test_persist(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'etag_cache.json')
+            cache = mycroft.api.EtagCache(max_size=2, path=path)
+            cache.put('a', 'etag-a', {'a': 1}, {'ETag': 'etag-a'})
+            cache.put('b', 'etag-b', 'text', {})
+            cache.put('c', 'etag-c', ['c'], {})
+
+            loaded = mycroft.api.EtagCache(max_size=2, path=path)
+            self.assertEqual(len(loaded), 2)
+            self.assertIsNone(loaded.get('a'))
+            self.assertEqual(loaded.get('b'), cache.get('b'))
+            self.assertEqual(loaded.get('c'), cache.get('c'))
+
 
 class TestDeviceApi(unittest.TestCase):
     def setUp(self):
@@ -112,10 +229,14 @@ class TestDeviceApi(unittest.TestCase):
                         return_value=CONFIG)
         self.mock_config_get = patcher.start()
         self.addCleanup(patcher.stop)
+        patcher = patch('mycroft.configuration.Configuration.get_local',
+                        return_value=CONFIG)
+        self.mock_config_get_local = patcher.start()
+        self.addCleanup(patcher.stop)
         super().setUp()
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_init(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -125,7 +246,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertEqual(device.path, 'device')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_activate(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -137,7 +258,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertEqual(json['token'], 'token')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_get(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -149,7 +270,7 @@ class TestDeviceApi(unittest.TestCase):
 
     @patch('mycroft.api.IdentityManager.update')
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_get_code(self, mock_request, mock_identity_get,
                              mock_identit_update):
         mock_request.return_value = create_response(200, '123ABC')
@@ -162,7 +283,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/code?state=state')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_get_settings(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -173,7 +294,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/setting')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_report_metric(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -190,7 +311,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/metric/mymetric')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_send_email(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -207,7 +328,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/message')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_get_oauth_token(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -219,7 +340,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/token/1')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_get_location(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -230,7 +351,7 @@ class TestDeviceApi(unittest.TestCase):
             url, 'https://api-test.mycroft.ai/v1/device/1234/location')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_get_subscription(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -250,7 +371,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertTrue(device.is_subscriber)
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_device_upload_skills_data(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200)
         mock_identity_get.return_value = create_identity('1234')
@@ -271,7 +392,7 @@ class TestDeviceApi(unittest.TestCase):
             device.upload_skills_data('This isn\'t right at all')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_stt(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -279,7 +400,7 @@ class TestDeviceApi(unittest.TestCase):
         self.assertEqual(stt.path, 'stt')
 
     @patch('mycroft.api.IdentityManager.get')
-    @patch('mycroft.api.requests.request')
+    @patch('mycroft.api.requests.Session.request')
     def test_stt_stt(self, mock_request, mock_identity_get):
         mock_request.return_value = create_response(200, {})
         mock_identity_get.return_value = create_identity('1234')
@@ -309,13 +430,17 @@ class TestDeviceApi(unittest.TestCase):
 
 
 @patch('mycroft.api.IdentityManager.get')
-@patch('mycroft.api.requests.request')
+@patch('mycroft.api.requests.Session.request')
 class TestSettingsMeta(unittest.TestCase):
     def setUp(self):
         patcher = patch('mycroft.configuration.Configuration.get',
                         return_value=CONFIG)
         self.mock_config_get = patcher.start()
         self.addCleanup(patcher.stop)
+        patcher = patch('mycroft.configuration.Configuration.get_local',
+                        return_value=CONFIG)
+        self.mock_config_get_local = patcher.start()
+        self.addCleanup(patcher.stop)
         super().setUp()
 
     def test_upload_meta(self, mock_request, mock_identity_get):
@@ -369,13 +494,17 @@ class TestSettingsMeta(unittest.TestCase):
 
 @patch('mycroft.api._paired_cache', False)
 @patch('mycroft.api.IdentityManager.get')
-@patch('mycroft.api.requests.request')
+@patch('mycroft.api.requests.Session.request')
 class TestIsPaired(unittest.TestCase):
     def setUp(self):
         patcher = patch('mycroft.configuration.Configuration.get',
                         return_value=CONFIG)
         self.mock_config_get = patcher.start()
         self.addCleanup(patcher.stop)
+        patcher = patch('mycroft.configuration.Configuration.get_local',
+                        return_value=CONFIG)
+        self.mock_config_get_local = patcher.start()
+        self.addCleanup(patcher.stop)
         super().setUp()
 
     def test_is_paired_true(self, mock_request, mock_identity_get):
@@ -151,7 +151,9 @@ class TestSpeech(unittest.TestCase):
         speech.handle_speak(speak_msg)
         self.assertFalse(tts_factory_mock.create.called)
 
-        speech.config = {'tts': {'module': 'test2'}}
+        config_mock.subscribe.assert_called_with(
+            'tts', speech.handle_tts_config_change)
+        speech.handle_tts_config_change({'tts': {'module': 'test2'}})
         speech.handle_speak(speak_msg)
         self.assertTrue(tts_factory_mock.create.called)
 
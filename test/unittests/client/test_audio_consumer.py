@@ -13,12 +13,15 @@
 # limitations under the License.
 #
 import unittest
+from threading import Event
+from unittest.mock import MagicMock
 
 import speech_recognition
 from os.path import dirname, join
 from speech_recognition import WavFile, AudioData
 
 from mycroft.client.speech.listener import (AudioConsumer, RecognizerLoop,
+                                            RecognizerLoopState,
                                             AUDIO_DATA, STREAM_START,
                                             STREAM_DATA, STREAM_STOP)
 from mycroft.stt import MycroftSTT
@@ -209,3 +212,66 @@ class AudioConsumerTest(unittest.TestCase):
         self.assertIsNotNone(utterances)
         self.assertTrue(len(utterances) == 1)
         self.assertEqual("record", utterances[0])
+
+
+class MockSTT:
+    """Transcribe test recordings once they're released."""
+    can_stream = False
+    multiple_hypotheses = False
+    lang = 'en-US'
+
+    def hypotheses(self, audio, language=None):
+        audio.release.wait()
+        return [(audio.text, 1.0), (audio.text + ' alternative', 0.5)]
+
+
+class TranscriptionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.emitter = MagicMock()
+        self.queue = Queue()
+        self.consumer = AudioConsumer(RecognizerLoopState(), self.queue,
+                                      self.emitter, MockSTT(), None, None)
+
+    def create_recording(self, text):
+        audio = AudioData(b'\0' * 32000, 16000, 2)
+        audio.text = text
+        audio.release = Event()
+        self.queue.put((AUDIO_DATA, audio))
+        self.consumer.read()
+        return audio
+
+    def sent_utterances(self):
+        self.consumer.executor.shutdown(wait=True)
+        return [c[0][1]['utterances'] for c in self.emitter.emit.call_args_list
+                if c[0][0] == 'recognizer_loop:utterance']
+
+    def test_recording_order(self):
+        first = self.create_recording('first')
+        second = self.create_recording('second')
+        second.release.set()
+        first.release.set()
+        self.assertEqual(self.sent_utterances(), [['first'], ['second']])
+
+    def test_cancel_on_wake_word(self):
+        first = self.create_recording('first')
+        self.consumer.handle_wake_word()
+        self.consumer.read()
+        second = self.create_recording('second')
+        first.release.set()
+        second.release.set()
+        self.assertEqual(self.sent_utterances(), [['second']])
+        self.assertEqual(self.consumer.pending, {})
+
+    def test_multiple_hypotheses(self):
+        self.consumer.stt.multiple_hypotheses = True
+        self.create_recording('first').release.set()
+        self.assertEqual(self.sent_utterances(),
+                         [['first', 'first alternative']])
+
+    def test_send_without_lock(self):
+        locked = []
+        self.emitter.emit.side_effect = (
+            lambda *args: locked.append(self.consumer.pending_lock.locked()))
+        self.create_recording('first').release.set()
+        self.assertEqual(self.sent_utterances(), [['first']])
+        self.assertEqual(locked, [False])
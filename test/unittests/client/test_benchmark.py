@@ -0,0 +1,115 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import audioop
+import json
+import unittest
+import wave
+from array import array
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import mock
+
+from mycroft.client.speech.benchmark import (FileMicrophone, load_wav,
+                                             run_benchmark)
+from mycroft.client.speech.hotword_factory import HotWordEngine
+
+
+def write_wav(path, audio, sample_rate=16000, channels=1):
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(audio)
+
+
+def tone(seconds, sample_rate=16000):
+    """Loud square wave."""
+    period = array('h', [10000] * 20 + [-10000] * 20).tobytes()
+    return period * int(seconds * sample_rate / 40)
+
+
+def silence(seconds, sample_rate=16000):
+    return b'\0' * (2 * int(seconds * sample_rate))
+
+
+class LoudHotWord(HotWordEngine):
+    """Hear the wake word in any loud audio."""
+    def found_wake_word(self, frame_data):
+        return audioop.rms(frame_data[-3200:], 2) > 5000
+
+
+class FileMicrophoneTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    def test_load_wav(self):
+        path = join(self.dir, 'stereo.wav')
+        write_wav(path, tone(1.0, 8000) * 2, 8000, channels=2)
+        self.assertAlmostEqual(len(load_wav(path, 16000)), 32000, delta=8)
+
+    def test_play(self):
+        first = join(self.dir, 'a.wav')
+        second = join(self.dir, 'b.wav')
+        write_wav(first, tone(0.5))
+        write_wav(second, silence(0.25))
+        on_end = mock.Mock()
+        mic = FileMicrophone([first, second], chunk_size=1000, speed=0,
+                             gap=0.25, on_end=on_end)
+        self.assertEqual(mic.file_at(0.8), ('b.wav', 0.75))
+
+        with mic as source:
+            self.assertEqual(source.stream.read(1000), tone(0.5)[:2000])
+            while not mic.finished:
+                chunk = source.stream.read(1000)
+        self.assertEqual(len(chunk), 2000)
+        self.assertAlmostEqual(mic.time, 1.25, delta=0.07)
+        on_end.assert_called_once_with()
+
+
+class RunBenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.dir)
+
+    @mock.patch('mycroft.client.speech.listener.HotWordFactory')
+    def test_report(self, mock_factory):
+        mock_factory.create_hotword.side_effect = (
+            lambda word, *args, **kwargs: LoudHotWord(word))
+        write_wav(join(self.dir, 'utterance.wav'),
+                  silence(1.5) + tone(1.5) + silence(0.5))
+        with open(join(self.dir, 'labels.json'), 'w') as f:
+            json.dump({'utterance.wav': {'wake_word_end': 1.7,
+                                         'speech_end': 3.0}}, f)
+
+        report = run_benchmark(self.dir)
+
+        self.assertEqual(report['files'], 1)
+        self.assertEqual(report['missed_wake_words'], [])
+        self.assertEqual(len(report['utterances']), 1)
+        utterance = report['utterances'][0]
+        self.assertEqual(utterance['file'], 'utterance.wav')
+        self.assertEqual(utterance['transcription'], 'benchmark')
+        self.assertIn('wake_word_latency', utterance)
+        self.assertGreater(utterance['endpointing_delay'], 0)
+        for stage in ('wake_word.update', 'wake_word.check', 'endpointing',
+                      'stt'):
+            self.assertGreater(report['stages'][stage]['calls'], 0)
+        self.assertEqual(report['endpointing_delay']['count'], 1)
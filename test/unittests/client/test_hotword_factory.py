@@ -12,9 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import json
+import sys
 import unittest
+from array import array
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-from mycroft.client.speech.hotword_factory import HotWordFactory
+from mycroft.client.speech.hotword_factory import (HotWordEngine,
+                                                   HotWordFactory,
+                                                   HotWordFrontend,
+                                                   PocketsphinxHotWord,
+                                                   PorcupineHotWord,
+                                                   PreciseHotword)
 
 
 class PocketSphinxTest(unittest.TestCase):
@@ -55,3 +66,255 @@ class PocketSphinxTest(unittest.TestCase):
         config = config['hey victoria']
         self.assertEqual(config['phonemes'], p.phonemes)
         self.assertEqual(p.key_phrase, 'hey victoria')
+
+
+class PocketsphinxStreamingTest(unittest.TestCase):
+    def create_hotword(self):
+        hotword = PocketsphinxHotWord.__new__(PocketsphinxHotWord)
+        hotword.key_phrase = 'hey mycroft'
+        hotword.decoder = mock.Mock()
+        hotword.decoder.hyp.return_value = None
+        hotword.streaming = True
+        hotword.streaming_started = False
+        hotword.utt_started = False
+        hotword.has_found = False
+        hotword.max_utt_bytes = 18
+        hotword.overlap_bytes = 4
+        hotword.utt_bytes = 0
+        hotword.utt_tail = b''
+        return hotword
+
+    def test_streaming(self):
+        hotword = self.create_hotword()
+        hotword.update(b'chunk1')
+        hotword.update(b'chunk2')
+        # Each chunk is decoded once in a single utterance
+        hotword.decoder.start_utt.assert_called_once_with()
+        self.assertEqual(hotword.decoder.process_raw.call_count, 2)
+        self.assertFalse(hotword.found_wake_word(b'window'))
+
+        hotword.decoder.hyp.return_value = mock.Mock(hypstr='HEY MYCROFT')
+        hotword.update(b'chunk3')
+        hotword.decoder.end_utt.assert_called_once_with()
+        self.assertTrue(hotword.found_wake_word(b'window'))
+        self.assertFalse(hotword.found_wake_word(b'window'))
+
+        # A new search is started with the next chunk
+        hotword.decoder.hyp.return_value = None
+        hotword.update(b'chunk4')
+        self.assertEqual(hotword.decoder.start_utt.call_count, 2)
+
+    def test_bounded_search(self):
+        hotword = self.create_hotword()
+        for chunk in (b'chunk1', b'chunk2', b'chunk3'):
+            hotword.update(chunk)
+        self.assertFalse(hotword.decoder.end_utt.called)
+
+        # The search is restarted, continuing with the end of the audio
+        hotword.update(b'chunk4')
+        hotword.decoder.end_utt.assert_called_once_with()
+        self.assertEqual(hotword.decoder.start_utt.call_count, 2)
+        calls = hotword.decoder.process_raw.call_args_list[-2:]
+        self.assertEqual(calls, [mock.call(b'unk3', False, False),
+                                 mock.call(b'chunk4', False, False)])
+        self.assertEqual(hotword.utt_bytes, 10)
+
+    def test_window_without_update(self):
+        hotword = self.create_hotword()
+        hotword.decoder.hyp.return_value = mock.Mock(hypstr='hey mycroft')
+        self.assertTrue(hotword.found_wake_word(b'window'))
+        hotword.decoder.process_raw.assert_called_once_with(b'window',
+                                                            False, False)
+
+    def test_streaming_disabled(self):
+        hotword = self.create_hotword()
+        hotword.streaming = False
+        hotword.update(b'chunk')
+        self.assertFalse(hotword.decoder.process_raw.called)
+
+
+class PorcupineTest(unittest.TestCase):
+    def create_hotword(self, num_keywords=1):
+        hotword = PorcupineHotWord.__new__(PorcupineHotWord)
+        hotword.audio_buffer = array('h')
+        hotword.has_found = False
+        hotword.num_keywords = num_keywords
+        hotword.porcupine = mock.Mock(frame_length=4)
+        hotword.porcupine.process.return_value = False
+        return hotword
+
+    def test_update_frames(self):
+        hotword = self.create_hotword()
+        samples = array('h', range(10))
+        hotword.update(samples.tobytes())
+        frames = [list(c[0][0]) for c in
+                  hotword.porcupine.process.call_args_list]
+        self.assertEqual(frames, [[0, 1, 2, 3], [4, 5, 6, 7]])
+        # The incomplete frame is kept for the next chunk
+        self.assertEqual(list(hotword.audio_buffer), [8, 9])
+
+        hotword.porcupine.process.return_value = True
+        hotword.update(array('h', [10, 11]).tobytes())
+        self.assertEqual(list(hotword.porcupine.process.call_args[0][0]),
+                         [8, 9, 10, 11])
+        self.assertEqual(len(hotword.audio_buffer), 0)
+        self.assertTrue(hotword.found_wake_word(None))
+        self.assertFalse(hotword.found_wake_word(None))
+
+    def test_multiple_keywords(self):
+        hotword = self.create_hotword(num_keywords=2)
+        hotword.porcupine.process.return_value = -1
+        hotword.update(array('h', range(4)).tobytes())
+        self.assertFalse(hotword.has_found)
+        hotword.porcupine.process.return_value = 1
+        hotword.update(array('h', range(4)).tobytes())
+        self.assertTrue(hotword.has_found)
+
+
+class PreciseLiteTest(unittest.TestCase):
+    def create_hotword(self, config, model='/models/hey-mycroft.pb'):
+        hotword = PreciseHotword.__new__(PreciseHotword)
+        hotword.config = config
+        hotword.precise_model = model
+        return hotword
+
+    def test_default_engine(self):
+        hotword = self.create_hotword({})
+        self.assertIsNone(hotword.load_lite_engine())
+
+    @mock.patch('mycroft.client.speech.hotword_factory.isfile')
+    def test_missing_model(self, mock_isfile):
+        mock_isfile.return_value = False
+        hotword = self.create_hotword({'engine': 'tflite'})
+        self.assertIsNone(hotword.load_lite_engine())
+        mock_isfile.assert_called_with('/models/hey-mycroft.tflite')
+
+    @mock.patch('mycroft.client.speech.precise_lite.PreciseLiteEngine')
+    @mock.patch('mycroft.client.speech.hotword_factory.isfile')
+    def test_load_engine(self, mock_isfile, mock_engine):
+        mock_isfile.return_value = True
+        hotword = self.create_hotword({'engine': 'tflite'})
+        self.assertEqual(hotword.load_lite_engine(), mock_engine.return_value)
+        mock_engine.assert_called_with('/models/hey-mycroft.tflite')
+
+        # A .tflite model is run in process without further configuration
+        hotword = self.create_hotword({}, '/models/custom.tflite')
+        hotword.load_lite_engine()
+        mock_engine.assert_called_with('/models/custom.tflite')
+
+    @mock.patch('mycroft.client.speech.precise_lite.PreciseLiteEngine')
+    @mock.patch('mycroft.client.speech.hotword_factory.isfile')
+    def test_missing_dependencies(self, mock_isfile, mock_engine):
+        mock_isfile.return_value = True
+        mock_engine.side_effect = ImportError('tflite_runtime')
+        hotword = self.create_hotword({'engine': 'tflite'})
+        self.assertIsNone(hotword.load_lite_engine())
+
+    def load_with_params(self, vectorizer):
+        """Load a model with a .params file written like Precise does."""
+        params = {'window_t': 0.1, 'hop_t': 0.05, 'buffer_t': 1.5,
+                  'sample_rate': 16000, 'sample_depth': 2, 'n_mfcc': 13,
+                  'n_filt': 20, 'n_fft': 512, 'use_delta': False,
+                  'vectorizer': vectorizer, 'threshold_config': [[6, 4]],
+                  'threshold_center': 0.2}
+        runtime = mock.MagicMock()
+        with TemporaryDirectory() as model_dir, \
+                mock.patch.dict(sys.modules, {
+                    'sonopy': mock.Mock(),
+                    'tflite_runtime': runtime,
+                    'tflite_runtime.interpreter': runtime.interpreter}):
+            model = join(model_dir, 'hey-mycroft.tflite')
+            open(model, 'wb').close()
+            with open(join(model_dir, 'hey-mycroft.pb.params'), 'w') as f:
+                json.dump(params, f)
+            return self.create_hotword({}, model).load_lite_engine()
+
+    def test_load_mfcc_model(self):
+        from mycroft.client.speech.precise_lite import PreciseLiteEngine
+        self.assertIsInstance(self.load_with_params(2), PreciseLiteEngine)
+
+    def test_load_unsupported_model(self):
+        # Mel spectrogram models fall back to precise-engine
+        self.assertIsNone(self.load_with_params(1))
+
+    def test_update(self):
+        from precise_runner.runner import TriggerDetector
+        hotword = self.create_hotword({})
+        hotword.engine = mock.Mock(chunk_size=4)
+        hotword.engine.get_prediction.return_value = 1.0
+        hotword.detector = TriggerDetector(4, trigger_level=1)
+        hotword.audio_buffer = bytearray()
+        hotword.has_found = False
+
+        hotword.update(b'abcdef')
+        hotword.engine.get_prediction.assert_called_once_with(b'abcd')
+        self.assertFalse(hotword.found_wake_word(None))
+        hotword.update(b'gh')
+        hotword.engine.get_prediction.assert_called_with(b'efgh')
+        self.assertEqual(len(hotword.audio_buffer), 0)
+        self.assertTrue(hotword.found_wake_word(None))
+        self.assertFalse(hotword.found_wake_word(None))
+
+
+class HotWordFrontendTest(unittest.TestCase):
+    def create_engine(self, key_phrase, num_phonemes=4):
+        engine = mock.Mock(spec=HotWordEngine, key_phrase=key_phrase,
+                           num_phonemes=num_phonemes)
+        engine.found_wake_word.return_value = False
+        return engine
+
+    def test_register(self):
+        first = self.create_engine('hey mycroft')
+        frontend = HotWordFrontend([first])
+        self.assertTrue(frontend.register(self.create_engine('wake up', 6)))
+        self.assertFalse(frontend.register(self.create_engine('hey mycroft')))
+        self.assertEqual(list(frontend.engines), ['hey mycroft', 'wake up'])
+        self.assertEqual(frontend.num_phonemes, 6)
+        self.assertEqual(frontend.remove('hey mycroft'), first)
+        self.assertIsNone(frontend.remove('hey mycroft'))
+
+    def test_shared_features(self):
+        engines = [self.create_engine('hey mycroft'),
+                   self.create_engine('wake up')]
+        frontend = HotWordFrontend(engines)
+        frontend.update(array('h', [1, 2, 3]).tobytes())
+        features = engines[0].update_features.call_args[0][0]
+        self.assertIs(engines[1].update_features.call_args[0][0], features)
+        self.assertEqual(list(features.samples), [1, 2, 3])
+        # The samples are decoded only once
+        self.assertIs(features.samples, features.samples)
+
+    @mock.patch('mycroft.client.speech.precise_lite.MfccExtractor')
+    def test_shared_mfccs(self, mock_extractor):
+        params = {'sample_rate': 16000, 'window_t': 0.1, 'hop_t': 0.05,
+                  'n_fft': 512, 'n_filt': 20, 'n_mfcc': 13}
+        frontend = HotWordFrontend()
+        for chunk in (b'chunk1', b'chunk2'):
+            frontend.update(chunk)  # No engines, nothing is computed
+        self.assertFalse(mock_extractor.called)
+
+        engine = self.create_engine('hey mycroft')
+        engine.update_features.side_effect = lambda f: f.mfccs(params)
+        other = self.create_engine('wake up')
+        other.update_features.side_effect = lambda f: f.mfccs(dict(params))
+        frontend.register(engine)
+        frontend.register(other)
+        frontend.update(b'chunk1')
+        frontend.update(b'chunk2')
+        # One extractor for the stream, fed each chunk once
+        mock_extractor.assert_called_once_with(params)
+        calls = mock_extractor.return_value.update.call_args_list
+        self.assertEqual(calls, [mock.call(b'chunk1'), mock.call(b'chunk2')])
+
+    def test_found_wake_word(self):
+        engines = [self.create_engine('hey mycroft'),
+                   self.create_engine('wake up'),
+                   self.create_engine('hey jarvis')]
+        frontend = HotWordFrontend(engines)
+        self.assertIsNone(frontend.found_wake_word(b'audio'))
+
+        engines[1].found_wake_word.return_value = True
+        engines[2].found_wake_word.return_value = True
+        self.assertEqual(frontend.found_wake_word(b'audio'), engines[1])
+        # All engines are checked, resetting their detections
+        engines[2].found_wake_word.assert_called_with(b'audio')
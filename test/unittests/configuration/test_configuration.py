@@ -76,5 +76,98 @@ class TestConfiguration(TestCase):
         mycroft.configuration.Configuration.updated('message')
         self.assertEqual(c, {'a': 2})
 
+    @patch('mycroft.configuration.config.RemoteConf')
+    @patch('mycroft.configuration.config.LocalConf')
+    def test_patch_reuses_loaded_layers(self, mock_local, mock_remote):
+        mock_remote.return_value = {}
+        mock_local.return_value = {'a': 1}
+        c = mycroft.configuration.Configuration.get()
+        version = mycroft.configuration.Configuration.version()
+        mock_local.reset_mock()
+        mock_remote.reset_mock()
+
+        message = MagicMock()
+        message.data = {'config': {'b': 2}}
+        mycroft.configuration.Configuration.patch(message)
+        self.assertEqual(c, {'a': 1, 'b': 2})
+        self.assertFalse(mock_local.called)
+        self.assertFalse(mock_remote.called)
+        self.assertEqual(mycroft.configuration.Configuration.version(),
+                         version + 1)
+
+    @patch('mycroft.configuration.config._get_mtime')
+    @patch('mycroft.configuration.config.RemoteConf')
+    @patch('mycroft.configuration.config.LocalConf')
+    def test_updated_reloads_modified_files(self, mock_local, mock_remote,
+                                            mock_mtime):
+        mock_mtime.return_value = 1
+        mock_remote.return_value = {}
+        mock_local.return_value = {'a': 1}
+        c = mycroft.configuration.Configuration.get()
+
+        mock_local.reset_mock()
+        mock_local.return_value = {'a': 2}
+        mycroft.configuration.Configuration.updated('message')
+        self.assertFalse(mock_local.called)
+        self.assertEqual(c, {'a': 1})
+
+        mock_mtime.side_effect = lambda path: (
+            2 if path == mycroft.configuration.USER_CONFIG else 1)
+        mycroft.configuration.Configuration.updated('message')
+        mock_local.assert_called_once_with(mycroft.configuration.USER_CONFIG)
+        self.assertEqual(c, {'a': 2})
+
+    @patch('mycroft.configuration.config.RemoteConf')
+    @patch('mycroft.configuration.config.LocalConf')
+    def test_subscribe(self, mock_local, mock_remote):
+        mock_remote.return_value = {'tts': {'module': 'mimic'}, 'lang': 'en'}
+        mock_local.return_value = {}
+        mycroft.configuration.Configuration.get()
+
+        tts_handler = MagicMock()
+        lang_handler = MagicMock()
+        mycroft.configuration.Configuration.subscribe('tts', tts_handler)
+        mycroft.configuration.Configuration.subscribe('lang', lang_handler)
+        mock_remote.return_value = {'tts': {'module': 'espeak'}, 'lang': 'en'}
+        mycroft.configuration.Configuration.updated('message')
+        tts_handler.assert_called_once_with(
+            mycroft.configuration.Configuration.get())
+        self.assertFalse(lang_handler.called)
+
+        mycroft.configuration.Configuration.unsubscribe('tts', tts_handler)
+        mycroft.configuration.Configuration.unsubscribe('lang', lang_handler)
+        mock_remote.return_value = {'tts': {'module': 'mimic'}}
+        mycroft.configuration.Configuration.updated('message')
+        tts_handler.assert_called_once()
+        self.assertFalse(lang_handler.called)
+
+    @patch('mycroft.configuration.config._get_mtime')
+    @patch('mycroft.configuration.config.LocalConf')
+    def test_get_local(self, mock_local, mock_mtime):
+        mycroft.configuration.Configuration._Configuration__local_mtimes = None
+        mock_mtime.return_value = 1
+        mock_local.return_value = {'a': 1}
+        local = mycroft.configuration.Configuration.get_local()
+        self.assertEqual(local, {'a': 1})
+        self.assertEqual(mock_local.call_count, 3)
+
+        # Unmodified files are not read again
+        mock_local.reset_mock()
+        self.assertIs(mycroft.configuration.Configuration.get_local(), local)
+        self.assertFalse(mock_local.called)
+
+        mock_mtime.return_value = 2
+        mock_local.return_value = {'a': 2}
+        self.assertEqual(mycroft.configuration.Configuration.get_local(),
+                         {'a': 2})
+        self.assertEqual(mock_local.call_count, 3)
+
+    def test_update_handlers_registered_once(self):
+        bus = MagicMock()
+        mycroft.configuration.Configuration.set_config_update_handlers(bus)
+        mycroft.configuration.Configuration.set_config_update_handlers(bus)
+        self.assertEqual(bus.on.call_count, 2)
+
     def tearDown(self):
+        mycroft.configuration.Configuration._Configuration__patch.clear()
         mycroft.configuration.Configuration.load_config_stack([{}], True)
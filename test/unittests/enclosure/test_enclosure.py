@@ -0,0 +1,166 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mycroft.client.enclosure.base import (ActiveNamespaces, Enclosure,
+                                           GUIWebsocketHandler)
+from mycroft.messagebus import Message
+
+BASE_CONF = {
+    'lang': 'en-us',
+    'enclosure': {},
+    'gui_websocket': {'update_rate': 30}
+}
+
+
+class TestActiveNamespaces(TestCase):
+    def test_activate(self):
+        namespaces = ActiveNamespaces()
+        msgs = namespaces.activate('a')
+        self.assertEqual(msgs, [{'type': 'mycroft.session.list.insert',
+                                 'namespace': 'mycroft.system.active_skills',
+                                 'position': 0,
+                                 'data': [{'skill_id': 'a'}]}])
+        namespaces.activate('b')
+        namespaces.activate('c')
+        self.assertEqual([n.name for n in namespaces], ['c', 'b', 'a'])
+        self.assertEqual(namespaces.position('a'), 2)
+
+        msgs = namespaces.activate('a')
+        self.assertEqual(msgs, [{'type': 'mycroft.session.list.move',
+                                 'namespace': 'mycroft.system.active_skills',
+                                 'from': 2, 'to': 0, 'items_number': 1}])
+        self.assertEqual([n.name for n in namespaces], ['a', 'c', 'b'])
+        # Already active namespaces need no changes
+        self.assertEqual(namespaces.activate('a'), [])
+
+    def test_remove(self):
+        namespaces = ActiveNamespaces()
+        for name in ['a', 'b', 'c']:
+            namespaces.activate(name)
+        msgs = namespaces.remove('b')
+        self.assertEqual(msgs[0]['position'], 1)
+        self.assertNotIn('b', namespaces)
+        self.assertEqual(namespaces.position('a'), 1)
+        self.assertEqual(namespaces.remove('b'), [])
+
+    def test_pages(self):
+        namespaces = ActiveNamespaces()
+        namespaces.activate('a')
+        msgs = namespaces.add_pages('a', ['1.qml', '2.qml'])
+        self.assertEqual(msgs, [{'type': 'mycroft.gui.list.insert',
+                                 'namespace': 'a', 'position': 0,
+                                 'data': [{'url': '1.qml'},
+                                          {'url': '2.qml'}]}])
+        msgs = namespaces.add_pages('a', ['2.qml', '3.qml'])
+        self.assertEqual(msgs[0]['position'], 2)
+        self.assertEqual(msgs[0]['data'], [{'url': '3.qml'}])
+        self.assertEqual(namespaces.add_pages('a', ['1.qml']), [])
+
+        msgs = namespaces.remove_pages('a', ['1.qml', '3.qml', '4.qml'])
+        self.assertEqual([msg['position'] for msg in msgs], [2, 0])
+        self.assertEqual(namespaces.pages('a'), ['2.qml'])
+
+
+@patch('mycroft.client.enclosure.base.create_daemon', MagicMock())
+@patch('mycroft.client.enclosure.base.create_gui_service', MagicMock())
+@patch('mycroft.client.enclosure.base.MessageBusClient', MagicMock())
+@patch('mycroft.client.enclosure.base.Configuration')
+class TestEnclosureGUI(TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        GUIWebsocketHandler.clients.append(self.client)
+
+    def tearDown(self):
+        GUIWebsocketHandler.clients.remove(self.client)
+
+    def create_enclosure(self, mock_config):
+        mock_config.get.return_value = BASE_CONF
+        enclosure = Enclosure()
+        enclosure.show('skill', ['page.qml'], 0)
+        self.client.write_message.reset_mock()
+        return enclosure
+
+    def sent(self):
+        return [json.loads(c[0][0])
+                for c in self.client.write_message.call_args_list]
+
+    def test_set_coalesced(self, mock_config):
+        enclosure = self.create_enclosure(mock_config)
+        enclosure.on_gui_set_value(Message('gui.value.set',
+                                           {'a': 1, '__from': 'skill'}))
+        enclosure.on_gui_set_value(Message('gui.value.set',
+                                           {'a': 2, 'b': 3,
+                                            '__from': 'skill'}))
+        self.assertEqual(self.sent(), [])
+        self.assertTrue(enclosure.sets_pending.is_set())
+
+        with enclosure.send_lock:
+            enclosure.flush_sets()
+        self.assertEqual(self.sent(), [{'type': 'mycroft.session.set',
+                                        'namespace': 'skill',
+                                        'data': {'a': 2, 'b': 3}}])
+
+    def test_set_unloaded_namespace(self, mock_config):
+        enclosure = self.create_enclosure(mock_config)
+        enclosure.set('other', 'a', 1)
+        self.assertEqual(enclosure.pending_sets, {})
+        self.assertEqual(enclosure.datastore['other'], {'a': 1})
+
+    def test_send_flushes_pending(self, mock_config):
+        enclosure = self.create_enclosure(mock_config)
+        enclosure.set('skill', 'a', 1)
+        enclosure.remove_namespace('skill')
+        self.assertEqual([msg['type'] for msg in self.sent()],
+                         ['mycroft.session.set',
+                          'mycroft.session.list.remove'])
+
+    def test_new_namespace_data(self, mock_config):
+        enclosure = self.create_enclosure(mock_config)
+        enclosure.set('other', 'a', 1)
+        enclosure.set('other', 'b', 2)
+        enclosure.show('other', ['other.qml'], 0)
+        sets = [msg for msg in self.sent()
+                if msg['type'] == 'mycroft.session.set']
+        self.assertEqual(sets, [{'type': 'mycroft.session.set',
+                                 'namespace': 'other',
+                                 'data': {'a': 1, 'b': 2}}])
+
+    def test_show_existing_namespace(self, mock_config):
+        enclosure = self.create_enclosure(mock_config)
+        enclosure.show('other', ['other.qml'], 0)
+        self.client.write_message.reset_mock()
+
+        enclosure.show('skill', ['page2.qml'], 0)
+        self.assertEqual([msg['type'] for msg in self.sent()],
+                         ['mycroft.session.list.move',
+                          'mycroft.gui.list.insert'])
+        self.assertEqual(self.sent()[1]['position'], 1)
+
+        self.client.write_message.reset_mock()
+        enclosure.show('skill', ['page.qml'], 0)
+        self.assertEqual(self.sent(), [{'type': 'mycroft.events.triggered',
+                                        'namespace': 'skill',
+                                        'event_name': 'page_gained_focus',
+                                        'data': {'number': 0}}])
+
+    def test_remove_pages_inactive_namespace(self, mock_config):
+        enclosure = self.create_enclosure(mock_config)
+        enclosure.show('other', ['other.qml'], 0)
+        enclosure.remove_pages('skill', ['page.qml'])
+        self.assertEqual(enclosure.loaded.pages('skill'), [])
+        self.assertEqual(enclosure.loaded.pages('other'), ['other.qml'])
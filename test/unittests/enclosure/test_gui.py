@@ -0,0 +1,94 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mycroft.enclosure.gui import SkillGUI
+from mycroft.messagebus import Message
+
+
+def value_set_data(skill):
+    return [c[0][0].data for c in skill.bus.emit.call_args_list
+            if c[0][0].msg_type == 'gui.value.set']
+
+
+@patch('mycroft.enclosure.gui.Configuration', MagicMock())
+class TestSkillGUI(TestCase):
+    def setUp(self):
+        self.skill = MagicMock()
+        self.skill.skill_id = 'test_skill'
+        self.skill.find_resource.return_value = '/ui/page.qml'
+        self.gui = SkillGUI(self.skill)
+
+    def test_set_before_show(self):
+        self.gui['a'] = 1
+        self.gui['b'] = [1, 2, 3]
+        self.assertEqual(value_set_data(self.skill), [])
+
+        # All values are sent when the page is shown
+        self.gui.show_page('page.qml')
+        self.assertEqual(value_set_data(self.skill),
+                         [{'a': 1, 'b': [1, 2, 3], '__from': 'test_skill'}])
+
+    def test_set_sends_delta(self):
+        self.gui['results'] = list(range(100))
+        self.gui.show_page('page.qml')
+        self.skill.bus.emit.reset_mock()
+
+        self.gui['progress'] = 10
+        self.assertEqual(value_set_data(self.skill),
+                         [{'progress': 10, '__from': 'test_skill'}])
+        self.assertEqual(self.gui['results'], list(range(100)))
+
+    def test_set_unchanged(self):
+        self.gui['title'] = 'Song'
+        self.gui['results'] = [1, 2]
+        self.gui.show_page('page.qml')
+        self.skill.bus.emit.reset_mock()
+
+        self.gui['title'] = 'Song'
+        self.gui['results'] = [1, 2]
+        self.assertEqual(value_set_data(self.skill), [])
+
+        # A list modified in place is sent again
+        self.gui['results'].append(3)
+        self.gui['results'] = self.gui['results']
+        self.assertEqual(value_set_data(self.skill),
+                         [{'results': [1, 2, 3], '__from': 'test_skill'}])
+
+    def test_batch(self):
+        self.gui.show_page('page.qml')
+        self.skill.bus.emit.reset_mock()
+
+        with self.gui.batch():
+            self.gui['title'] = 'Song'
+            with self.gui.batch():
+                self.gui['progress'] = 10
+            self.gui['progress'] = 20
+            self.assertEqual(value_set_data(self.skill), [])
+        self.assertEqual(value_set_data(self.skill),
+                         [{'title': 'Song', 'progress': 20,
+                           '__from': 'test_skill'}])
+
+    def test_gui_set(self):
+        self.gui.show_page('page.qml')
+        self.skill.bus.emit.reset_mock()
+        callback = MagicMock()
+        self.gui.set_on_gui_changed(callback)
+
+        self.gui.gui_set(Message('test_skill.set', {'a': 1, 'b': 2}))
+        self.assertEqual(value_set_data(self.skill),
+                         [{'a': 1, 'b': 2, '__from': 'test_skill'}])
+        self.assertTrue(callback.called)
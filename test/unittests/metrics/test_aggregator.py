@@ -0,0 +1,129 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from urllib.request import urlopen
+
+from mycroft.messagebus import Message
+from mycroft.metrics.aggregator import (Histogram, MetricsAggregator,
+                                        setup_metrics_handlers,
+                                        start_metrics_server)
+
+
+class TestHistogram(TestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        for i in range(1000):
+            histogram.add(i / 1000)
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.min, 0.0)
+        self.assertEqual(histogram.max, 0.999)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.01)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, delta=0.01)
+
+    def test_fixed_size(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for i in range(100):
+            histogram.add(i)
+        self.assertEqual(histogram.counts, [1, 1, 98])
+        self.assertEqual(histogram.percentile(100), 99)
+
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.percentile(50))
+        self.assertEqual(histogram.summary()['count'], 0)
+
+
+class TestMetricsAggregator(TestCase):
+    def test_snapshot(self):
+        metrics = MetricsAggregator()
+        metrics.increment('mycroft.wakeup')
+        metrics.increment('mycroft.wakeup', 2)
+        metrics.timer('mycroft.stt', 0.5)
+        metrics.level('mycroft.energy', 10)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'mycroft.wakeup': 3})
+        self.assertEqual(snapshot['timers']['mycroft.stt']['count'], 1)
+        self.assertEqual(snapshot['timers']['mycroft.stt']['p50'], 0.5)
+        self.assertEqual(snapshot['levels'], {'mycroft.energy': 10})
+        self.assertIn('version', snapshot['attributes'])
+
+    def test_to_prometheus(self):
+        metrics = MetricsAggregator()
+        metrics.increment('mycroft.wakeup')
+        metrics.timer('mycroft.stt', 0.5)
+        text = metrics.to_prometheus()
+        self.assertIn('mycroft_wakeup_total 1\n', text)
+        self.assertIn('mycroft_stt_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn('mycroft_stt_seconds_count 1\n', text)
+
+    @patch('mycroft.metrics.publish_aggregates')
+    def test_flush(self, mock_publish):
+        metrics = MetricsAggregator()
+        metrics.flush()
+        self.assertFalse(mock_publish.called)
+
+        metrics.increment('mycroft.wakeup')
+        metrics.flush()
+        payload = mock_publish.call_args[0][0]
+        self.assertEqual(payload['counters'], {'mycroft.wakeup': 1})
+        self.assertEqual(metrics.snapshot()['counters'], {})
+
+    @patch('mycroft.metrics.publish_aggregates')
+    def test_record_during_flush(self, mock_publish):
+        metrics = MetricsAggregator()
+        metrics.increment('mycroft.wakeup')
+        # Values recorded while publishing are kept for the next flush
+        mock_publish.side_effect = lambda payload: metrics.increment(
+            'mycroft.wakeup', 2)
+        metrics.flush()
+        self.assertEqual(mock_publish.call_args[0][0]['counters'],
+                         {'mycroft.wakeup': 1})
+        self.assertEqual(metrics.snapshot()['counters'],
+                         {'mycroft.wakeup': 2})
+
+
+class TestScrape(TestCase):
+    @patch('mycroft.metrics.aggregator.Configuration')
+    @patch('mycroft.metrics.aggregator.get_aggregator')
+    def test_bus_scrape(self, mock_get_aggregator, mock_config):
+        mock_config.get.return_value = {}
+        mock_get_aggregator.return_value.snapshot.return_value = {'x': 1}
+        bus = MagicMock()
+        setup_metrics_handlers(bus, 'voice')
+        handler = bus.on.call_args[0][1]
+        handler(Message('mycroft.metrics.get'))
+        response = bus.emit.call_args[0][0]
+        self.assertEqual(response.msg_type, 'mycroft.metrics.get.response')
+        self.assertEqual(response.data, {'process': 'voice',
+                                         'metrics': {'x': 1}})
+
+    @patch('mycroft.metrics.aggregator.get_aggregator')
+    def test_http_scrape(self, mock_get_aggregator):
+        metrics = MetricsAggregator()
+        metrics.increment('mycroft.wakeup')
+        mock_get_aggregator.return_value = metrics
+        server = start_metrics_server(0)
+        try:
+            url = 'http://127.0.0.1:{}'.format(server.server_port)
+            with urlopen(url + '/metrics') as response:
+                self.assertIn(b'mycroft_wakeup_total 1', response.read())
+            with urlopen(url + '/metrics.json') as response:
+                data = json.loads(response.read().decode('utf-8'))
+                self.assertEqual(data['counters'], {'mycroft.wakeup': 1})
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,118 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from requests import RequestException
+
+from mycroft.metrics import MetricSpool, _MetricSender
+from mycroft.metrics.sinks import (BackendMetricSink, FileMetricSink,
+                                   PrometheusMetricSink)
+
+
+class TestMetricSpool(TestCase):
+    def test_append_pop(self):
+        with TemporaryDirectory() as tmp_dir:
+            spool = MetricSpool(join(tmp_dir, 'spool.jsonl'), max_size=3)
+            self.assertEqual(spool.pop_all(), [])
+            spool.append([('timing', {'a': 1}), ('timing', {'a': 2})])
+            spool.append([('timing', {'a': 3}), ('timing', {'a': 4})])
+            # The oldest event is dropped
+            self.assertEqual(spool.pop_all(), [('timing', {'a': 2}),
+                                               ('timing', {'a': 3}),
+                                               ('timing', {'a': 4})])
+            self.assertEqual(spool.pop_all(), [])
+
+
+@patch('mycroft.metrics.sinks.is_paired')
+@patch('mycroft.metrics.sinks.Configuration')
+@patch('mycroft.metrics.sinks.DeviceApi')
+class TestBackendMetricSink(TestCase):
+    def test_not_opted_in(self, mock_api, mock_config, mock_is_paired):
+        mock_config.get.return_value = {'opt_in': False}
+        sink = BackendMetricSink()
+        self.assertEqual(sink.export([('timing', {})]), [])
+        self.assertFalse(mock_api.called)
+
+    def test_not_paired(self, mock_api, mock_config, mock_is_paired):
+        mock_config.get.return_value = {'opt_in': True}
+        mock_is_paired.return_value = False
+        sink = BackendMetricSink()
+        self.assertEqual(sink.export([('timing', {})]), [('timing', {})])
+
+    def test_network_error(self, mock_api, mock_config, mock_is_paired):
+        mock_config.get.return_value = {'opt_in': True}
+        mock_is_paired.return_value = True
+        mock_api.return_value.report_metric.side_effect = [
+            None, RequestException('Connection lost')
+        ]
+        events = [('timing', {'a': 1}), ('timing', {'a': 2}),
+                  ('timing', {'a': 3})]
+        sink = BackendMetricSink()
+        self.assertEqual(sink.export(events), events[1:])
+        # The api is reused for the following batches
+        sink.export([])
+        self.assertEqual(mock_api.call_count, 1)
+
+
+class TestLocalSinks(TestCase):
+    def test_file_sink(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'metrics', 'metrics.jsonl')
+            sink = FileMetricSink(path)
+            sink.export([('timing', {'system': 'stt', 'time': 0.5})])
+            sink.export([('skill:metric', {'a': 1})])
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(lines[0]['data'], {'system': 'stt', 'time': 0.5})
+            self.assertEqual(lines[1]['name'], 'skill:metric')
+
+    def test_prometheus_sink(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'mycroft.prom')
+            sink = PrometheusMetricSink(path)
+            sink.export([('timing', {'system': 'stt', 'time': 0.5}),
+                         ('timing', {'system': 'stt', 'time': 0.25})])
+            sink.export([('skill:metric', {'a': 1})])
+            with open(path) as f:
+                text = f.read()
+            self.assertIn('mycroft_timing_seconds_sum{system="stt"} 0.75',
+                          text)
+            self.assertIn('mycroft_timing_seconds_count{system="stt"} 2',
+                          text)
+            self.assertIn('mycroft_metric_events_total{name="timing"} 2',
+                          text)
+            self.assertIn(
+                'mycroft_metric_events_total{name="skill:metric"} 1', text)
+
+
+class TestMetricSender(TestCase):
+    def test_export_spools_unsent(self):
+        sender = _MetricSender.__new__(_MetricSender)
+        sender.spool = MagicMock()
+        sender.spool.pop_all.return_value = [('timing', {'a': 0})]
+        sender.backend_sink = MagicMock()
+        sender.backend_sink.export.return_value = [('timing', {'a': 1})]
+        local_sink = MagicMock()
+        sender.local_sinks = [local_sink]
+
+        sender.export([('timing', {'a': 1})])
+        local_sink.export.assert_called_once_with([('timing', {'a': 1})])
+        sender.backend_sink.export.assert_called_once_with(
+            [('timing', {'a': 0}), ('timing', {'a': 1})])
+        sender.spool.append.assert_called_once_with([('timing', {'a': 1})])
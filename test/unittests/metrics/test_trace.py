@@ -0,0 +1,101 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from mycroft.messagebus import Message
+from mycroft.metrics.trace import (TraceBuffer, TraceSpan,
+                                   setup_trace_handlers, to_chrome_trace)
+
+
+class TestTraceBuffer(TestCase):
+    def test_ring_buffer(self):
+        buffer = TraceBuffer(max_traces=2)
+        buffer.add('a', 'stt', 1.0, 0.5)
+        buffer.add('b', 'stt', 2.0, 0.5)
+        buffer.add('a', 'adapt', 1.5, 0.1)
+        buffer.add('c', 'stt', 3.0, 0.5)
+        # The oldest trace is dropped
+        self.assertEqual(buffer.get('a'), [])
+        self.assertEqual([s['ident'] for s in buffer.get()], ['b', 'c'])
+
+    def test_bind_pending(self):
+        buffer = TraceBuffer()
+        buffer.add(None, 'wake_word', 1.0, 0.01)
+        buffer.add(None, 'recording', 1.1, 2.0)
+        buffer.add(None, 'wake_word', 5.0, 0.01)
+        buffer.bind('a', until=3.2)
+        self.assertEqual([s['stage'] for s in buffer.get('a')],
+                         ['wake_word', 'recording'])
+        buffer.bind('b')
+        self.assertEqual([s['start'] for s in buffer.get('b')], [5.0])
+        self.assertEqual(buffer.pending, [])
+
+
+class TestTraceSpan(TestCase):
+    @patch('mycroft.metrics.trace._trace_buffer')
+    def test_trace_span(self, mock_buffer):
+        with TraceSpan('a', 'adapt', {'lang': 'en-us'}):
+            pass
+        args = mock_buffer.add.call_args[0]
+        self.assertEqual(args[:2], ('a', 'adapt'))
+        self.assertEqual(args[4], {'lang': 'en-us'})
+
+        # Spans without ident aren't recorded
+        mock_buffer.reset_mock()
+        with TraceSpan(None, 'adapt'):
+            pass
+        self.assertFalse(mock_buffer.add.called)
+
+
+class TestChromeTrace(TestCase):
+    def test_to_chrome_trace(self):
+        spans = [
+            {'ident': 'a', 'stage': 'adapt', 'start': 1.5, 'duration': 0.1,
+             'data': {}, 'process': 'skills'},
+            {'ident': 'a', 'stage': 'stt', 'start': 1.0, 'duration': 0.5,
+             'data': {'stt': 'MycroftSTT'}, 'process': 'voice'}
+        ]
+        trace = to_chrome_trace(spans)
+        events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEqual([e['name'] for e in events], ['stt', 'adapt'])
+        self.assertEqual(events[0]['ts'], 1000000)
+        self.assertEqual(events[0]['dur'], 500000)
+        self.assertEqual(events[0]['args'], {'stt': 'MycroftSTT'})
+        self.assertNotEqual(events[0]['pid'], events[1]['pid'])
+        names = [e['args']['name'] for e in trace['traceEvents']
+                 if e['name'] == 'process_name']
+        self.assertEqual(names, ['voice', 'skills'])
+
+
+class TestTraceHandlers(TestCase):
+    @patch('mycroft.metrics.trace.Configuration')
+    @patch('mycroft.metrics.trace._trace_buffer')
+    def test_get(self, mock_buffer, mock_config):
+        mock_config.get.return_value = {}
+        mock_buffer.get.return_value = [
+            {'ident': 'a', 'stage': 'stt', 'start': 1.0, 'duration': 0.5,
+             'data': {}}
+        ]
+        bus = MagicMock()
+        setup_trace_handlers(bus, 'voice')
+        handler = bus.on.call_args[0][1]
+        handler(Message('mycroft.trace.get', {'ident': 'a'}))
+
+        mock_buffer.get.assert_called_with('a')
+        response = bus.emit.call_args[0][0]
+        self.assertEqual(response.msg_type, 'mycroft.trace.get.response')
+        self.assertEqual(response.data['process'], 'voice')
+        self.assertEqual(response.data['spans'][0]['process'], 'voice')
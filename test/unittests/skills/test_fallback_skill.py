@@ -0,0 +1,91 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from threading import Event
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from mycroft.messagebus import Message
+from mycroft.skills.fallback_skill import FallbackSkill
+
+
+def make_fallback(result, calls=None, name=None):
+    def fallback(message):
+        if calls is not None:
+            calls.append(name)
+        return result
+    return fallback
+
+
+class TestFallbackRegistry(TestCase):
+    def setUp(self):
+        # Separate registry for each test
+        class Fallbacks(FallbackSkill):
+            fallback_handlers = {}
+            fallback_order = []
+            fallback_priorities = {}
+        self.cls = Fallbacks
+        self.bus = MagicMock()
+
+    def emitted(self):
+        return [c[0][0].msg_type for c in self.bus.emit.call_args_list]
+
+    def test_priority_order(self):
+        calls = []
+        self.cls._register_fallback(make_fallback(False, calls, 'a'), 50)
+        self.cls._register_fallback(make_fallback(False, calls, 'b'), 10)
+        self.cls._register_fallback(make_fallback(True, calls, 'c'), 10)
+        self.cls._register_fallback(make_fallback(True, calls, 'd'), 90)
+        handler = self.cls.make_intent_failure_handler(self.bus, False)
+        handler(Message('intent_failure', {}, {}))
+        self.assertEqual(calls, ['b', 'c'])
+        self.assertEqual(sorted(self.cls.fallback_handlers), [10, 11, 50, 90])
+        self.assertIn('mycroft.skill.handler.complete', self.emitted())
+        self.assertNotIn('complete_intent_failure', self.emitted())
+
+    def test_remove(self):
+        calls = []
+        fallback = make_fallback(True, calls, 'a')
+        self.cls._register_fallback(fallback, 10)
+        self.cls._register_fallback(make_fallback(False, calls, 'b'), 10)
+        self.cls.remove_fallback(fallback)
+        self.assertEqual(self.cls.fallback_order, [(10, 11)])
+
+        handler = self.cls.make_intent_failure_handler(self.bus, False)
+        handler(Message('intent_failure', {}, {}))
+        self.assertEqual(calls, ['b'])
+        self.assertIn('complete_intent_failure', self.emitted())
+
+    def test_concurrent(self):
+        started = Event()
+
+        def blocking(message):
+            # Only returns if the other fallback runs at the same time
+            return started.wait(5)
+
+        def other(message):
+            started.set()
+            return True
+
+        calls = []
+        self.cls._register_fallback(make_fallback(False, calls, 'tight'), 5)
+        self.cls._register_fallback(blocking, 20)
+        self.cls._register_fallback(other, 30)
+        self.cls._register_fallback(make_fallback(True, calls, 'last'), 100)
+        handler = self.cls.make_intent_failure_handler(self.bus, True)
+        handler(Message('intent_failure', {}, {}))
+
+        self.assertEqual(calls, ['tight'])
+        complete = self.bus.emit.call_args[0][0]
+        self.assertEqual(complete.data['fallback_handler'], 'blocking')
@@ -68,6 +68,71 @@ class ContextManagerTest(TestCase):
         self.context_manager.remove_context('TestContext')
         self.assertEqual(len(self.context_manager.frame_stack), 0)
 
+    def test_remove_context_keeps_other_types(self):
+        self.context_manager.inject_context(make_context_entity('A', 'a'))
+        self.context_manager.inject_context(make_context_entity('B', 'b'),
+                                            {'skill': 'other'})
+        self.context_manager.remove_context('A')
+        context = self.context_manager.get_context()
+        self.assertEqual([e['data'][0][1] for e in context], ['B'])
+
+    def test_get_context(self):
+        self.context_manager.inject_context(make_context_entity('A', 'old'))
+        self.context_manager.inject_context(make_context_entity('B', 'b'),
+                                            {'skill': 'other'})
+        self.context_manager.inject_context(make_context_entity('A', 'new'),
+                                            {'skill': 'third'})
+        context = self.context_manager.get_context()
+        # Only the latest instance of each type is used
+        self.assertEqual([e['key'] for e in context], ['new', 'b'])
+        self.assertEqual(context[0]['confidence'], 0.5)
+        self.assertEqual(context[1]['confidence'], 1.0 / 3)
+
+        context = self.context_manager.get_context(missing_entities=['B'])
+        self.assertEqual([e['key'] for e in context], ['b'])
+        context = self.context_manager.get_context(max_frames=1)
+        self.assertEqual([e['key'] for e in context], ['new'])
+
+    def test_get_context_cached(self):
+        self.context_manager.inject_context(make_context_entity('A', 'a'))
+        context = self.context_manager.get_context()
+        # Adapt sorts the returned list in place
+        context.clear()
+        second = self.context_manager.get_context()
+        self.assertEqual(len(second), 1)
+        self.assertIs(self.context_manager.get_context()[0], second[0])
+
+        self.context_manager.inject_context(make_context_entity('B', 'b'))
+        self.assertEqual(len(self.context_manager.get_context()), 2)
+
+    @mock.patch('mycroft.skills.intent_service.Timer')
+    @mock.patch('mycroft.skills.intent_service.time')
+    def test_expiry(self, mock_time, mock_timer):
+        mock_time.time.return_value = 1000
+        self.context_manager.inject_context(make_context_entity('A', 'a'))
+        mock_timer.assert_called_once_with(180, mock.ANY)
+        mock_time.time.return_value = 1100
+        self.context_manager.inject_context(make_context_entity('B', 'b'),
+                                            {'skill': 'other'})
+        self.assertEqual(mock_timer.call_count, 1)
+
+        mock_time.time.return_value = 1180
+        self.context_manager._expire_frames()
+        self.assertEqual([e['key'] for e in
+                          self.context_manager.get_context()], ['b'])
+        # Timer for the remaining frame
+        mock_timer.assert_called_with(100, mock.ANY)
+
+        mock_time.time.return_value = 1280
+        self.context_manager._expire_frames()
+        self.assertEqual(self.context_manager.get_context(), [])
+        self.assertEqual(mock_timer.call_count, 2)
+
+
+def make_context_entity(context, word):
+    return {'confidence': 1.0, 'data': [(word, context)], 'match': word,
+            'key': word, 'origin': ''}
+
 
 def check_converse_request(message, skill_id):
     return (message.msg_type == 'skill.converse.request' and
@@ -176,3 +241,39 @@ class ConversationTest(TestCase):
         self.assertTrue(check_converse_request(atari_message, 'atari_skill'))
         first_active_skill = self.intent_service.active_skills[0][0]
         self.assertEqual(first_active_skill, 'atari_skill')
+
+
+class PartialUtteranceTest(TestCase):
+    def setUp(self):
+        self.intent_service = IntentService(mock.Mock())
+
+    def partial(self, utterance):
+        return Message('recognizer_loop:partial_utterance',
+                       {'utterances': [utterance], 'lang': 'en-us'})
+
+    @mock.patch('mycroft.skills.intent_service.PadatiousService')
+    def test_prewarm(self, mock_padatious):
+        service = self.intent_service
+        service.handle_partial_utterance(self.partial("what's the time"))
+        service.prewarm_executor.shutdown(wait=True)
+        prewarm = mock_padatious.instance.prewarm_intent
+        prewarm.assert_has_calls([mock.call("what's the time"),
+                                  mock.call('what is the time')])
+        self.assertEqual(service.normalized[("what's the time", 'en-us')],
+                         'what is the time')
+
+    @mock.patch('mycroft.skills.intent_service.normalize')
+    @mock.patch('mycroft.skills.intent_service.PadatiousService')
+    def test_stale_partial_skipped(self, mock_padatious, mock_normalize):
+        service = self.intent_service
+        mock_normalize.side_effect = lambda utt, *args, **kwargs: utt
+        service.partial_utterance = ('what is', 'en-us')
+        service._prewarm(('what', 'en-us'))
+        self.assertFalse(mock_padatious.instance.prewarm_intent.called)
+        service._prewarm(('what is', 'en-us'))
+        mock_padatious.instance.prewarm_intent.assert_called_once_with(
+            'what is')
+
+        # The final utterance reuses the normalization
+        self.assertEqual(service._normalize('what is', 'en-us'), 'what is')
+        self.assertEqual(mock_normalize.call_count, 1)
@@ -0,0 +1,161 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from os.path import dirname, join
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from padatious.match_data import MatchData
+
+from mycroft.messagebus import Message
+from mycroft.skills.padatious_service import PadatiousService
+
+INTENT_FILE = join(dirname(__file__), 'intent_file', 'vocab', 'en-us',
+                   'test.intent')
+CONFIG = {
+    'padatious': {
+        'intent_cache': '~/.mycroft/intent_cache',
+        'train_delay': 4,
+        'single_thread': True
+    }
+}
+
+
+def register_message(name, file_name=INTENT_FILE):
+    return Message('padatious:register_intent',
+                   {'name': name, 'file_name': file_name})
+
+
+@patch('mycroft.skills.padatious_service.Timer')
+@patch('mycroft.skills.padatious_service._load_container')
+@patch('mycroft.skills.padatious_service.Configuration')
+class TestPadatiousService(TestCase):
+    def create_service(self, mock_config):
+        mock_config.get.return_value = CONFIG
+        service = PadatiousService(MagicMock(), MagicMock())
+        service._train_in_worker = MagicMock()
+        return service
+
+    def test_initial_training(self, mock_config, mock_load, mock_timer):
+        service = self.create_service(mock_config)
+        service.register_intent(register_message('skill:intent'))
+        # Nothing is trained before the initial training
+        self.assertFalse(mock_timer.called)
+
+        service.train()
+        service._train_in_worker.assert_called_with(
+            {'skill:intent': INTENT_FILE}, {}, True)
+        self.assertEqual(service.container, mock_load.return_value)
+        self.assertTrue(service.finished_training_event.is_set())
+        msg = service.bus.emit.call_args[0][0]
+        self.assertEqual(msg.msg_type, 'mycroft.ready')
+
+    def test_retrain_scheduled(self, mock_config, mock_load, mock_timer):
+        service = self.create_service(mock_config)
+        service.train()
+        old_container = service.container
+
+        service.register_intent(register_message('skill:intent'))
+        service.register_intent(register_message('skill:other'))
+        # Training is postponed by each registration
+        self.assertEqual(mock_timer.call_count, 2)
+        mock_timer.return_value.cancel.assert_called_once_with()
+        mock_timer.assert_called_with(4, service.train)
+        self.assertEqual(service.container, old_container)
+
+    def test_missing_file(self, mock_config, mock_load, mock_timer):
+        service = self.create_service(mock_config)
+        message = register_message('skill:intent', '/not/a/file.intent')
+        service.register_intent(message)
+        self.assertEqual(service.intent_files, {})
+
+    def test_detach_during_training(self, mock_config, mock_load,
+                                    mock_timer):
+        service = self.create_service(mock_config)
+        service.register_intent(register_message('skill:intent'))
+        service.register_intent(register_message('other:intent'))
+
+        def detach(*args):
+            message = Message('detach_skill', {'skill_id': 'skill'})
+            service.handle_detach_skill(message)
+        service._train_in_worker.side_effect = detach
+        new_container = mock_load.return_value
+        service.train()
+        new_container.remove_intent.assert_called_once_with('skill:intent')
+        self.assertEqual(service.intent_files, {'other:intent': INTENT_FILE})
+
+
+@patch('mycroft.skills.padatious_service.Configuration')
+class TestPadatiousIntentCache(TestCase):
+    def create_service(self, mock_config):
+        mock_config.get.return_value = CONFIG
+        service = PadatiousService(MagicMock(), MagicMock())
+        service.container = MagicMock()
+        service.container.calc_intent.side_effect = (
+            lambda utt: MatchData('skill:' + utt, utt, {}, 0.9))
+        service.finished_training_event.set()
+        return service
+
+    def test_shared_between_stages(self, mock_config):
+        service = self.create_service(mock_config)
+        message = Message('intent_failure',
+                          {'utterance': 'a', 'norm_utt': 'b'},
+                          {'ident': '1'})
+        service.calc_intent('a', '1')
+        service.calc_intent('b', '1')
+        service.handle_fallback(message)
+        service.handle_fallback_last_chance(message)
+        self.assertEqual(service.container.calc_intent.call_count, 2)
+
+    def test_result_copied(self, mock_config):
+        service = self.create_service(mock_config)
+        intent = service.calc_intent('a', '1')
+        intent.matches['utterance'] = 'a'
+        self.assertEqual(service.calc_intent('a', '1').matches, {})
+
+    def test_invalidated_on_change(self, mock_config):
+        service = self.create_service(mock_config)
+        service.calc_intent('a', '1')
+        service.clear_intent_cache()
+        service.calc_intent('a', '1')
+        self.assertEqual(service.container.calc_intent.call_count, 2)
+
+    def test_bounded(self, mock_config):
+        service = self.create_service(mock_config)
+        for i in range(service.max_cached_utterances + 1):
+            service.calc_intent('a', str(i))
+        self.assertNotIn('0', service.intent_results)
+        for i in range(service.max_cached_strings + 1):
+            service.calc_intent(str(i), 'x')
+        self.assertEqual(len(service.intent_results['x']),
+                         service.max_cached_strings)
+
+    def test_prewarmed(self, mock_config):
+        service = self.create_service(mock_config)
+        service.prewarm_intent('what is')
+        service.prewarm_intent('what is')
+        self.assertEqual(service.container.calc_intent.call_count, 1)
+        intent = service.calc_intent('what is', '1')
+        self.assertEqual(intent.name, 'skill:what is')
+        self.assertEqual(service.container.calc_intent.call_count, 1)
+
+        service.clear_intent_cache()
+        service.calc_intent('what is', '2')
+        self.assertEqual(service.container.calc_intent.call_count, 2)
+
+    def test_not_prewarmed_before_training(self, mock_config):
+        service = self.create_service(mock_config)
+        service.finished_training_event.clear()
+        service.prewarm_intent('what is')
+        self.assertFalse(service.container.calc_intent.called)
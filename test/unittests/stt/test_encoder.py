@@ -0,0 +1,148 @@
+# Copyright 2020 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import sys
+from importlib.util import find_spec
+from queue import Queue
+from threading import Thread
+from unittest import TestCase, skipUnless
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from speech_recognition import AudioData
+
+from mycroft.stt.encoder import (EncodedAudioData, FlacEncoder,
+                                 LibFlacEncoder, create_encoder)
+
+
+def queue_chunks(queue):
+    while True:
+        chunk = queue.get()
+        if chunk is None:
+            break
+        yield chunk
+
+
+class TestFlacEncoder(TestCase):
+    def test_encode_stream(self):
+        queue = Queue()
+        output = []
+        encoder = FlacEncoder()
+        encoding = Thread(target=lambda: output.extend(
+            encoder.encode_stream(queue_chunks(queue), 16000)))
+        encoding.start()
+        for i in range(10):
+            queue.put(bytes(range(256)) * 8)
+        queue.put(None)
+        encoding.join(10)
+        self.assertFalse(encoding.is_alive())
+        self.assertEqual(b''.join(output)[:4], b'fLaC')
+
+    def test_stop_early(self):
+        queue = Queue()
+        queue.put(bytes(4096))
+        stream = FlacEncoder().encode_stream(queue_chunks(queue))
+        self.assertEqual(next(stream)[:4], b'fLaC')
+        stream.close()  # Stops the encoder while audio is still expected
+        queue.put(None)
+
+    def test_encode(self):
+        audio = AudioData(bytes(range(256)) * 64, 16000, 2)
+        encoder = FlacEncoder()
+        data = encoder.encode(audio)
+        self.assertEqual(data[:4], b'fLaC')
+        # The encoder can be reused for the next utterance
+        self.assertEqual(encoder.encode(audio), data)
+        self.assertEqual(encoder.encode(audio, 8000)[:4], b'fLaC')
+
+
+class FakeStreamEncoder:
+    """pyflac.StreamEncoder writing a frame for each processed block."""
+    def __init__(self, write_callback, sample_rate, compression_level):
+        self.write_callback = write_callback
+        self.blocks = []
+
+    def process(self, samples):
+        self.blocks.append(samples)
+        self.write_callback(b'frame%d' % len(self.blocks), 6, len(samples),
+                            len(self.blocks))
+
+    def finish(self):
+        self.write_callback(b'end', 3, 0, 0)
+
+
+class TestLibFlacEncoder(TestCase):
+    def setUp(self):
+        self.pyflac = MagicMock()
+        self.pyflac.StreamEncoder.side_effect = self.create_stream_encoder
+        self.stream_encoder = None
+
+    def create_stream_encoder(self, **kwargs):
+        self.stream_encoder = FakeStreamEncoder(**kwargs)
+        return self.stream_encoder
+
+    def test_encode_stream(self):
+        with patch.dict(sys.modules, {'pyflac': self.pyflac}):
+            encoder = LibFlacEncoder()
+        chunks = [np.arange(4, dtype='<i2').tobytes(),
+                  np.arange(3, dtype='<i2').tobytes() + b'\x01']
+        stream = encoder.encode_stream(iter(chunks), 16000)
+
+        # Encoded frames are passed on before the next chunk is read
+        self.assertEqual(next(stream), b'frame1')
+        self.assertEqual(len(self.stream_encoder.blocks), 1)
+        self.assertEqual(list(stream), [b'frame2', b'end'])
+
+        first, second = self.stream_encoder.blocks
+        self.assertEqual(first.shape, (4, 1))
+        self.assertEqual(first.dtype, np.dtype('<i2'))
+        self.assertEqual(first[:, 0].tolist(), [0, 1, 2, 3])
+        # An incomplete sample at the end of a chunk is dropped
+        self.assertEqual(second.shape, (3, 1))
+
+    def test_encoded_audio_data(self):
+        encoder = MagicMock()
+        audio = AudioData(bytes(64), 16000, 2)
+        encoded = EncodedAudioData(audio, encoder)
+        self.assertEqual(encoded.get_flac_data(8000, 2),
+                         encoder.encode.return_value)
+        encoder.encode.assert_called_with(encoded, 8000)
+
+    def test_invalid_audio_data(self):
+        audio = AudioData(bytes(64), 16000, 2)
+        audio.sample_width = 3.5
+        with self.assertRaises(AssertionError):
+            EncodedAudioData(audio, MagicMock())
+
+    @skipUnless(find_spec('pyflac'), 'pyflac is not installed')
+    def test_pyflac(self):
+        chunks = [np.arange(i * 1024, (i + 1) * 1024, dtype='<i2').tobytes()
+                  for i in range(16)]
+        data = b''.join(LibFlacEncoder().encode_stream(iter(chunks), 16000))
+        self.assertEqual(data[:4], b'fLaC')
+
+
+class TestCreateEncoder(TestCase):
+    def test_default(self):
+        with patch.object(LibFlacEncoder, '__init__') as mock_init:
+            mock_init.return_value = None
+            self.assertIsInstance(create_encoder(), LibFlacEncoder)
+
+    def test_fallback(self):
+        with patch.object(LibFlacEncoder, '__init__') as mock_init:
+            mock_init.side_effect = ImportError('pyflac')
+            encoder = create_encoder('libflac')
+        self.assertEqual(type(encoder), FlacEncoder)
+        self.assertEqual(type(create_encoder('flac')), FlacEncoder)
+        self.assertEqual(type(create_encoder('opus')), FlacEncoder)
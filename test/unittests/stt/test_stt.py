@@ -13,9 +13,12 @@
 # limitations under the License.
 #
 import unittest
+from time import sleep, time
 
 from unittest.mock import MagicMock, patch
 
+from speech_recognition import AudioData
+
 import mycroft.stt
 from mycroft.configuration import Configuration
 
@@ -123,9 +126,66 @@ class TestSTT(unittest.TestCase):
         mock_get.return_value = config
 
         stt = mycroft.stt.MycroftSTT()
+        stt._encoder = MagicMock()
         audio = MagicMock()
         stt.execute(audio, 'en-us')
         self.assertTrue(mycroft.stt.STTApi.called)
+        stt.encoder.encode.assert_called_with(audio, 16000)
+
+    @patch.object(Configuration, 'get')
+    def test_mycroft_stt_upload_while_recording(self, mock_get):
+        config = base_config()
+        config.merge(
+            {
+                'stt': {
+                    'module': 'mycroft',
+                    'mycroft': {'upload_while_recording': True}
+                },
+                'lang': 'en-US'
+            })
+        mock_get.return_value = config
+        uploads = []
+
+        def transcribe(audio, lang, limit):
+            uploads.append(audio if isinstance(audio, bytes) else
+                           b''.join(audio))
+            return ['hello']
+
+        with patch('mycroft.stt.STTApi') as mock_api, \
+                patch('mycroft.stt.create_encoder') as mock_encoder:
+            mock_api.return_value.stt.side_effect = transcribe
+            mock_encoder.return_value.encode_stream.side_effect = (
+                lambda chunks, rate: (b'flac:' + c for c in chunks))
+            mock_encoder.return_value.encode.return_value = b'complete'
+            stt = mycroft.stt.MycroftSTT()
+            self.assertTrue(stt.can_stream)
+            stt.stream_start()
+            stt.stream_data(b'a')
+            stt.stream_data(b'b')
+            audio = MagicMock()
+            self.assertEqual(stt.execute(audio), 'hello')
+            self.assertEqual(uploads, [b'flac:aflac:b'])
+            self.assertFalse(mock_encoder.return_value.encode.called)
+
+            # If the streamed upload fails the whole recording is sent
+            def fail(audio, lang, limit):
+                mock_api.return_value.stt.side_effect = transcribe
+                raise ConnectionError
+            mock_api.return_value.stt.side_effect = fail
+            stt.stream_start()
+            stt.stream_data(b'a')
+            self.assertEqual(stt.execute(audio), 'hello')
+            self.assertEqual(uploads[-1], b'complete')
+
+            # Unpaired devices don't start an upload
+            mock_api.return_value.identity.has_refresh.return_value = False
+            with patch('mycroft.stt.IdentityManager.load') as mock_load:
+                mock_load.return_value.has_refresh.return_value = False
+                stt.stream_start()
+            self.assertIsNone(stt.stream)
+            stt.stream_data(b'a')
+            self.assertEqual(stt.execute(audio), 'hello')
+            self.assertEqual(len(uploads), 3)
 
     @patch.object(Configuration, 'get')
     def test_google_stt(self, mock_get):
@@ -141,10 +201,15 @@ class TestSTT(unittest.TestCase):
             })
         mock_get.return_value = config
 
-        audio = MagicMock()
+        audio = AudioData(bytes(64), 16000, 2)
         stt = mycroft.stt.GoogleSTT()
+        stt._encoder = MagicMock()
         stt.execute(audio)
         self.assertTrue(stt.recognizer.recognize_google.called)
+        # The FLAC data is produced by the encoder of the module
+        flac_audio = stt.recognizer.recognize_google.call_args[0][0]
+        self.assertEqual(flac_audio.get_flac_data(),
+                         stt.encoder.encode.return_value)
 
     @patch.object(Configuration, 'get')
     def test_google_cloud_stt(self, mock_get):
@@ -164,7 +229,7 @@ class TestSTT(unittest.TestCase):
             })
         mock_get.return_value = config
 
-        audio = MagicMock()
+        audio = AudioData(bytes(64), 16000, 2)
         stt = mycroft.stt.GoogleCloudSTT()
         stt.execute(audio)
         self.assertTrue(stt.recognizer.recognize_google_cloud.called)
@@ -213,6 +278,7 @@ class TestSTT(unittest.TestCase):
         audio.sample_rate = 16000
 
         stt = mycroft.stt.IBMSTT()
+        stt._encoder = MagicMock(content_type='audio/x-flac')
         stt.execute(audio)
 
         test_url_base = 'https://test.com/v1/recognize'
@@ -222,7 +288,7 @@ class TestSTT(unittest.TestCase):
                                          'Content-Type': 'audio/x-flac',
                                          'X-Watson-Learning-Opt-Out': 'true'
                                      },
-                                     data=audio.get_flac_data(),
+                                     data=stt.encoder.encode(audio),
                                      params={
                                          'model': 'en-US_BroadbandModel',
                                          'profanity_filter': 'false'
@@ -271,6 +337,8 @@ class TestSTT(unittest.TestCase):
         audio = MagicMock()
         stt = mycroft.stt.KaldiSTT()
         self.assertEqual(stt.execute(audio), 'text')
+        self.assertEqual(stt.hypotheses(audio),
+                         [('text', 1.0), ('     asdf', 1.0)])
 
     @patch.object(Configuration, 'get')
     def test_bing_stt(self, mock_get):
@@ -311,3 +379,125 @@ class TestSTT(unittest.TestCase):
         stt = mycroft.stt.HoundifySTT()
         stt.execute(audio)
         self.assertTrue(stt.recognizer.recognize_houndify.called)
+
+
+class TestStreamingSTT(unittest.TestCase):
+    @patch.object(Configuration, 'get')
+    def test_partial(self, mock_get):
+        mock_get.return_value = base_config()
+        partials = []
+
+        class TestStreamThread(mycroft.stt.StreamThread):
+            def handle_audio_stream(self, audio, language):
+                for chunk in audio:
+                    self.handle_partial(chunk.decode())
+                self.text = 'final'
+                return self.text
+
+        class TestStreamingSTT(mycroft.stt.StreamingSTT):
+            def create_streaming_thread(self):
+                return TestStreamThread(self.queue, self.lang)
+
+        stt = TestStreamingSTT()
+        stt.on_partial = partials.append
+        stt.stream_start()
+        for chunk in (b'what', b'what', b'', b'what is'):
+            stt.stream_data(chunk)
+        self.assertEqual(stt.stream_stop(), 'final')
+        # Empty and repeated hypotheses are skipped
+        self.assertEqual(partials, ['what', 'what is'])
+
+
+class TestParallelSTT(unittest.TestCase):
+    def setUp(self):
+        self.results = {}
+        self.finished = []
+
+        def create_engine_class(module):
+            test = self
+
+            class TestEngine(mycroft.stt.STT):
+                def execute(self, audio, language=None):
+                    delay, result = test.results[module]
+                    sleep(delay)
+                    test.finished.append(module)
+                    if isinstance(result, Exception):
+                        raise result
+                    return result
+            return TestEngine
+
+        self.classes = {'primary': create_engine_class('primary'),
+                        'local': create_engine_class('local')}
+
+    def create_stt(self, mock_get, **config):
+        parallel_config = {'engines': ['primary', 'local'], 'deadline': 0.2}
+        parallel_config.update(config)
+        config = base_config()
+        config.merge({
+            'stt': {
+                'module': 'parallel',
+                'parallel': parallel_config,
+                'primary': {'confidence': 0.9},
+                'local': {'confidence': 0.6}
+            },
+            'lang': 'en-US'
+        })
+        mock_get.return_value = config
+        with patch.dict(mycroft.stt.STTFactory.CLASSES, self.classes):
+            return mycroft.stt.STTFactory.create()
+
+    @patch.object(Configuration, 'get')
+    def test_engine_config(self, mock_get):
+        stt = self.create_stt(mock_get)
+        self.assertEqual([engine.config for engine in stt.engines],
+                         [{'confidence': 0.9}, {'confidence': 0.6}])
+        self.assertEqual([type(engine) for engine in stt.engines],
+                         [self.classes['primary'], self.classes['local']])
+
+    @patch.object(Configuration, 'get')
+    def test_first_confident_result(self, mock_get):
+        stt = self.create_stt(mock_get, deadline=5)
+        self.results = {'primary': (0.0, 'hello'), 'local': (1.0, 'yellow')}
+        start = time()
+        self.assertEqual(stt.hypotheses(MagicMock()), [('hello', 0.9)])
+        self.assertLess(time() - start, 0.5)
+
+    @patch.object(Configuration, 'get')
+    def test_best_result_at_deadline(self, mock_get):
+        stt = self.create_stt(mock_get)
+        self.results = {'primary': (1.0, 'hello'), 'local': (0.0, 'yellow')}
+        self.assertEqual(stt.hypotheses(MagicMock()), [('yellow', 0.6)])
+
+        # All hypotheses available by the deadline are returned
+        self.results = {'primary': (0.1, 'hello'), 'local': (0.0, 'yellow')}
+        stt.min_confidence = 1.0
+        self.assertEqual(stt.hypotheses(MagicMock()),
+                         [('hello', 0.9), ('yellow', 0.6)])
+        self.assertEqual(stt.execute(MagicMock()), 'hello')
+
+    @patch.object(Configuration, 'get')
+    def test_failing_engine(self, mock_get):
+        stt = self.create_stt(mock_get)
+        self.results = {'primary': (0.0, ConnectionError()),
+                        'local': (0.3, 'yellow')}
+        self.assertEqual(stt.execute(MagicMock()), 'yellow')
+
+        self.results['local'] = (0.0, ValueError())
+        with self.assertRaises(ConnectionError):
+            stt.execute(MagicMock())
+
+    @patch.object(Configuration, 'get')
+    def test_join_losing_streams(self, mock_get):
+        stt = self.create_stt(mock_get)
+        primary = stt.engines[0]
+        primary.can_stream = True
+        primary.stream_start = MagicMock()
+        primary.stream_start.side_effect = (
+            lambda language: self.assertIn('primary', self.finished))
+        stt.streaming_engines = [primary]
+        self.results = {'primary': (0.5, 'hello'), 'local': (0.0, 'yellow')}
+        self.assertEqual(stt.execute(MagicMock()), 'yellow')
+        self.assertNotIn('primary', self.finished)
+        # The stream of the primary engine is done before the next starts
+        stt.stream_start()
+        self.assertTrue(primary.stream_start.called)